@@ -0,0 +1,134 @@
+"""Random assignment of documents to the members of a project role.
+
+The whole assignment is planned in memory: existing mappings are loaded
+once, every document is given `number` distinct users with NumPy, and the
+new mappings are written with `bulk_create`.
+"""
+import numpy as np
+from django.db import transaction
+
+from .models import DocMapping, RoleMapping
+from .utils import bulk_batch_size
+
+
+def water_fill(loads, total, rng):
+    """Split `total` units between users so their loads end up as even as possible.
+
+    Ties are broken at random.
+    """
+    loads = np.asarray(loads, dtype=np.int64)
+    if total <= 0 or loads.size == 0:
+        return np.zeros(loads.size, dtype=np.int64)
+    # Highest level h such that raising everyone below h to h costs at most `total`.
+    lo, hi = int(loads.min()), int(loads.min()) + total
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if np.maximum(mid - loads, 0).sum() <= total:
+            lo = mid
+        else:
+            hi = mid - 1
+    quotas = np.maximum(lo - loads, 0)
+    rest = total - int(quotas.sum())
+    if rest:
+        candidates = np.flatnonzero(loads + quotas == lo)
+        quotas[rng.choice(candidates, rest, replace=False)] += 1
+    return quotas
+
+
+def plan_assignment(taken, needs, loads, rng):
+    """Pick users for every document.
+
+    `taken` is a (documents x users) boolean matrix of the pairs that are
+    already mapped and is updated in place. `needs` is the number of new
+    users each document gets, `loads` the number of documents each user
+    has already. Users are handed out one round at a time: in each round
+    every document still in need gets one user, and the round is split
+    between users to even out their loads.
+
+    Returns the (document, user) index pairs to create.
+    """
+    loads = np.array(loads, dtype=np.int64)
+    rows, cols = [], []
+    for round_ in range(int(needs.max()) if needs.size else 0):
+        docs = np.flatnonzero(needs > round_)
+        picks = np.repeat(np.arange(loads.size), water_fill(loads, docs.size, rng))
+        rng.shuffle(picks)
+        picks = _resolve_conflicts(taken, docs, picks, loads, rng)
+        taken[docs, picks] = True
+        np.add.at(loads, picks, 1)
+        rows.append(docs)
+        cols.append(picks)
+    if not rows:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(rows), np.concatenate(cols)
+
+
+def _resolve_conflicts(taken, docs, picks, loads, rng, rounds=20):
+    """Swap picks between documents until no document gets a user it already has."""
+    for _ in range(rounds):
+        conflicts = np.flatnonzero(taken[docs, picks])
+        if not conflicts.size:
+            return picks
+        partners = rng.randint(0, docs.size, conflicts.size)
+        ok = ~taken[docs[conflicts], picks[partners]] & ~taken[docs[partners], picks[conflicts]]
+        # A partner may be drawn twice in one round, only swap it once.
+        _, first = np.unique(partners[ok], return_index=True)
+        a, b = conflicts[ok][first], partners[ok][first]
+        keep = ~np.isin(a, b) & ~np.isin(b, a)
+        a, b = a[keep], b[keep]
+        picks[a], picks[b] = picks[b], picks[a].copy()
+    # Whatever is left over goes to the least loaded user the document does not have yet.
+    for i in np.flatnonzero(taken[docs, picks]):
+        free = np.flatnonzero(~taken[docs[i]])
+        picks[i] = free[np.argmin(loads[free] + rng.random_sample(free.size))]
+    return picks
+
+
+def assign_documents(project, role_id, number, balance=False, seed=None):
+    """Give every document of `project` `number` users holding `role_id`.
+
+    Documents that already have users in the role only get the missing
+    ones. With `balance`, the documents users already have in the role
+    count towards their load, otherwise only the new ones do.
+
+    Returns a summary of the assignments per user.
+    """
+    rolemappings = list(RoleMapping.objects.filter(project=project, role_id=role_id)
+                        .select_related('user').order_by('id'))
+    if not rolemappings:
+        return []
+    user_index = {rolemap.id: i for i, rolemap in enumerate(rolemappings)}
+    document_ids = np.fromiter(project.documents.order_by('id').values_list('id', flat=True), dtype=np.int64)
+    if not document_ids.size:
+        return []
+
+    existing = DocMapping.objects.filter(project=project, rolemap__in=user_index.keys())
+    existing = np.array(list(existing.values_list('document_id', 'rolemap_id')), dtype=np.int64).reshape(-1, 2)
+    taken = np.zeros((document_ids.size, len(rolemappings)), dtype=bool)
+    loads = np.zeros(len(rolemappings), dtype=np.int64)
+    if existing.size:
+        doc_idx = np.searchsorted(document_ids, existing[:, 0])
+        user_idx = np.array([user_index[rolemap_id] for rolemap_id in existing[:, 1]], dtype=np.int64)
+        taken[doc_idx, user_idx] = True
+        np.add.at(loads, user_idx, 1)
+
+    number = min(int(number), len(rolemappings))
+    needs = np.clip(number - taken.sum(1), 0, None)
+    rng = np.random.RandomState(seed)
+    doc_idx, user_idx = plan_assignment(taken, needs, loads if balance else np.zeros_like(loads), rng)
+
+    mappings = [DocMapping(project=project, document_id=int(document_ids[d]), rolemap=rolemappings[u])
+                for d, u in zip(doc_idx, user_idx)]
+    with transaction.atomic():
+        DocMapping.objects.bulk_create(mappings, batch_size=bulk_batch_size(DocMapping, mappings))
+
+    assigned = np.bincount(user_idx, minlength=len(rolemappings))
+    return [
+        {
+            'user': rolemap.user_id,
+            'username': rolemap.user.username,
+            'assigned': int(assigned[i]),
+            'total': int(loads[i] + assigned[i]),
+        }
+        for i, rolemap in enumerate(rolemappings)
+    ]
@@ -0,0 +1,61 @@
+"""Project data watermarks.
+
+Any change to the documents, annotations, connections or labels of a project
+moves its `data_updated_at` forward. Like concordance, projects are only
+marked changed while a transaction runs and written once when it commits.
+
+`collect` is how such changes are gathered for a flush on commit.
+"""
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Project
+
+
+class _Batch(object):
+
+    def __init__(self, flush, state):
+        self.flush = flush
+        self.state = state
+
+    def __call__(self):
+        self.flush(self.state)
+
+
+@contextmanager
+def collect(flush, factory):
+    """Yield the state gathered for `flush(state)` until the transaction commits.
+
+    The state is created by `factory` once per transaction and lives on the
+    transaction's on_commit callback, so it is dropped along with the
+    callback when the transaction rolls back. Outside of a transaction
+    `flush` runs as soon as the block exits.
+    """
+    conn = transaction.get_connection()
+    if not conn.in_atomic_block:
+        state = factory()
+        yield state
+        flush(state)
+        return
+    for _, func in conn.run_on_commit:
+        if isinstance(func, _Batch) and func.flush is flush:
+            yield func.state
+            return
+    batch = _Batch(flush, factory())
+    transaction.on_commit(batch)
+    yield batch.state
+
+
+def mark_project_changed(project_id):
+    """Schedule the watermark of a project to be moved forward on commit."""
+    if project_id is None:
+        return
+    with collect(flush, set) as projects:
+        projects.add(project_id)
+
+
+def flush(project_ids):
+    if project_ids:
+        Project.objects.filter(pk__in=list(project_ids)).update(data_updated_at=timezone.now())
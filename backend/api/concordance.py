@@ -0,0 +1,288 @@
+"""Concordance (Fleiss' kappa between annotators) of documents.
+
+Saving or deleting an annotation or a connection only marks its document
+dirty. The concordance of the dirty documents is recomputed once, when the
+surrounding transaction commits, so a bulk upload costs one recomputation
+per document instead of one per row.
+
+The concordance of a project is the mean over its documents. Projects keep
+the sum and the count of their documents' concordance, moved by the
+difference whenever a document is added, removed or recomputed, so reading
+it does not touch the documents.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Count, F, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .changes import collect, mark_project_changed
+from .models import Connection, Document, Project, SequenceAnnotation
+
+
+def fleiss(table, n):
+    table = 1.0 * np.asarray(table)
+    n_sub, _ = table.shape
+
+    if table.sum() != n * n_sub:
+        n_add = n - table.sum(1)
+        table = np.insert(table, 0, values=n_add, axis=1)
+
+    p_j = table.sum(0) / (n_sub * n)
+    table2 = table * table
+    p_i = (table2.sum(1) - n) / (n * (n - 1.))
+
+    p_o = p_i.mean()
+    p_e = (p_j*p_j).sum()
+    if p_e == 1.:
+        return 1.
+    kappa = (p_o - p_e) / (1 - p_e)
+    return kappa
+
+
+def mark_dirty(document_id, entity=False, relation=False):
+    """Schedule the concordance of a document to be recomputed on commit."""
+    if document_id is None:
+        return
+    with collect(flush, lambda: (set(), set())) as (dirty_entity, dirty_relation):
+        if entity:
+            dirty_entity.add(document_id)
+        if relation:
+            dirty_relation.add(document_id)
+
+
+def flush(dirty):
+    """Recompute the concordance of the documents marked dirty."""
+    entity, relation = (list(documents) for documents in dirty)
+    if entity:
+        update_entity_concordance(entity)
+    if relation:
+        update_relation_concordance(relation)
+    document_ids = list(set(entity) | set(relation))
+    project_ids = set()
+    for i in range(0, len(document_ids), 500):
+        documents = Document.objects.filter(pk__in=document_ids[i:i + 500])
+        project_ids.update(documents.values_list('project_id', flat=True))
+    for project_id in project_ids:
+        mark_project_changed(project_id)
+
+
+def add_to_project_totals(project_id, entity=0, relation=0, documents=0):
+    """Schedule the concordance totals of a project to be moved on commit."""
+    if project_id is None:
+        return
+    with collect(flush_totals, lambda: defaultdict(lambda: [Decimal(0), Decimal(0), 0])) as totals:
+        totals = totals[project_id]
+        totals[0] += Decimal(str(entity))
+        totals[1] += Decimal(str(relation))
+        totals[2] += documents
+
+
+def subtract_from_project_totals(document):
+    """Take a document about to be deleted out of the totals of its project.
+
+    The stored concordance is subtracted, not the instance's: the instance
+    may have been loaded before its concordance was recomputed.
+    """
+    stored = Document.objects.filter(pk=document.pk)
+    Project.objects.filter(pk=document.project_id).update(
+        entity_concordance_sum=F('entity_concordance_sum') - Subquery(stored.values('entity_concordance')),
+        relation_concordance_sum=F('relation_concordance_sum') - Subquery(stored.values('relation_concordance')),
+        document_count=F('document_count') - 1,
+    )
+
+
+def flush_totals(totals):
+    for project_id, (entity, relation, documents) in totals.items():
+        if entity or relation or documents:
+            Project.objects.filter(pk=project_id).update(
+                entity_concordance_sum=F('entity_concordance_sum') + entity,
+                relation_concordance_sum=F('relation_concordance_sum') + relation,
+                document_count=F('document_count') + documents,
+            )
+
+
+def reset_project_totals(project_ids):
+    """Recount the concordance totals of projects from their documents."""
+    totals = Document.objects.filter(project__in=project_ids).values('project').annotate(
+        entity=Sum('entity_concordance'), relation=Sum('relation_concordance'), documents=Count('id'))
+    totals = {row['project']: row for row in totals}
+    for project_id in project_ids:
+        row = totals.get(project_id, {})
+        Project.objects.filter(pk=project_id).update(
+            entity_concordance_sum=row.get('entity') or 0,
+            relation_concordance_sum=row.get('relation') or 0,
+            document_count=row.get('documents') or 0,
+        )
+
+
+def comput_annotation_concordance(document_ids=None, project=None):
+    """Entity concordance of each document, keyed by document id.
+
+    The spans of a document are the subjects and the labels the categories.
+    """
+    annotations = SequenceAnnotation.objects.all()
+    if project is not None:
+        annotations = annotations.filter(document__project=project)
+    else:
+        annotations = annotations.filter(document_id__in=document_ids)
+    rows = annotations.values_list('document_id', 'start_offset', 'end_offset', 'label_id', 'user_id')
+    return fleiss_by_document(_to_array(rows, 5), document_ids)
+
+
+def comput_relation_concordance(document_ids=None, project=None):
+    """Relation concordance of each document, keyed by document id.
+
+    The (source span, target span) pairs are the subjects and the relations
+    the categories. A connection belongs to the user of its source annotation.
+    """
+    connections = Connection.objects.all()
+    if project is not None:
+        connections = connections.filter(document__project=project)
+    else:
+        connections = connections.filter(document_id__in=document_ids)
+    rows = connections.annotate(relation_or_none=Coalesce('relation_id', Value(0))).values_list(
+        'document_id',
+        'source__start_offset', 'source__end_offset', 'to__start_offset', 'to__end_offset',
+        'relation_or_none', 'source__user_id')
+    return fleiss_by_document(_to_array(rows, 7), document_ids)
+
+
+def _to_array(rows, width):
+    return np.array(list(rows), dtype=np.int64).reshape(-1, width)
+
+
+def fleiss_by_document(rows, document_ids=None):
+    """Fleiss' kappa of every document in one pass, keyed by document id.
+
+    `rows` is an integer array with one rating per row: the document id, the
+    columns identifying the subject, the category and the user. The result
+    matches `fleiss()` applied to the count table of each document. Documents
+    rated by less than two users, and the `document_ids` without any rating,
+    are fully concordant.
+    """
+    concordance = dict.fromkeys(document_ids or (), 1.)
+    if not len(rows):
+        return concordance
+
+    documents, document_idx = np.unique(rows[:, 0], return_inverse=True)
+    _, category_idx = np.unique(rows[:, -2], return_inverse=True)
+    n_documents = len(documents)
+    n_categories = category_idx.max() + 1
+
+    # Raters per document.
+    raters = np.unique(rows[:, [0, -1]], axis=0)
+    n = np.bincount(np.searchsorted(documents, raters[:, 0]), minlength=n_documents).astype(float)
+
+    # Subjects, i.e. the rows of each document's count table.
+    subjects, subject_idx = np.unique(rows[:, :-2], axis=0, return_inverse=True)
+    subject_idx = subject_idx.reshape(-1)
+    subject_document = np.searchsorted(documents, subjects[:, 0])
+    n_subjects = np.bincount(subject_document, minlength=n_documents).astype(float)
+    subject_n = n[subject_document]
+
+    # Non-zero cells of the count tables.
+    cells, counts = np.unique(subject_idx * n_categories + category_idx, return_counts=True)
+    cell_subject = cells // n_categories
+    ratings = np.bincount(cell_subject, weights=counts, minlength=len(subjects))
+    squares = np.bincount(cell_subject, weights=counts * counts, minlength=len(subjects))
+
+    # fleiss() adds a "not rated" column when a table does not sum to n per subject.
+    total = np.bincount(subject_document, weights=ratings, minlength=n_documents)
+    add_missing = total != n * n_subjects
+    missing = np.where(add_missing[subject_document], subject_n - ratings, 0.)
+    squares += missing * missing
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p_i = (squares - subject_n) / (subject_n * (subject_n - 1.))
+        p_o = np.bincount(subject_document, weights=p_i, minlength=n_documents) / n_subjects
+
+        cells, counts = np.unique(document_idx * n_categories + category_idx, return_counts=True)
+        cell_document = cells // n_categories
+        p_j = counts / (n_subjects * n)[cell_document]
+        p_e = np.bincount(cell_document, weights=p_j * p_j, minlength=n_documents)
+        p_missing = np.bincount(subject_document, weights=missing, minlength=n_documents) / (n_subjects * n)
+        p_e += p_missing * p_missing
+
+        kappa = (p_o - p_e) / (1 - p_e)
+    kappa[np.isclose(p_e, 1.) | (n < 2)] = 1.
+
+    concordance.update(zip(documents.tolist(), kappa.tolist()))
+    return concordance
+
+
+def update_entity_concordance(document_ids, chunk_size=500):
+    for i in range(0, len(document_ids), chunk_size):
+        chunk = document_ids[i:i + chunk_size]
+        _update_concordance('entity_concordance', chunk, comput_annotation_concordance(chunk))
+
+
+def update_relation_concordance(document_ids, chunk_size=500):
+    for i in range(0, len(document_ids), chunk_size):
+        chunk = document_ids[i:i + chunk_size]
+        _update_concordance('relation_concordance', chunk, comput_relation_concordance(chunk))
+
+
+def _update_concordance(field, document_ids, concordance):
+    """Save the concordance of some documents and move their projects' totals."""
+    current = Document.objects.filter(pk__in=document_ids).values_list('id', field, 'project_id')
+    projects = {}
+    old = {}
+    for document_id, value, project_id in current:
+        old[document_id] = value
+        projects[document_id] = project_id
+    saved = _save_concordance(field, concordance, current=old.items())
+
+    deltas = defaultdict(Decimal)
+    for document_id, value in saved.items():
+        if document_id in old:
+            deltas[projects[document_id]] += Decimal(str(value)) - old[document_id]
+    for project_id, delta in deltas.items():
+        if field == 'entity_concordance':
+            add_to_project_totals(project_id, entity=delta)
+        else:
+            add_to_project_totals(project_id, relation=delta)
+
+
+def _save_concordance(field, concordance, current=None, chunk_size=500):
+    """Write the concordance with one UPDATE per distinct value instead of one per document.
+
+    `current` are (id, concordance) pairs already stored; documents whose
+    value does not change are then left untouched. Returns the values written.
+    """
+    values = {document_id: round(value, 4) for document_id, value in concordance.items()}
+    for document_id, old in current or ():
+        if document_id in values and float(old) == values[document_id]:
+            del values[document_id]
+    by_value = {}
+    for document_id, value in values.items():
+        by_value.setdefault(value, []).append(document_id)
+    now = timezone.now()
+    for value, document_ids in by_value.items():
+        for i in range(0, len(document_ids), chunk_size):
+            Document.objects.filter(pk__in=document_ids[i:i + chunk_size]).update(**{field: value, 'updated_at': now})
+    return values
+
+
+def recompute_project(project):
+    """Recompute the concordance of every document of a project in one pass.
+
+    Returns the project-level entity and relation concordance, i.e. the mean
+    over its documents.
+    """
+    document_ids = list(project.documents.values_list('id', flat=True))
+    entity = comput_annotation_concordance(document_ids, project=project)
+    relation = comput_relation_concordance(document_ids, project=project)
+    documents = project.documents.all()
+    with transaction.atomic():
+        _save_concordance('entity_concordance', entity,
+                          current=documents.values_list('id', 'entity_concordance').iterator())
+        _save_concordance('relation_concordance', relation,
+                          current=documents.values_list('id', 'relation_concordance').iterator())
+        reset_project_totals([project.id])
+    if not document_ids:
+        return 1., 1.
+    return np.mean(list(entity.values())), np.mean(list(relation.values()))
@@ -1,28 +1,37 @@
-from django.db.models import Count, Q
+from django.db.models import Exists, OuterRef
 from django_filters.rest_framework import FilterSet, BooleanFilter
+from rest_framework.filters import SearchFilter
 
-from .models import Document
+from .models import Document, SequenceAnnotation
+from .search import search
+
+
+def annotated_by(queryset, user, value=True):
+    """Documents of `queryset` that `user` has (or, with value=False, has not) annotated.
+
+    An EXISTS probe on the (document, user, ...) unique index of the
+    annotations per document, instead of counting them over the project.
+    """
+    annotations = SequenceAnnotation.objects.filter(document=OuterRef('pk'), user=user)
+    return queryset.annotate(annotated=Exists(annotations)).filter(annotated=value)
 
 
 class DocumentFilter(FilterSet):
     seq_annotations__isnull = BooleanFilter(field_name='seq_annotations', method='filter_annotations')
 
     def filter_annotations(self, queryset, field_name, value):
-        queryset = queryset.annotate(num_annotations=
-            Count(field_name, filter=
-                Q(**{ f"{field_name}__user": self.request.user})))
-
-        should_have_annotations = not value
         # 过滤：该用户有无标注
-        if should_have_annotations:
-            queryset = queryset.filter(num_annotations__gte=1)
-        else:
-            queryset = queryset.filter(num_annotations__lte=0)
-
-        return queryset
+        return annotated_by(queryset, self.request.user, not value)
 
     class Meta:
         model = Document
         fields = ('project', 'text', 'meta', 'created_at', 'updated_at',
                   'seq_annotations__label__id',
                   'seq_annotations__isnull')
+
+
+class DocumentSearchFilter(SearchFilter):
+    """Search the text of documents through the search index, see `api/search.py`."""
+
+    def filter_queryset(self, request, queryset, view):
+        return search(queryset, request.query_params.get(self.search_param, ''))
@@ -0,0 +1,256 @@
+"""Background jobs run by a pool of worker threads inside the web process.
+
+Jobs are rows in the database, so their state survives the request that
+created them. Live progress is kept in the cache while a job runs,
+because the import transaction hides the job's own row updates until it
+commits. Configure a shared cache backend when several processes serve
+the API.
+
+A job left pending or running by a process that stopped never finishes;
+`fail_stale_jobs` marks such jobs as failed when the server starts.
+
+SQLite has a single write lock. Jobs run one at a time there, and
+requests writing while an import holds the lock wait up to SQLITE_TIMEOUT
+seconds for it before failing with "database is locked".
+"""
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+from rest_framework.exceptions import APIException
+
+from .models import ExportJob, ImportJob
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = 1 if connection.vendor == 'sqlite' else settings.JOB_WORKERS
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job')
+        return _executor
+
+
+def submit(func, *args):
+    """Run `func(*args)` in the pool once the current transaction commits."""
+    transaction.on_commit(lambda: get_executor().submit(_run, func, *args))
+
+
+def _run(func, *args):
+    close_old_connections()
+    try:
+        func(*args)
+    except Exception:
+        logger.exception('Job %s%r failed', func.__name__, args)
+    finally:
+        close_old_connections()
+
+
+def spool(file, kind):
+    """Copy an uploaded file to JOB_SPOOL_DIR and return its path."""
+    directory = os.path.join(settings.JOB_SPOOL_DIR, kind)
+    os.makedirs(directory, exist_ok=True)
+    name = f'{uuid.uuid4().hex}_{os.path.basename(file.name)}'
+    path = os.path.join(directory, name)
+    with open(path, 'wb') as f:
+        for chunk in file.chunks():
+            f.write(chunk)
+    return path
+
+
+def progress_key(job):
+    return f'job:{job._meta.model_name}:{job.id}:progress'
+
+
+def get_progress(job):
+    return cache.get(progress_key(job))
+
+
+def error_message(exc):
+    if isinstance(exc, APIException):
+        return str(exc.detail)
+    return f'{type(exc).__name__}: {exc}'
+
+
+def enqueue_import(project, user, file, file_format, spliter, encoding=None):
+    job = ImportJob.objects.create(
+        project=project,
+        user=user,
+        file=spool(file, 'imports'),
+        format=file_format,
+        spliter=spliter or '',
+        encoding=encoding or '',
+    )
+    submit(run_import, job.id)
+    return job
+
+
+def run_import(job_id):
+    from .utils import ImportMetrics
+    from .views import TextUploadAPI
+
+    job = ImportJob.objects.select_related('project', 'user').get(pk=job_id)
+    job.state = ImportJob.RUNNING
+    job.started_at = timezone.now()
+    job.save()
+
+    def on_progress(metrics):
+        cache.set(progress_key(job), metrics.as_dict(), settings.JOB_PROGRESS_TIMEOUT)
+
+    metrics = ImportMetrics(on_progress=on_progress)
+    try:
+        parser = TextUploadAPI.select_parser(job.format, encoding=job.encoding or None, metrics=metrics)
+        with open(job.file, 'rb') as f:
+            data = parser.parse(f, job.spliter)
+            storage = TextUploadAPI.select_storage(job.format, job.project, data)
+            storage.save(job.user, metrics)
+    except Exception as exc:
+        job.state = ImportJob.FAILURE
+        job.errors = error_message(exc)
+        # The import rolled back, nothing was written, but the file was read with the detected encoding.
+        failed = ImportMetrics()
+        failed.encoding = metrics.encoding or job.encoding or None
+        failed.detection_seconds = metrics.detection_seconds
+        metrics = failed
+    else:
+        job.state = ImportJob.SUCCESS
+    finally:
+        cache.delete(progress_key(job))
+        if os.path.exists(job.file):
+            os.remove(job.file)
+
+    job.documents = metrics.documents
+    job.annotations = metrics.annotations
+    job.rows_per_sec = metrics.rows_per_sec
+    job.encoding = metrics.encoding or ''
+    job.detection_seconds = metrics.detection_seconds
+    job.finished_at = timezone.now()
+    job.save()
+
+
+STALE_ERROR = 'The job was interrupted by a restart of the server.'
+
+
+def fail_stale_imports(before=None):
+    """Mark the pending and running imports created before `before` (all when None) as failed.
+
+    Returns how many. Their spooled files are removed.
+    """
+    jobs = ImportJob.objects.filter(state__in=(ImportJob.PENDING, ImportJob.RUNNING))
+    if before is not None:
+        jobs = jobs.filter(created_at__lt=before)
+    stale = list(jobs.values_list('id', 'file'))
+    for _, path in stale:
+        if path and os.path.exists(path):
+            os.remove(path)
+    ImportJob.objects.filter(pk__in=[pk for pk, _ in stale]).update(
+        state=ImportJob.FAILURE, errors=STALE_ERROR, finished_at=timezone.now())
+    return len(stale)
+
+
+def enqueue_export(project, user, file_format):
+    job = ExportJob.objects.create(project=project, user=user, format=file_format)
+    submit(run_export, job.id)
+    return job
+
+
+def export_path(job):
+    from .views import TextDownloadAPI
+
+    _, extension = TextDownloadAPI.select_content_type(job.format)
+    return os.path.join(settings.JOB_SPOOL_DIR, 'exports', f'project_{job.project_id}_{job.id}.{extension}')
+
+
+def run_export(job_id):
+    """Write the export of `job_id` to JOB_SPOOL_DIR/exports.
+
+    The project's `data_updated_at` is read before the documents, so an
+    edit made while the file is written leaves the artifact stale rather
+    than silently missing from it.
+    """
+    from .views import TextDownloadAPI
+
+    job = ExportJob.objects.select_related('project').get(pk=job_id)
+    project = job.project
+    job.state = ExportJob.RUNNING
+    job.watermark = project.data_updated_at
+    # Not when it was failed while it waited, e.g. superseded by a newer export.
+    if not ExportJob.objects.filter(pk=job.id, state=ExportJob.PENDING).update(
+            state=job.state, watermark=job.watermark):
+        return
+
+    path = export_path(job)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    try:
+        painter = TextDownloadAPI.select_painter(job.format, project)
+        labels = project.labels.all() if job.format == 'json1' else None
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for line in painter.stream(project.documents.all(), labels=labels):
+                f.write(line)
+        os.replace(tmp_path, path)
+    except Exception as exc:
+        job.state = ExportJob.FAILURE
+        job.errors = error_message(exc)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    else:
+        job.state = ExportJob.SUCCESS
+        job.file = path
+        job.size = os.path.getsize(path)
+    job.finished_at = timezone.now()
+
+    # The job may have been failed meanwhile, as stale or superseded by a newer export.
+    finished = ExportJob.objects.filter(pk=job.id, state=ExportJob.RUNNING).update(
+        state=job.state, errors=job.errors, file=job.file, size=job.size, finished_at=job.finished_at)
+    if not finished:
+        if job.state == ExportJob.SUCCESS:
+            os.remove(path)
+        return
+    if job.state == ExportJob.SUCCESS:
+        remove_old_exports(job)
+
+
+def remove_old_exports(job):
+    """Delete the artifacts of earlier exports of the same project and format.
+
+    Earlier exports still pending or running are failed: their artifact would
+    be older than the one of `job`.
+    """
+    old_jobs = ExportJob.objects.filter(project=job.project_id, format=job.format, id__lt=job.id)
+    old_jobs.filter(state__in=(ExportJob.PENDING, ExportJob.RUNNING)).update(
+        state=ExportJob.FAILURE, errors=f'Superseded by export {job.id}.', finished_at=timezone.now())
+    old_jobs = old_jobs.filter(state=ExportJob.SUCCESS).exclude(file='')
+    for old in old_jobs:
+        if os.path.exists(old.file):
+            os.remove(old.file)
+    old_jobs.update(file='', size=0)
+
+
+def fail_stale_exports(before=None):
+    """Mark the pending and running exports created before `before` (all when None) as failed.
+
+    Returns how many. Their partly written files are removed.
+    """
+    jobs = ExportJob.objects.filter(state__in=(ExportJob.PENDING, ExportJob.RUNNING))
+    if before is not None:
+        jobs = jobs.filter(created_at__lt=before)
+    stale = list(jobs)
+    for job in stale:
+        tmp_path = export_path(job) + '.tmp'
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    ExportJob.objects.filter(pk__in=[job.pk for job in stale]).update(
+        state=ExportJob.FAILURE, errors=STALE_ERROR, finished_at=timezone.now())
+    return len(stale)
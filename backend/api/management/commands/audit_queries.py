@@ -0,0 +1,121 @@
+import statistics
+import time
+
+from api.filters import annotated_by
+from api.models import Project, Document, SequenceAnnotation, DocMapping, RoleMapping
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count, Exists, OuterRef
+from django.test.utils import CaptureQueriesContext
+
+# Plan lines that read a whole table or sort its rows
+WARNINGS = {
+    'sqlite': lambda line: (line.startswith('SCAN ') and ' INDEX ' not in line) or 'TEMP B-TREE' in line,
+    'postgresql': lambda line: 'Seq Scan' in line or line.lstrip('-> ').startswith('Sort '),
+}
+
+
+def hot_queries(project, user, limit):
+    """The ORM calls behind the busiest views, as (name, callable) pairs.
+
+    `user` plays an annotator of `project`.
+    """
+    documents = project.documents.order_by('id')
+    assigned = documents.filter(docmapping__rolemap__user=user)
+    queue = documents.annotate(assigned=Exists(
+        DocMapping.objects.filter(document=OuterRef('pk'), rolemap__user=user))).filter(assigned=True)
+    document = assigned.first() or documents.first()
+    role_id = RoleMapping.objects.filter(user=user, project=project).values_list('role', flat=True).first()
+    middle = documents[documents.count() // 2:].values_list('updated_at', 'id').first()
+
+    return [
+        # DocumentList of an annotator
+        ('doc_list_count', lambda: assigned.values('pk').count()),
+        ('doc_list_page', lambda: list(assigned[:limit])),
+        ('doc_list_unannotated', lambda: list(annotated_by(assigned, user, False)[:limit])),
+        ('doc_list_approved', lambda: list(documents.filter(annotations_approved_by__isnull=False)[:limit])),
+        # DocumentList of an admin, ?pagination=cursor&ordering=-updated_at
+        ('doc_list_by_updated', lambda: list(documents.order_by('-updated_at', '-id')[:limit])),
+        ('doc_list_by_updated_cursor', lambda: list(
+            documents.filter(updated_at__lt=middle[0]).order_by('-updated_at', '-id')[:limit])),
+        # DocumentQueueAPI
+        ('doc_queue', lambda: list(annotated_by(queue, user, False)[:limit])),
+        # AnnotationList and the annotations prefetched by DocumentSerializer
+        ('annotation_list', lambda: list(SequenceAnnotation.objects.filter(document=document, user=user))),
+        # DocumentSerializer.get_doc_mappings of one role
+        ('doc_mappings_by_role', lambda: list(DocMapping.objects.filter(document=document, rolemap__role=role_id))),
+        # assign_documents
+        ('assignment_existing', lambda: list(DocMapping.objects.filter(
+            project=project, rolemap__role=role_id).values_list('document_id', 'rolemap_id'))),
+        # get_roles
+        ('role_of_user', lambda: list(RoleMapping.objects.filter(user_id=user.id, project_id=project.id)
+                                      .values_list('role__name', flat=True).distinct())),
+        # statistics.rebuild
+        ('approved_count', lambda: Document.objects.filter(
+            project=project.id, annotations_approved_by__isnull=False).count()),
+        # statistics.count_annotation
+        ('user_document_exists', lambda: SequenceAnnotation.objects.filter(
+            document=document, user=user).exists()),
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Run EXPLAIN on the queries of the busiest views and time them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--project', type=int, required=True,
+                            help='The id of a project with data.')
+        parser.add_argument('--user', type=int,
+                            help='The id of an annotator of the project, the one with most documents by default.')
+        parser.add_argument('--limit', type=int, default=10,
+                            help='The page size of lists.')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='The number of times each query is run.')
+        parser.add_argument('--only', nargs='*',
+                            help='The names of the queries to audit, all by default.')
+
+    def handle(self, *args, **options):
+        try:
+            project = Project.objects.get(pk=options['project'])
+        except Project.DoesNotExist:
+            raise CommandError(f'Project {options["project"]} does not exist')
+
+        rolemaps = RoleMapping.objects.filter(project=project, role__name=settings.ROLE_ANNOTATOR)
+        if options['user']:
+            rolemaps = rolemaps.filter(user=options['user'])
+        rolemap = rolemaps.select_related('user').annotate(
+            documents=Count('docmapping')).order_by('-documents').first()
+        if rolemap is None:
+            raise CommandError(f'Project {project.id} has no annotator {options["user"] or ""}'.rstrip())
+
+        warns = WARNINGS.get(connection.vendor, lambda line: False)
+        flagged = 0
+        for name, run in hot_queries(project, rolemap.user, options['limit']):
+            if options['only'] and name not in options['only']:
+                continue
+            with CaptureQueriesContext(connection) as context:
+                run()
+            timings = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                run()
+                timings.append(time.perf_counter() - started)
+
+            plan = [line for query in context.captured_queries for line in self.explain(query['sql'])]
+            warned = any(warns(line) for line in plan)
+            flagged += warned
+            style = self.style.WARNING if warned else self.style.SUCCESS
+            self.stdout.write(style(f'{name}: {statistics.median(timings) * 1000:.2f} ms'))
+            for line in plan:
+                self.stdout.write(f'    {line}')
+        self.stdout.write(f'{flagged} queries scan or sort a table')
+
+    @staticmethod
+    def explain(sql):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                return [row[-1] for row in cursor.fetchall()]
+            cursor.execute(f'EXPLAIN {sql}')
+            return [row[0] for row in cursor.fetchall()]
@@ -0,0 +1,86 @@
+import io
+import random
+import time
+
+import conllu
+from api.utils import CoNLLParser
+from django.core.management.base import BaseCommand, CommandError
+
+
+def legacy_parse(file):
+    """The previous parser: conllu.parse_incr with offsets summed over all preceding words."""
+    file = io.TextIOWrapper(file, encoding='utf-8')
+    gen_parser = conllu.parse_incr(
+        file,
+        fields=("form", "ne"),
+        field_parsers={"ne": lambda line, i: conllu.parser.parse_nullable_value(line[i])}
+    )
+    for sentence in gen_parser:
+        words, labels = [], []
+        for item in sentence:
+            word = item.get("form")
+            tag = item.get("ne")
+            if tag is not None:
+                char_left = sum(map(len, words)) + len(words)
+                labels.append([char_left, char_left + len(word), tag])
+            words.append(word)
+        yield {'text': ' '.join(words), 'labels': labels}
+
+
+def generate(sentences, tokens, seed=0):
+    rng = random.Random(seed)
+    lines = []
+    for _ in range(sentences):
+        i = 0
+        while i < tokens:
+            if rng.random() < 0.2:
+                label = rng.choice(('PER', 'ORG', 'LOC', 'MISC'))
+                length = min(rng.randint(1, 3), tokens - i)
+                for j in range(length):
+                    lines.append(f'w{rng.randint(0, 9999)}\t{"B" if j == 0 else "I"}-{label}')
+                i += length
+            else:
+                lines.append(f'w{rng.randint(0, 9999)}\tO')
+                i += 1
+        lines.append('')
+    return '\n'.join(lines).encode()
+
+
+class Command(BaseCommand):
+    help = 'Measure the CoNLL parser against the previous conllu based one on generated data'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', default=None,
+                            help='A CoNLL file to parse instead of generated data.')
+        parser.add_argument('--sentences', type=int, default=1000,
+                            help='The number of generated sentences.')
+        parser.add_argument('--tokens', type=int, default=50,
+                            help='The number of tokens per generated sentence.')
+        parser.add_argument('--skip-legacy', action='store_true',
+                            help='Only run the current parser, the previous one is quadratic in sentence length.')
+
+    def handle(self, *args, **options):
+        if options['file']:
+            try:
+                with open(options['file'], 'rb') as f:
+                    content = f.read()
+            except OSError as e:
+                raise CommandError(str(e))
+        else:
+            content = generate(options['sentences'], options['tokens'])
+        tokens = sum(1 for line in content.splitlines() if line.strip() and not line.startswith(b'#'))
+        self.stdout.write(f'{len(content) / 2 ** 20:.1f} MB, {tokens} tokens')
+
+        runs = [('current', lambda: (d for batch in CoNLLParser().parse(io.BytesIO(content), '') for d in batch))]
+        if not options['skip_legacy']:
+            runs.append(('legacy', lambda: legacy_parse(io.BytesIO(content))))
+        for name, parse in runs:
+            started = time.perf_counter()
+            documents = spans = 0
+            for document in parse():
+                documents += 1
+                spans += len(document['labels'])
+            elapsed = time.perf_counter() - started
+            self.stdout.write(self.style.SUCCESS(
+                f'{name}: {documents} documents, {spans} spans in {elapsed:.2f}s '
+                f'({tokens / elapsed if elapsed else 0:,.0f} tokens/sec)'))
@@ -0,0 +1,91 @@
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+import openpyxl
+from api.utils import ExcelParser
+from django.core.management.base import BaseCommand, CommandError
+
+try:
+    import pyexcel
+except ImportError:
+    # The previous parser's dependency is no longer in requirements.txt.
+    pyexcel = None
+
+
+def legacy_parse(file):
+    """The previous parser: the whole file read into pyexcel, one array per sheet."""
+    excel_book = pyexcel.iget_book(file_type="xlsx", file_content=file.read())
+    for sheet_name in excel_book.sheet_names():
+        yield from ExcelParser.parse_excel_csv_reader(excel_book[sheet_name].to_array())
+
+
+def generate(path, sheets, rows):
+    book = openpyxl.Workbook(write_only=True)
+    for i in range(sheets):
+        sheet = book.create_sheet(f'sheet{i}')
+        sheet.append(['text', 'label', 'source'])
+        for j in range(rows):
+            sheet.append([f'Document {j} of sheet {i}, ' + 'lorem ipsum ' * 10, f'label{j % 10}', f'row {j}'])
+    book.save(path)
+
+
+def measure(name, path, queue):
+    """Parse `path` in a process of its own and report its time and peak RSS growth."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    documents = 0
+    with open(path, 'rb') as f:
+        batches = ExcelParser().parse(f, '') if name == 'current' else legacy_parse(f)
+        for batch in batches:
+            documents += len(batch)
+    elapsed = time.perf_counter() - started
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put((documents, elapsed, (peak - rss) / 1024))
+
+
+class Command(BaseCommand):
+    help = 'Measure the time and the peak memory of the Excel parser against the previous pyexcel based one'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', default=None,
+                            help='An xlsx file to parse instead of a generated workbook.')
+        parser.add_argument('--sheets', type=int, default=2,
+                            help='The number of generated sheets.')
+        parser.add_argument('--rows', type=int, default=50000,
+                            help='The number of rows per generated sheet.')
+        parser.add_argument('--skip-legacy', action='store_true',
+                            help='Only run the current parser, as when pyexcel is not installed.')
+
+    def handle(self, *args, **options):
+        path = options['file']
+        if path is None:
+            fd, path = tempfile.mkstemp(suffix='.xlsx')
+            os.close(fd)
+            generate(path, options['sheets'], options['rows'])
+        elif not os.path.exists(path):
+            raise CommandError(f'{path} does not exist')
+        self.stdout.write(f'{os.path.getsize(path) / 2 ** 20:.1f} MB')
+
+        try:
+            legacy = not options['skip_legacy']
+            if legacy and pyexcel is None:
+                self.stderr.write(self.style.WARNING('legacy: skipped, pyexcel is not installed'))
+                legacy = False
+            names = ['current', 'legacy'] if legacy else ['current']
+            for name in names:
+                queue = multiprocessing.Queue()
+                process = multiprocessing.Process(target=measure, args=(name, path, queue))
+                process.start()
+                process.join()
+                if process.exitcode:
+                    self.stderr.write(f'{name}: failed with exit code {process.exitcode}')
+                    continue
+                documents, elapsed, peak = queue.get()
+                self.stdout.write(self.style.SUCCESS(
+                    f'{name}: {documents} documents in {elapsed:.2f}s, peak RSS +{peak:.0f} MB'))
+        finally:
+            if options['file'] is None:
+                os.remove(path)
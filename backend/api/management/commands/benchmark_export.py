@@ -0,0 +1,49 @@
+import time
+
+from api.models import Project
+from api.serializers import DocumentSerializer
+from api.views import TextDownloadAPI
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class Command(BaseCommand):
+    help = 'Measure the wall time and the number of queries of exporting a project'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--project', type=int, required=True,
+                            help='The id of the project.')
+        parser.add_argument('--format', default='json', choices=('json', 'json1', 'csv'),
+                            help='The export format.')
+        parser.add_argument('--stream', action='store_true',
+                            help='Export through the streaming painters.')
+
+    def handle(self, *args, **options):
+        try:
+            project = Project.objects.get(pk=options['project'])
+        except Project.DoesNotExist:
+            raise CommandError(f'Project {options["project"]} does not exist')
+
+        format = options['format']
+        painter = TextDownloadAPI().select_painter(format, project)
+        documents = project.documents.all()
+        count = documents.count()
+        labels = project.labels.all() if format == 'json1' else None
+
+        with CaptureQueriesContext(connection) as context:
+            started = time.perf_counter()
+            if options['stream']:
+                rows = sum(1 for _ in painter.stream(documents, labels=labels))
+            elif labels is not None:
+                rows = len(painter.paint_labels(DocumentSerializer.setup_eager_loading(documents), labels))
+            else:
+                rows = len(painter.paint(DocumentSerializer.setup_eager_loading(documents)))
+            elapsed = time.perf_counter() - started
+
+        queries = len(context.captured_queries)
+        per_10k = 10000 / count if count else 0
+        self.stdout.write(f'documents: {count}, rows: {rows}')
+        self.stdout.write(f'total: {elapsed:.2f}s, {queries} queries')
+        self.stdout.write(self.style.SUCCESS(
+            f'per 10k documents: {elapsed * per_10k:.2f}s, {queries * per_10k:.0f} queries'))
@@ -0,0 +1,41 @@
+import statistics
+import time
+
+from api.models import Project
+from api.search import search
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Measure the latency of searching the documents of a project with the index and with LIKE'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--project', type=int, required=True,
+                            help='The id of the project.')
+        parser.add_argument('--limit', type=int, default=10,
+                            help='The page size of a search.')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='The number of times each query is run.')
+        parser.add_argument('queries', nargs='+', help='The search box inputs to time.')
+
+    def handle(self, *args, **options):
+        try:
+            project = Project.objects.get(pk=options['project'])
+        except Project.DoesNotExist:
+            raise CommandError(f'Project {options["project"]} does not exist')
+
+        documents = project.documents.order_by('id')
+        self.stdout.write(f'{documents.count()} documents')
+        for q in options['queries']:
+            for name, queryset in (('index', search(documents, q)),
+                                   ('like', documents.filter(text__icontains=q))):
+                timings = []
+                for _ in range(options['repeat']):
+                    started = time.perf_counter()
+                    ids = list(queryset.values_list('id', flat=True)[:options['limit']])
+                    count = queryset.count()
+                    timings.append(time.perf_counter() - started)
+                self.stdout.write(self.style.SUCCESS(
+                    f'{q!r} {name}: {count} matches, first page + count in '
+                    f'{statistics.median(timings) * 1000:.1f} ms (median of {len(timings)}), '
+                    f'first ids {ids[:3]}'))
@@ -0,0 +1,228 @@
+import json
+import random
+import subprocess
+import time
+import tracemalloc
+
+import numpy as np
+from api.concordance import recompute_project
+from api.models import Project, SequenceAnnotation, Connection, RoleMapping, Role
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+SCENARIOS = ('upload', 'doc_list', 'doc_queue', 'annotation_create', 'statistics', 'concordance', 'export')
+
+# Scenarios that work on a whole upload or project, and take seconds on large ones
+HEAVY_SCENARIOS = ('upload', 'concordance', 'export')
+
+
+class Suite(object):
+    """The scenarios run against a project, as `setup_<name>` methods.
+
+    A setup returns the function timed on each run, which is given the run
+    number and returns the response (None for direct calls), and optionally
+    a function undoing what the runs wrote.
+    """
+
+    def __init__(self, project, admin, annotator, upload_size):
+        self.project = project
+        self.admin_user = admin
+        self.admin = self.client(admin)
+        self.annotator = self.client(annotator)
+        self.annotator_user = annotator
+        self.upload_size = upload_size
+        self.url = f'/v1/projects/{project.id}'
+
+    @staticmethod
+    def client(user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def setup_upload(self):
+        project = Project.objects.create(name=f'{self.project.name} upload benchmark')
+        RoleMapping.objects.create(project=project, user=self.admin_user,
+                                   role=Role.objects.get(name=settings.ROLE_PROJECT_ADMIN))
+        texts = self.project.documents.order_by('id').values_list('text', flat=True)[:self.upload_size]
+        content = ''.join(json.dumps({'text': text}, ensure_ascii=False) + '\n' for text in texts).encode('utf-8')
+
+        def run(i):
+            file = SimpleUploadedFile('benchmark.jsonl', content)
+            return self.admin.post(f'/v1/projects/{project.id}/docs/upload',
+                                   {'file': file, 'format': 'json', 'spliter': '', 'async': 'false'})
+        return run, project.delete
+
+    def setup_doc_list(self):
+        count = self.project.document_count
+
+        def run(i):
+            offset = random.randrange(max(count - 10, 1))
+            return self.annotator.get(f'{self.url}/docs?limit=10&offset={offset}')
+        return run, None
+
+    def setup_doc_queue(self):
+        def run(i):
+            return self.annotator.get(f'{self.url}/docs/next?limit=1&prefetch=2')
+        return run, None
+
+    def setup_annotation_create(self):
+        document_ids = list(self.project.documents.filter(docmapping__rolemap__user=self.annotator_user)
+                            .values_list('id', flat=True))
+        label_id = self.project.labels.values_list('id', flat=True).first()
+        started = timezone.now()
+
+        def run(i):
+            # A span of one character no generated word annotation has.
+            document_id = document_ids[i % len(document_ids)]
+            return self.annotator.post(f'{self.url}/docs/{document_id}/annotations',
+                                       {'label': label_id, 'start_offset': i // len(document_ids),
+                                        'end_offset': i // len(document_ids) + 1, 'userId': ''},
+                                       format='json')
+
+        def teardown():
+            SequenceAnnotation.objects.filter(document__in=document_ids, user=self.annotator_user,
+                                              created_at__gte=started).delete()
+        return run, teardown
+
+    def setup_statistics(self):
+        def run(i):
+            return self.admin.get(f'{self.url}/statistics?fresh=1')
+        return run, None
+
+    def setup_concordance(self):
+        def run(i):
+            recompute_project(self.project)
+        return run, None
+
+    def setup_export(self):
+        def run(i):
+            response = self.admin.get(f'{self.url}/docs/download?q=json&stream=1')
+            for _ in response.streaming_content:
+                pass
+            return response
+        return run, None
+
+
+def percentiles(timings):
+    return {
+        'p50': round(float(np.percentile(timings, 50)), 3),
+        'p90': round(float(np.percentile(timings, 90)), 3),
+        'p99': round(float(np.percentile(timings, 99)), 3),
+        'max': round(float(np.max(timings)), 3),
+        'mean': round(float(np.mean(timings)), 3),
+    }
+
+
+def current_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = 'Time the main operations on a project and write latency, queries and memory to a JSON report'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--project', type=int, required=True,
+                            help='The id of the project, e.g. one made by generate_project.')
+        parser.add_argument('--repeat', type=int, default=20,
+                            help='The number of timed runs of each scenario.')
+        parser.add_argument('--heavy-repeat', type=int, default=3,
+                            help=f'The number of timed runs of {", ".join(HEAVY_SCENARIOS)}.')
+        parser.add_argument('--upload-size', type=int, default=1000,
+                            help='The number of documents of an upload.')
+        parser.add_argument('--scenarios', nargs='*', choices=SCENARIOS, default=SCENARIOS,
+                            help='The scenarios to run, all by default.')
+        parser.add_argument('--output', default=None,
+                            help='The file to write the report to, stdout when omitted.')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='The seed of the random choices of documents.')
+
+    def handle(self, *args, **options):
+        try:
+            project = Project.objects.get(pk=options['project'])
+        except Project.DoesNotExist:
+            raise CommandError(f'Project {options["project"]} does not exist')
+        if options['repeat'] < 1 or options['heavy_repeat'] < 1:
+            raise CommandError('--repeat and --heavy-repeat must be positive')
+        admin = self.user_in_role(project, settings.ROLE_PROJECT_ADMIN) or \
+            User.objects.filter(is_superuser=True).first()
+        annotator = self.user_in_role(project, settings.ROLE_ANNOTATOR)
+        if admin is None or annotator is None:
+            raise CommandError(f'Project {project.id} needs a project admin and an annotator')
+
+        random.seed(options['seed'])
+        suite = Suite(project, admin, annotator, options['upload_size'])
+        report = {
+            'commit': current_commit(),
+            'created_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'project': {
+                'id': project.id,
+                'documents': project.documents.count(),
+                'annotations': SequenceAnnotation.objects.filter(document__project=project).count(),
+                'connections': Connection.objects.filter(document__project=project).count(),
+                'annotators': project.role_mappings.filter(role__name=settings.ROLE_ANNOTATOR).count(),
+            },
+            'scenarios': {},
+        }
+        for name in options['scenarios']:
+            repeat = options['heavy_repeat'] if name in HEAVY_SCENARIOS else options['repeat']
+            report['scenarios'][name] = result = self.run_scenario(suite, name, repeat)
+            latency = result['latency_ms']
+            style = self.style.ERROR if result['errors'] else self.style.SUCCESS
+            self.stderr.write(style(
+                f'{name}: p50 {latency["p50"]:.1f} ms, p99 {latency["p99"]:.1f} ms, '
+                f'{result["queries"]["median"]:g} queries, peak {result["peak_memory_kb"]} KiB, '
+                f'{result["errors"]} errors'))
+
+        output = json.dumps(report, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+    @staticmethod
+    def user_in_role(project, role_name):
+        rolemap = project.role_mappings.filter(role__name=role_name).select_related('user').order_by('id').first()
+        return rolemap.user if rolemap else None
+
+    @staticmethod
+    def run_scenario(suite, name, repeat):
+        run, teardown = getattr(suite, f'setup_{name}')()
+        timings, queries, errors = [], [], 0
+        try:
+            # One run to warm up the caches, then one under tracemalloc, which slows everything down.
+            run(0)
+            tracemalloc.start()
+            try:
+                run(1)
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+            for i in range(2, repeat + 2):
+                with CaptureQueriesContext(connection) as context:
+                    started = time.perf_counter()
+                    response = run(i)
+                    timings.append((time.perf_counter() - started) * 1000)
+                queries.append(len(context.captured_queries))
+                errors += response is not None and response.status_code >= 400
+        finally:
+            if teardown is not None:
+                teardown()
+        return {
+            'runs': repeat,
+            'errors': errors,
+            'latency_ms': percentiles(timings),
+            'queries': {'median': float(np.median(queries)), 'max': max(queries)},
+            'peak_memory_kb': peak // 1024,
+        }
@@ -0,0 +1,23 @@
+from datetime import timedelta
+
+from api.jobs import fail_stale_exports, fail_stale_imports
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = 'Mark background jobs left pending or running by a stopped server as failed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, default=None,
+                            help='Only jobs created more than this many minutes ago. Without it every '
+                                 'unfinished job is failed, so run it before the server starts.')
+
+    def handle(self, *args, **options):
+        minutes = options['older_than']
+        if minutes is not None and minutes < 0:
+            raise CommandError('--older-than must not be negative')
+        before = timezone.now() - timedelta(minutes=minutes) if minutes is not None else None
+        imports = fail_stale_imports(before)
+        exports = fail_stale_exports(before)
+        self.stdout.write(self.style.SUCCESS(f'{imports} import jobs and {exports} export jobs marked as failed'))
@@ -0,0 +1,57 @@
+import time
+
+from api.synthetic import generate_project
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Generate a synthetic project of documents annotated by several users'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--name', default='synthetic',
+                            help='The name of the project.')
+        parser.add_argument('--documents', type=int, default=1000,
+                            help='The number of documents.')
+        parser.add_argument('--words', type=int, default=40,
+                            help='The number of words of a document.')
+        parser.add_argument('--labels', type=int, default=5,
+                            help='The number of labels.')
+        parser.add_argument('--relations', type=int, default=3,
+                            help='The number of relations.')
+        parser.add_argument('--users', type=int, default=3,
+                            help='The number of annotators, every document is assigned to each of them.')
+        parser.add_argument('--annotations', type=int, default=3,
+                            help='The number of spans an annotator labels in a document.')
+        parser.add_argument('--connections', type=int, default=2,
+                            help='The number of connections an annotator draws in a document.')
+        parser.add_argument('--agreement', type=float, default=0.8,
+                            help='The probability that an annotator gives a span its reference label.')
+        parser.add_argument('--coverage', type=float, default=1.0,
+                            help='The probability that an annotator has annotated an assigned document.')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='The seed of the random generator.')
+
+    def handle(self, *args, **options):
+        for name in ('agreement', 'coverage'):
+            if not 0 <= options[name] <= 1:
+                raise CommandError(f'--{name} must be between 0 and 1')
+        if options['labels'] < 1 or options['words'] < 1:
+            raise CommandError('--labels and --words must be positive')
+
+        started = time.perf_counter()
+        project = generate_project(
+            options['name'],
+            documents=options['documents'],
+            labels=options['labels'],
+            relations=options['relations'],
+            users=options['users'],
+            annotations=options['annotations'],
+            connections=options['connections'],
+            agreement=options['agreement'],
+            coverage=options['coverage'],
+            words=options['words'],
+            seed=options['seed'],
+        )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Project "{project}" ({project.id}): {project.document_count} documents in {elapsed:.2f}s'))
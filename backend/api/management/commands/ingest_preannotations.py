@@ -0,0 +1,31 @@
+from api.models import Project
+from api.utils import JSONParser, PreAnnotationStorage
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Load model predictions for the documents of a project from a jsonl file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help='jsonl of {"doc_id", "labels", "relations"} lines.')
+        parser.add_argument('--project', type=int, required=True, help='The id of the project.')
+        parser.add_argument('--user', required=True, help='The username the annotations belong to.')
+        parser.add_argument('--encoding', default=None, help='The encoding of the file, detected when omitted.')
+
+    def handle(self, *args, **options):
+        try:
+            project = Project.objects.get(pk=options['project'])
+        except Project.DoesNotExist:
+            raise CommandError(f'Project {options["project"]} does not exist')
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f'User {options["user"]} does not exist')
+
+        with open(options['file'], 'rb') as f:
+            data = JSONParser(encoding=options['encoding']).parse(f, '')
+            metrics = PreAnnotationStorage(data, project).save(user)
+        self.stdout.write(self.style.SUCCESS(
+            f'Project "{project}": {metrics.annotations} annotations and {metrics.connections} connections '
+            f'on {metrics.documents} documents in {metrics.seconds:.2f}s'))
@@ -0,0 +1,26 @@
+import time
+
+from api.models import Project
+from api.search import is_fts, rebuild
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Index the text of documents for search (SQLite only, other databases index by themselves)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--project', type=int, default=None,
+                            help='The id of the project. All documents when omitted.')
+
+    def handle(self, *args, **options):
+        if not is_fts():
+            self.stdout.write('The database indexes documents itself, nothing to rebuild')
+            return
+        project_id = options.get('project')
+        if project_id is not None and not Project.objects.filter(pk=project_id).exists():
+            raise CommandError(f'Project {project_id} does not exist')
+
+        started = time.perf_counter()
+        count = rebuild(None if project_id is None else [project_id])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'{count} documents indexed ({elapsed:.2f}s)'))
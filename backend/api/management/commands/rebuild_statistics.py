@@ -0,0 +1,29 @@
+import time
+
+from api.models import Project
+from api.statistics import rebuild
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Recount the statistics counters of a project from its annotations and documents'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--project', type=int, default=None,
+                            help='The id of the project. All projects when omitted.')
+
+    def handle(self, *args, **options):
+        project_id = options.get('project')
+        projects = Project.objects.all()
+        if project_id is not None:
+            projects = projects.filter(pk=project_id)
+            if not projects.exists():
+                raise CommandError(f'Project {project_id} does not exist')
+
+        for project in projects:
+            started = time.perf_counter()
+            rebuild([project.id])
+            elapsed = time.perf_counter() - started
+            counters = project.statistics_counters.count()
+            self.stdout.write(self.style.SUCCESS(
+                f'Project "{project}": {counters} counters rebuilt ({elapsed:.2f}s)'))
@@ -0,0 +1,29 @@
+import time
+
+from api.concordance import recompute_project
+from api.models import Project
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Recompute the entity and relation concordance of every document of a project'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--project', type=int, default=None,
+                            help='The id of the project. All projects when omitted.')
+
+    def handle(self, *args, **options):
+        project_id = options.get('project')
+        projects = Project.objects.all()
+        if project_id is not None:
+            projects = projects.filter(pk=project_id)
+            if not projects.exists():
+                raise CommandError(f'Project {project_id} does not exist')
+
+        for project in projects:
+            started = time.perf_counter()
+            entity, relation = recompute_project(project)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(self.style.SUCCESS(
+                f'Project "{project}": entity concordance {entity:.4f}, '
+                f'relation concordance {relation:.4f} ({elapsed:.2f}s)'))
@@ -0,0 +1,35 @@
+# Generated by Django 2.2.13 on 2026-10-18 11:23
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file', models.CharField(max_length=255)),
+                ('format', models.CharField(max_length=20)),
+                ('spliter', models.CharField(blank=True, default='', max_length=100)),
+                ('state', models.CharField(choices=[('pending', 'pending'), ('running', 'running'), ('success', 'success'), ('failure', 'failure')], default='pending', max_length=10)),
+                ('documents', models.IntegerField(default=0)),
+                ('annotations', models.IntegerField(default=0)),
+                ('rows_per_sec', models.FloatField(default=0)),
+                ('errors', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='import_jobs', to='api.Project')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 2.2.13 on 2026-10-18 11:25
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('api', '0002_importjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='data_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('format', models.CharField(max_length=20)),
+                ('state', models.CharField(choices=[('pending', 'pending'), ('running', 'running'), ('success', 'success'), ('failure', 'failure')], default='pending', max_length=10)),
+                ('file', models.CharField(blank=True, default='', max_length=255)),
+                ('size', models.BigIntegerField(default=0)),
+                ('watermark', models.DateTimeField(blank=True, null=True)),
+                ('errors', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='export_jobs', to='api.Project')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 2.2.13 on 2026-10-18 11:30
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def count_totals(apps, schema_editor):
+    Project = apps.get_model('api', 'Project')
+    Document = apps.get_model('api', 'Document')
+    totals = Document.objects.values('project').annotate(
+        entity=Sum('entity_concordance'), relation=Sum('relation_concordance'), documents=Count('id'))
+    for row in totals:
+        Project.objects.filter(pk=row['project']).update(
+            entity_concordance_sum=row['entity'],
+            relation_concordance_sum=row['relation'],
+            document_count=row['documents'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_export_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='document_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='entity_concordance_sum',
+            field=models.DecimalField(decimal_places=4, default=0, max_digits=16),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='relation_concordance_sum',
+            field=models.DecimalField(decimal_places=4, default=0, max_digits=16),
+        ),
+        migrations.RunPython(count_totals, migrations.RunPython.noop),
+    ]
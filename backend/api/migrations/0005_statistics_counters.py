@@ -0,0 +1,48 @@
+# Generated by Django 2.2.13 on 2026-10-18 11:33
+
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+
+def count_statistics(apps, schema_editor):
+    Project = apps.get_model('api', 'Project')
+    Document = apps.get_model('api', 'Document')
+    SequenceAnnotation = apps.get_model('api', 'SequenceAnnotation')
+    StatisticsCounter = apps.get_model('api', 'StatisticsCounter')
+    for project_id in Project.objects.values_list('id', flat=True):
+        annotations = SequenceAnnotation.objects.filter(document__project=project_id)
+        counters = []
+        for kind, rows in (
+                ('label', annotations.values_list('label').annotate(Count('id'))),
+                ('user', annotations.values_list('user').annotate(Count('id'))),
+                ('user_documents', annotations.values_list('user').annotate(Count('document', distinct=True)))):
+            counters.extend(StatisticsCounter(project_id=project_id, kind=kind, key=key, value=value)
+                            for key, value in rows.order_by())
+        approved = Document.objects.filter(project=project_id, annotations_approved_by__isnull=False).count()
+        counters.append(StatisticsCounter(project_id=project_id, kind='approved', value=approved))
+        StatisticsCounter.objects.bulk_create(counters)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_project_concordance_totals'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatisticsCounter',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('label', 'label'), ('user', 'user'), ('user_documents', 'user_documents'), ('approved', 'approved')], max_length=20)),
+                ('key', models.IntegerField(default=0)),
+                ('value', models.IntegerField(default=0)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='statistics_counters', to='api.Project')),
+            ],
+            options={
+                'unique_together': {('project', 'kind', 'key')},
+            },
+        ),
+        migrations.RunPython(count_statistics, migrations.RunPython.noop),
+    ]
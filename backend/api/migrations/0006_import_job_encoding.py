@@ -0,0 +1,23 @@
+# Generated by Django 2.2.13 on 2026-10-18 11:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_statistics_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='detection_seconds',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='importjob',
+            name='encoding',
+            field=models.CharField(blank=True, default='', max_length=40),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 2.2.13 on 2026-10-18 12:20
+
+import re
+
+from django.db import migrations
+
+# Frozen copies of api.search at the time of this migration.
+FTS_TABLE = 'api_document_fts'
+TRIGRAM_INDEX = 'api_document_text_trgm'
+CJK = re.compile('([\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af])')
+BATCH_SIZE = 500
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {TRIGRAM_INDEX} '
+                              f'ON api_document USING gin (text gin_trgm_ops)')
+    if vendor != 'sqlite':
+        return
+    schema_editor.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+                          f"USING fts5(text, tokenize='unicode61 remove_diacritics 2')")
+    Document = apps.get_model('api', 'Document')
+    rows = Document.objects.order_by('id').values_list('id', 'text')
+    with schema_editor.connection.cursor() as cursor:
+        batch = []
+        for pk, text in rows.iterator():
+            batch.append((pk, CJK.sub(r' \1 ', text)))
+            if len(batch) >= BATCH_SIZE:
+                cursor.executemany(f'INSERT INTO {FTS_TABLE} (rowid, text) VALUES (%s, %s)', batch)
+                batch = []
+        if batch:
+            cursor.executemany(f'INSERT INTO {FTS_TABLE} (rowid, text) VALUES (%s, %s)', batch)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+    elif vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS {TRIGRAM_INDEX}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_import_job_encoding'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
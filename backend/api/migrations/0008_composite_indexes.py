@@ -0,0 +1,29 @@
+# Generated by Django 2.2.13 on 2026-10-18 12:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_document_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='docmapping',
+            index=models.Index(fields=['rolemap', 'document'], name='api_docmap_rolemap_doc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(fields=['project', 'created_at'], name='api_doc_project_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(fields=['project', 'updated_at'], name='api_doc_project_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(fields=['project', 'annotations_approved_by'], name='api_doc_project_approved_idx'),
+        ),
+    ]
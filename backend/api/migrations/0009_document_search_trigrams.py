@@ -0,0 +1,70 @@
+# Generated by Django 2.2.13 on 2026-10-18 15:40
+
+import re
+import sqlite3
+
+from django.db import migrations
+
+# Frozen copies of api.search at the time of this migration.
+FTS_TABLE = 'api_document_fts'
+FTS_SQLITE_VERSION = (3, 34, 0)
+TRIGRAM_INDEX = 'api_document_text_trgm'
+UPPER_TRIGRAM_INDEX = 'api_document_text_upper_trgm'
+CJK = re.compile('([\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af])')
+BATCH_SIZE = 500
+
+
+def fill(schema_editor, apps, prepare):
+    Document = apps.get_model('api', 'Document')
+    rows = Document.objects.order_by('id').values_list('id', 'text')
+    with schema_editor.connection.cursor() as cursor:
+        batch = []
+        for pk, text in rows.iterator():
+            batch.append((pk, prepare(text)))
+            if len(batch) >= BATCH_SIZE:
+                cursor.executemany(f'INSERT INTO {FTS_TABLE} (rowid, text) VALUES (%s, %s)', batch)
+                batch = []
+        if batch:
+            cursor.executemany(f'INSERT INTO {FTS_TABLE} (rowid, text) VALUES (%s, %s)', batch)
+
+
+def index_substrings(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        # icontains compiles to UPPER("api_document"."text"::text) LIKE UPPER(%s).
+        schema_editor.execute(f'DROP INDEX IF EXISTS {TRIGRAM_INDEX}')
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {UPPER_TRIGRAM_INDEX} '
+                              f'ON api_document USING gin (UPPER(text) gin_trgm_ops)')
+    if vendor != 'sqlite':
+        return
+    schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+    if sqlite3.sqlite_version_info < FTS_SQLITE_VERSION:
+        # No trigram tokenizer, searches scan the documents.
+        return
+    schema_editor.execute(f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(text, tokenize='trigram')")
+    fill(schema_editor, apps, lambda text: text)
+
+
+def index_tokens(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS {UPPER_TRIGRAM_INDEX}')
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {TRIGRAM_INDEX} '
+                              f'ON api_document USING gin (text gin_trgm_ops)')
+    if vendor != 'sqlite':
+        return
+    schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+    schema_editor.execute(f"CREATE VIRTUAL TABLE {FTS_TABLE} "
+                          f"USING fts5(text, tokenize='unicode61 remove_diacritics 2')")
+    fill(schema_editor, apps, lambda text: CJK.sub(r' \1 ', text))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(index_substrings, index_tokens),
+    ]
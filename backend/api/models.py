@@ -1,10 +1,8 @@
 import string
-import numpy as np
 
 from django.db import models
 from django.dispatch import receiver
-from django.db.models import Count
-from django.db.models.signals import post_save, pre_delete, post_delete
+from django.db.models.signals import post_save, pre_save, pre_delete, post_delete
 from django.urls import reverse
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
@@ -23,6 +21,12 @@ class Project(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     users = models.ManyToManyField(User, related_name='projects')
+    # 数据（文档、标注、连线）最后修改时间
+    data_updated_at = models.DateTimeField(null=True, blank=True)
+    # 文档一致性之和与文档数，项目一致性为两者之商
+    entity_concordance_sum = models.DecimalField(default=0, max_digits=16, decimal_places=4)
+    relation_concordance_sum = models.DecimalField(default=0, max_digits=16, decimal_places=4)
+    document_count = models.IntegerField(default=0)
     
     def get_absolute_url(self):
         return reverse('upload', args=[self.id])
@@ -122,6 +126,14 @@ class Document(models.Model):
     entity_concordance = models.DecimalField(default=1.00, max_digits=6, decimal_places=4)
     relation_concordance = models.DecimalField(default=1.00, max_digits=6, decimal_places=4)
 
+    class Meta:
+        # 项目内按时间排序、统计已审核文档
+        indexes = [
+            models.Index(fields=['project', 'created_at'], name='api_doc_project_created_idx'),
+            models.Index(fields=['project', 'updated_at'], name='api_doc_project_updated_idx'),
+            models.Index(fields=['project', 'annotations_approved_by'], name='api_doc_project_approved_idx'),
+        ]
+
     def __str__(self):
         return self.text[:50]
 
@@ -209,110 +221,221 @@ class DocMapping(models.Model):
 
     class Meta:
         unique_together = ("project", "document", "rolemap")
+        # 按用户（角色）查分配的文档
+        indexes = [
+            models.Index(fields=['rolemap', 'document'], name='api_docmap_rolemap_doc_idx'),
+        ]
+
+
+class StatisticsCounter(models.Model):
+    # 项目统计计数，随标注与审核的修改而更新
+    LABEL = 'label'
+    USER = 'user'
+    USER_DOCUMENTS = 'user_documents'
+    APPROVED = 'approved'
+    KINDS = (
+        (LABEL, LABEL),
+        (USER, USER),
+        (USER_DOCUMENTS, USER_DOCUMENTS),
+        (APPROVED, APPROVED),
+    )
+    project = models.ForeignKey(Project, related_name='statistics_counters', on_delete=models.CASCADE)
+    kind = models.CharField(max_length=20, choices=KINDS)
+    # 标签 id 或用户 id，已审核文档数为 0
+    key = models.IntegerField(default=0)
+    value = models.IntegerField(default=0)
 
+    class Meta:
+        unique_together = ('project', 'kind', 'key')
+
+
+class ImportJob(models.Model):
+    # 后台导入任务
+    PENDING = 'pending'
+    RUNNING = 'running'
+    SUCCESS = 'success'
+    FAILURE = 'failure'
+    STATES = (
+        (PENDING, PENDING),
+        (RUNNING, RUNNING),
+        (SUCCESS, SUCCESS),
+        (FAILURE, FAILURE),
+    )
+    project = models.ForeignKey(Project, related_name='import_jobs', on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # 暂存在磁盘上的上传文件
+    file = models.CharField(max_length=255)
+    format = models.CharField(max_length=20)
+    spliter = models.CharField(max_length=100, blank=True, default='')
+    # 上传时指定的编码，完成后为实际使用的编码
+    encoding = models.CharField(max_length=40, blank=True, default='')
+    state = models.CharField(max_length=10, choices=STATES, default=PENDING)
+    documents = models.IntegerField(default=0)
+    annotations = models.IntegerField(default=0)
+    rows_per_sec = models.FloatField(default=0)
+    # 检测编码所用时间（秒）
+    detection_seconds = models.FloatField(default=0)
+    errors = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
 
-def fleiss(table, n):
-    table = 1.0 * np.asarray(table) 
-    n_sub, _ = table.shape
-
-    if table.sum() != n * n_sub:
-        n_add = n - table.sum(1)
-        table = np.insert(table, 0, values=n_add, axis=1)
-  
-    p_j = table.sum(0) / (n_sub * n)
-    table2 = table * table
-    p_i = (table2.sum(1) - n) / (n * (n - 1.))
-
-    p_o = p_i.mean()
-    p_e = (p_j*p_j).sum()
-    if p_e == 1.:
-        return 1.
-    kappa = (p_o - p_e) / (1 - p_e)
-    return kappa
-
-def comput_annotation_concordance(instance):
-    documentInstance = instance.document
-    if not documentInstance:
-        return
-    document = Document.objects.get(pk=documentInstance.pk)
-    annotations = SequenceAnnotation.objects.filter(document=document.id)
-    users = annotations.values('user').annotate(count=Count('user'))
-    # 无标签或只有一个用户
-    if len(users) < 2:
-        document.entity_concordance = 1
-        document.save()
-        return
+    def __str__(self):
+        return f'{self.format} import into {self.project} ({self.state})'
 
-    labels = annotations.values('label').annotate(count=Count('label'))
-
-    annotation_json = {}
-    for a in annotations:
-        key = str(a.start_offset) + '_' + str(a.end_offset)
-        if not key in annotation_json.keys():
-            annotation_json[key] = {k['label']:0 for k in labels}
-        annotation_json[key][a.label.id] = annotation_json[key][a.label.id] + 1
-    annotation_list = [[j for i, j in v.items()] for k, v in annotation_json.items()]
-    f = fleiss(annotation_list, len(users))
-    document.entity_concordance = f
-    document.save()
-
-def comput_relation_concordance(instance):
-    documentInstance = instance.document
-    if not documentInstance:
-        return
-    document = Document.objects.get(pk=documentInstance.pk)
-    connections = Connection.objects.filter(document=document.id)
-    
-    connection_list = []
-    users = []
-    labels = []
-    for c in connections:
-        temp = {}
-        source = c.source
-        end = c.to
-        temp['path'] = str(source.start_offset) + '_' + str(source.end_offset) + '__' + str(end.start_offset) + '_' + str(end.end_offset)
-        temp['user'] = source.user.id
-        if c.relation:
-            temp['label'] = c.relation.id
-        else:
-            temp['label'] = 0
-        if temp['user'] not in users:
-            users.append(temp['user'])
-        if temp['label'] not in labels:
-            labels.append(temp['label'])
-        connection_list.append(temp)
-    
-    if len(users) < 2:
-        document.relation_concordance = 1
-        document.save()
-        return
 
-    connection_json = {}
-    for c in connection_list:
-        key = c['path']
-        if not key in connection_json.keys():
-            connection_json[key] = {k:0 for k in labels}
-        connection_json[key][c['label']] = connection_json[key][c['label']] + 1
-    connection_list2 = [[j for i, j in v.items()] for k, v in connection_json.items()]
-    f = fleiss(connection_list2, len(users))
-    document.relation_concordance = f
-    document.save()
+class ExportJob(models.Model):
+    # 后台导出任务，状态与导入任务相同
+    PENDING = ImportJob.PENDING
+    RUNNING = ImportJob.RUNNING
+    SUCCESS = ImportJob.SUCCESS
+    FAILURE = ImportJob.FAILURE
+    STATES = ImportJob.STATES
+    project = models.ForeignKey(Project, related_name='export_jobs', on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    format = models.CharField(max_length=20)
+    state = models.CharField(max_length=10, choices=STATES, default=PENDING)
+    # 导出文件
+    file = models.CharField(max_length=255, blank=True, default='')
+    size = models.BigIntegerField(default=0)
+    # 导出时项目的 data_updated_at
+    watermark = models.DateTimeField(null=True, blank=True)
+    errors = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def is_fresh(self):
+        return self.state == self.SUCCESS and bool(self.file) \
+            and self.watermark == self.project.data_updated_at
+
+    def __str__(self):
+        return f'{self.format} export of {self.project} ({self.state})'
+
 
 @receiver(post_save, sender=SequenceAnnotation)
 def save_annotation_comput_concordance(sender, instance, created, **kwargs):
-    comput_annotation_concordance(instance)
+    from .concordance import mark_dirty
+    mark_dirty(instance.document_id, entity=True)
         
 @receiver(post_delete, sender=SequenceAnnotation)
 def delete_annotation_comput_concordance(sender, instance, using, **kwargs):
-    comput_annotation_concordance(instance)
+    from .concordance import mark_dirty
+    mark_dirty(instance.document_id, entity=True)
+
+@receiver(pre_save, sender=SequenceAnnotation)
+def save_annotation_remember_previous(sender, instance, **kwargs):
+    if instance.pk is None:
+        return
+    instance._previous = SequenceAnnotation.objects.filter(pk=instance.pk).first()
+
+@receiver(post_save, sender=SequenceAnnotation)
+def save_annotation_count_statistics(sender, instance, created, **kwargs):
+    from .statistics import count_annotation
+    previous = getattr(instance, '_previous', None)
+    if previous is not None:
+        count_annotation(previous, sign=-1)
+    count_annotation(instance)
+
+@receiver(post_delete, sender=SequenceAnnotation)
+def delete_annotation_count_statistics(sender, instance, using, **kwargs):
+    from .statistics import count_annotation
+    count_annotation(instance, sign=-1)
 
 @receiver(post_save, sender=Connection)
 def save_connection_comput_concordance(sender, instance, created, **kwargs):
-    comput_relation_concordance(instance)
+    from .concordance import mark_dirty
+    mark_dirty(instance.document_id, relation=True)
         
 @receiver(post_delete, sender=Connection)
 def delete_connection_comput_concordance(sender, instance, using, **kwargs):
-    comput_relation_concordance(instance)
+    from .concordance import mark_dirty
+    mark_dirty(instance.document_id, relation=True)
+
+
+@receiver(post_save, sender=Document)
+def save_document_mark_project_changed(sender, instance, created, **kwargs):
+    from .changes import mark_project_changed
+    mark_project_changed(instance.project_id)
+
+@receiver(post_delete, sender=Document)
+def delete_document_mark_project_changed(sender, instance, using, **kwargs):
+    from .changes import mark_project_changed
+    mark_project_changed(instance.project_id)
+
+@receiver(pre_save, sender=Document)
+def save_document_remember_approver(sender, instance, **kwargs):
+    if instance.pk is None:
+        return
+    instance._previous_approver = Document.objects.filter(pk=instance.pk)\
+        .values_list('annotations_approved_by', flat=True).first()
+
+@receiver(post_save, sender=Document)
+def save_document_count_approval(sender, instance, created, **kwargs):
+    from .statistics import count_approval
+    was_approved = getattr(instance, '_previous_approver', None) is not None
+    is_approved = instance.annotations_approved_by_id is not None
+    if is_approved != was_approved:
+        count_approval(instance.project_id, 1 if is_approved else -1)
+
+@receiver(pre_delete, sender=Project)
+def delete_project_skip_statistics(sender, instance, using, **kwargs):
+    from .statistics import deleting_project
+    deleting_project(instance.id)
+
+@receiver(pre_delete, sender=Document)
+def delete_document_collect_statistics(sender, instance, using, **kwargs):
+    from .statistics import deleting_document
+    deleting_document(instance.id)
+
+@receiver(post_delete, sender=Document)
+def delete_document_count_statistics(sender, instance, using, **kwargs):
+    from .statistics import count_deleted_document
+    count_deleted_document(instance)
+
+@receiver(post_save, sender=Document)
+def save_document_add_to_project_totals(sender, instance, created, **kwargs):
+    from .concordance import add_to_project_totals
+    if created:
+        add_to_project_totals(instance.project_id, instance.entity_concordance, instance.relation_concordance, 1)
+
+@receiver(pre_delete, sender=Document)
+def delete_document_subtract_from_project_totals(sender, instance, using, **kwargs):
+    from .concordance import subtract_from_project_totals
+    subtract_from_project_totals(instance)
+
+@receiver(post_save, sender=Document)
+def save_document_index_text(sender, instance, created, update_fields=None, **kwargs):
+    from .search import index_later
+    if update_fields is None or 'text' in update_fields:
+        index_later([instance.id])
+
+@receiver(post_delete, sender=Document)
+def delete_document_index_text(sender, instance, using, **kwargs):
+    from .search import index_later
+    index_later([instance.id])
+
+
+@receiver(post_save, sender=Label)
+@receiver(post_save, sender=Relation)
+def save_label_mark_project_changed(sender, instance, created, **kwargs):
+    from .changes import mark_project_changed
+    mark_project_changed(instance.project_id)
+
+@receiver(post_delete, sender=Label)
+@receiver(post_delete, sender=Relation)
+def delete_label_mark_project_changed(sender, instance, using, **kwargs):
+    from .changes import mark_project_changed
+    mark_project_changed(instance.project_id)
+
+@receiver(pre_delete, sender=Label)
+def delete_label_collect_statistics(sender, instance, using, **kwargs):
+    from .statistics import deleting_label
+    deleting_label(instance.id)
+
+@receiver(post_delete, sender=Label)
+def delete_label_count_statistics(sender, instance, using, **kwargs):
+    from .statistics import count_deleted_label
+    count_deleted_label(instance)
 
 
 @receiver(post_save, sender=RoleMapping)
@@ -327,6 +450,25 @@ def add_linked_project(sender, instance, created, **kwargs):
         user.projects.add(project)
         user.save()
 
+@receiver(pre_save, sender=RoleMapping)
+def save_rolemapping_forget_previous_role(sender, instance, **kwargs):
+    from .permissions import forget_role
+    if instance.pk is None:
+        return
+    previous = RoleMapping.objects.filter(pk=instance.pk).values_list('user_id', 'project_id').first()
+    if previous:
+        forget_role(*previous)
+
+@receiver(post_save, sender=RoleMapping)
+def save_rolemapping_forget_role(sender, instance, **kwargs):
+    from .permissions import forget_role
+    forget_role(instance.user_id, instance.project_id)
+
+@receiver(post_delete, sender=RoleMapping)
+def delete_rolemapping_forget_role(sender, instance, using, **kwargs):
+    from .permissions import forget_role
+    forget_role(instance.user_id, instance.project_id)
+
 @receiver(pre_delete, sender=RoleMapping)
 def delete_linked_project(sender, instance, using, **kwargs):
     userInstance = instance.user
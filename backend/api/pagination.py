@@ -0,0 +1,178 @@
+"""Pagination of large lists.
+
+`DocumentPagination` pages with limit and offset like the rest of the API.
+`?count=false` skips the COUNT(*) of the whole list. `?pagination=cursor`
+or a `cursor` switches to keyset pagination: rows are filtered on the
+(ordering field, id) of the last row seen instead of being skipped, so every
+page costs the same however deep it is.
+"""
+import base64
+import json
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def is_false(value):
+    return str(value).lower() in ('0', 'false', 'no')
+
+
+class KeysetPagination(BasePagination):
+    """Pages ordered by one of `fields`, then by id, and cut by a cursor.
+
+    The cursor holds the ordering value and the id of the row a page
+    starts after, and whether the page goes backwards from it.
+    """
+    cursor_query_param = 'cursor'
+    limit_query_param = 'limit'
+    ordering_param = 'ordering'
+    fields = ('id', 'created_at', 'updated_at')
+    datetime_fields = ('created_at', 'updated_at')
+    max_limit = 1000
+
+    def __init__(self, default_limit):
+        self.default_limit = default_limit
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.limit = self.get_limit(request)
+        self.field, self.descending = self.get_ordering(request)
+        position, reverse = self.decode_cursor(request)
+
+        descending = self.descending != reverse
+        prefix, lookup = ('-', 'lt') if descending else ('', 'gt')
+        if self.field == 'id':
+            queryset = queryset.order_by(f'{prefix}id')
+        else:
+            queryset = queryset.order_by(f'{prefix}{self.field}', f'{prefix}id')
+        if position is not None:
+            value, pk = position
+            if self.field == 'id':
+                queryset = queryset.filter(**{f'id__{lookup}': pk})
+            else:
+                queryset = queryset.filter(Q(**{f'{self.field}__{lookup}': value}) |
+                                           Q(**{self.field: value, f'id__{lookup}': pk}))
+
+        rows = list(queryset[:self.limit + 1])
+        has_more = len(rows) > self.limit
+        rows = rows[:self.limit]
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        self.rows = rows
+        return rows
+
+    def get_limit(self, request):
+        try:
+            limit = int(request.query_params.get(self.limit_query_param, self.default_limit))
+        except ValueError:
+            return self.default_limit
+        return max(1, min(limit, self.max_limit))
+
+    def get_ordering(self, request):
+        ordering = request.query_params.get(self.ordering_param, '').split(',')[0].strip()
+        field = ordering.lstrip('-')
+        if field not in self.fields:
+            return 'id', False
+        return field, ordering.startswith('-')
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None, False
+        try:
+            value, pk, reverse = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+            if self.field in self.datetime_fields:
+                value = parse_datetime(value)
+            if value is None:
+                raise ValueError(cursor)
+            return (value, int(pk)), bool(reverse)
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound('Invalid cursor')
+
+    def encode_cursor(self, row, reverse):
+        value = getattr(row, self.field)
+        if self.field in self.datetime_fields:
+            value = value.isoformat()
+        cursor = json.dumps([value, row.pk, reverse]).encode('utf-8')
+        return base64.urlsafe_b64encode(cursor).decode('ascii')
+
+    def get_link(self, row, reverse):
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(row, reverse))
+
+    def get_next_link(self):
+        if not self.has_next or not self.rows:
+            return None
+        return self.get_link(self.rows[-1], False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.rows:
+            return None
+        return self.get_link(self.rows[0], True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+
+class DocumentPagination(LimitOffsetPagination):
+    count_query_param = 'count'
+    pagination_query_param = 'pagination'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if request.query_params.get(self.pagination_query_param) == 'cursor' \
+                or KeysetPagination.cursor_query_param in request.query_params:
+            self.keyset = KeysetPagination(self.default_limit)
+            return self.keyset.paginate_queryset(queryset, request, view)
+        if not is_false(request.query_params.get(self.count_query_param, True)):
+            return super().paginate_queryset(queryset, request, view)
+
+        # Without the count, one more row tells whether there is a next page.
+        self.limit = self.get_limit(request)
+        self.offset = self.get_offset(request)
+        self.request = request
+        self.count = None
+        rows = list(queryset[self.offset:self.offset + self.limit + 1])
+        self.has_next = len(rows) > self.limit
+        return rows[:self.limit]
+
+    def get_count(self, queryset):
+        # Selecting the ids only keeps annotations out of the counting subquery.
+        return queryset.values('pk').count()
+
+    def get_next_link(self):
+        if self.count is not None:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        return replace_query_param(url, self.offset_query_param, self.offset + self.limit)
+
+    def get_previous_link(self):
+        if self.count is not None:
+            return super().get_previous_link()
+        if self.offset <= 0:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        if self.offset - self.limit <= 0:
+            return remove_query_param(url, self.offset_query_param)
+        return replace_query_param(url, self.offset_query_param, self.offset - self.limit)
+
+    def get_paginated_response(self, data):
+        if self.keyset:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
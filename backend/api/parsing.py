@@ -0,0 +1,75 @@
+"""Parsing of line based uploads in worker processes.
+
+Nothing here imports Django, so the workers started by
+`FileParser.parse_parallel` in `api/utils.py` only load this module. An
+upload is cut into byte ranges that end on line boundaries, each range is
+decoded and parsed on its own, and the records come back to the importing
+process in file order. There the storage validates and saves them, since
+checking pre-annotations needs the project's documents.
+"""
+import io
+import json
+import os
+
+# Bytes parsed by one task
+RANGE_SIZE = 4 * 1024 * 1024
+
+
+def encode_metadata(data):
+    return json.dumps(data, ensure_ascii=False)
+
+
+def parse_json_line(line):
+    """The record of a jsonl line, raises ValueError when it is not a JSON object."""
+    j = json.loads(line)
+    if not isinstance(j, dict):
+        raise ValueError('not an object')
+    j['meta'] = encode_metadata(j.get('meta', {}))
+    return j
+
+
+def splits_on_newline(encoding):
+    """Whether cutting the encoded text after b'\\n' bytes keeps every character whole."""
+    try:
+        # A BOM may come first, as with utf-8-sig.
+        return 'a\n'.encode(encoding).endswith(b'a\n')
+    except LookupError:
+        return False
+
+
+def split_ranges(path, size=RANGE_SIZE):
+    """(start, end) byte ranges of about `size` covering the file and ending after a newline."""
+    total = os.path.getsize(path)
+    ranges, start = [], 0
+    with open(path, 'rb') as f:
+        while start < total:
+            f.seek(min(start + size, total))
+            f.readline()
+            end = min(f.tell(), total)
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def parse_range(path, start, end, encoding, file_format):
+    """Parse the lines between `start` and `end`.
+
+    Returns the records, the number of lines and, when a line is invalid,
+    its number within the range and its text. Lines are split like a text
+    file opened with universal newlines.
+    """
+    with open(path, 'rb') as f:
+        f.seek(start)
+        text = f.read(end - start).decode(encoding)
+    lines = io.StringIO(text, newline=None)
+    if file_format == 'plain':
+        records = [{'text': line} for line in lines]
+        return records, len(records), None
+
+    records = []
+    for i, line in enumerate(lines, start=1):
+        try:
+            records.append(parse_json_line(line))
+        except ValueError:
+            return records, i, (i, line)
+    return records, len(records), None
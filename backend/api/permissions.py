@@ -1,9 +1,11 @@
 from django.conf import settings
-from django.db.models import Subquery
-from django.shortcuts import get_object_or_404
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
 from rest_framework.permissions import BasePermission, SAFE_METHODS, IsAdminUser
 
-from .models import Role, RoleMapping
+from .models import RoleMapping
 
 
 class ProjectMixin:
@@ -36,7 +38,7 @@ class RolePermission(ProjectMixin, BasePermission):
         if not project_id and request.method in SAFE_METHODS:
             return True
 
-        return is_in_role(self.role_name, request.user.id, project_id)
+        return is_in_role(self.role_name, request.user.id, project_id, request)
 
 
 class IsProjectAdmin(RolePermission):
@@ -62,9 +64,51 @@ class IsAnnotationApprover(RolePermission):
     role_name = settings.ROLE_ANNOTATION_APPROVER
 
 
-def is_in_role(role_name, user_id, project_id):
-    return RoleMapping.objects.filter(
-        user_id=user_id,
-        project_id=project_id,
-        role_id=Subquery(Role.objects.filter(name=role_name).values('id')),
-    ).exists()
+def is_in_role(role_name, user_id, project_id, request=None):
+    return role_name in get_roles(user_id, project_id, request)
+
+
+def role_cache_key(user_id, project_id):
+    return f'roles:{user_id}:{project_id}'
+
+
+def is_cache_shared():
+    """Whether the cache is seen by every worker process, so that evicting a role reaches them all."""
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def get_roles(user_id, project_id, request=None):
+    """Names of the roles of a user in a project, a frozenset.
+
+    Roles are cached on `request`, so the permission classes, the view
+    and the serializers of a request share one lookup. With
+    ROLE_CACHE_TIMEOUT set and a cache shared by the worker processes,
+    they are also cached across requests; saving or deleting a
+    RoleMapping evicts them.
+    """
+    try:
+        key = role_cache_key(int(user_id), int(project_id))
+    except (TypeError, ValueError):
+        return frozenset()
+    roles = getattr(request, '_roles', None)
+    if roles is None:
+        roles = {}
+        if request is not None:
+            request._roles = roles
+    if key not in roles:
+        shared = settings.ROLE_CACHE_TIMEOUT > 0 and is_cache_shared()
+        names = cache.get(key) if shared else None
+        if names is None:
+            names = sorted(RoleMapping.objects.filter(user_id=user_id, project_id=project_id)
+                           .values_list('role__name', flat=True).distinct())
+            if shared:
+                cache.set(key, names, settings.ROLE_CACHE_TIMEOUT)
+        roles[key] = frozenset(names)
+    return roles[key]
+
+
+def forget_role(user_id, project_id):
+    key = role_cache_key(user_id, project_id)
+    cache.delete(key)
+    # Again once committed, in case a concurrent request cached the old role meanwhile.
+    transaction.on_commit(lambda: cache.delete(key))
@@ -0,0 +1,105 @@
+"""Full-text search of documents.
+
+Every word of the search box must be found somewhere in the text, in any
+case, like the `icontains` lookups of SearchFilter. The backend follows the
+database:
+
+- SQLite 3.34 and later: an FTS5 table, `api_document_fts`, whose rowids
+  are document ids and whose trigram tokenizer finds any substring of
+  three characters or more, Chinese text included. Shorter words fall back
+  to `icontains`.
+- PostgreSQL: a pg_trgm GIN index on UPPER(text), the expression Django
+  compiles `icontains` to. Trigrams of CJK text need a UTF-8 locale that
+  counts it as letters.
+- Anything else: `icontains`, a full scan.
+
+Migrations 0007 and 0009 create the index. The SQLite index follows
+documents as they are created, updated and deleted: the ids are collected
+while a transaction runs and re-indexed when it commits.
+`rebuild_search_index` fills it again after changes made behind the ORM's
+back.
+"""
+import sqlite3
+
+from django.db import connection, transaction
+
+from .changes import collect
+from .models import Document
+
+FTS_TABLE = 'api_document_fts'
+
+# The first SQLite with the trigram tokenizer
+FTS_SQLITE_VERSION = (3, 34, 0)
+
+# Shortest word the trigram index can find
+MIN_TRIGRAM_LENGTH = 3
+
+# Documents indexed by one statement
+INDEX_BATCH_SIZE = 500
+
+
+def to_match_query(terms):
+    """An FTS5 query that ANDs `terms` as substrings, every one at least a trigram long."""
+    return ' AND '.join('"{}"'.format(term.replace('"', '""')) for term in terms)
+
+
+def is_fts():
+    return connection.vendor == 'sqlite' and sqlite3.sqlite_version_info >= FTS_SQLITE_VERSION
+
+
+def search(queryset, q):
+    """Documents of `queryset` whose text contains every word of `q`."""
+    terms = q.split()
+    if not is_fts():
+        for term in terms:
+            queryset = queryset.filter(text__icontains=term)
+        return queryset
+    indexed = [term for term in terms if len(term) >= MIN_TRIGRAM_LENGTH]
+    for term in terms:
+        if len(term) < MIN_TRIGRAM_LENGTH:
+            queryset = queryset.filter(text__icontains=term)
+    if not indexed:
+        return queryset
+    # Not pk__in=RawSQL(...), which SQLite reads as IN (scalar subquery) and matches the first row only.
+    column = '{}.{}'.format(connection.ops.quote_name(Document._meta.db_table), connection.ops.quote_name('id'))
+    return queryset.extra(where=[f'{column} IN (SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s)'],
+                          params=[to_match_query(indexed)])
+
+
+def index_later(document_ids):
+    """Re-index documents when the transaction commits."""
+    if not is_fts():
+        return
+    with collect(flush, set) as pending:
+        pending.update(document_ids)
+
+
+def flush(document_ids):
+    document_ids = list(document_ids)
+    for i in range(0, len(document_ids), INDEX_BATCH_SIZE):
+        index(document_ids[i:i + INDEX_BATCH_SIZE])
+
+
+def index(document_ids):
+    """Bring the index entries of documents in line with their text, dropping deleted ones."""
+    placeholders = ', '.join(['%s'] * len(document_ids))
+    rows = Document.objects.filter(pk__in=document_ids).values_list('id', 'text')
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', document_ids)
+        cursor.executemany(f'INSERT INTO {FTS_TABLE} (rowid, text) VALUES (%s, %s)', list(rows.iterator()))
+
+
+def rebuild(project_ids=None):
+    """Index the documents of projects, all documents when None; returns how many."""
+    if not is_fts():
+        return 0
+    documents = Document.objects.order_by('id')
+    if project_ids is not None:
+        documents = documents.filter(project__in=project_ids)
+    document_ids = list(documents.values_list('id', flat=True))
+    with transaction.atomic():
+        if project_ids is None:
+            with connection.cursor() as cursor:
+                cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        flush(document_ids)
+    return len(document_ids)
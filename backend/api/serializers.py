@@ -1,13 +1,14 @@
-import numpy as np
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Subquery
-from django.shortcuts import get_object_or_404
+from django.db.models import Count, IntegerField, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce, Substr
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 
-from .models import (Connection, DocMapping, Document, Label, Project,
+from .jobs import get_progress
+from .models import (Connection, DocMapping, Document, ExportJob, ImportJob, Label, Project,
                      Relation, Role, RoleMapping, SequenceAnnotation)
+from .permissions import get_roles, is_in_role
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -65,54 +66,78 @@ class DocumentSerializer(serializers.ModelSerializer):
     approver_assign = serializers.SerializerMethodField()
 
     def is_role_of(self, user_id, project_id, role_name):
-        return RoleMapping.objects.filter(
-                    user_id=user_id,
-                    project_id=project_id,
-                    role_id=Subquery(Role.objects.filter(name=role_name).values('id')),
-                ).exists()
+        return is_in_role(role_name, user_id, project_id, self.context.get('request'))
+
+    @staticmethod
+    def setup_eager_loading(queryset, annotator=None):
+        """Prefetch everything the serializer reads so a page costs a fixed number of queries.
+
+        Pass the requesting user as `annotator` when they are an annotator of
+        the project: the serializer then trusts the prefetched annotations to
+        be theirs only.
+        """
+        annotations = SequenceAnnotation.objects.select_related('user')
+        if annotator is not None:
+            annotations = annotations.filter(user=annotator)
+        doc_mappings = DocMapping.objects.select_related('rolemap__user', 'rolemap__role')
+        return queryset.select_related('project', 'annotations_approved_by').prefetch_related(
+            Prefetch('seq_annotations', queryset=annotations),
+            'seq_connections',
+            Prefetch('docmapping_set', queryset=doc_mappings),
+        )
+
+    @staticmethod
+    def is_prefetched(instance, name):
+        return name in getattr(instance, '_prefetched_objects_cache', {})
+
+    def is_annotator(self, request, project):
+        # The child of a ListSerializer is shared by all documents of the page.
+        if not hasattr(self, '_annotator_of'):
+            self._annotator_of = {}
+        if project.id not in self._annotator_of:
+            self._annotator_of[project.id] = self.is_role_of(request.user.id, project.id, settings.ROLE_ANNOTATOR)
+        return self._annotator_of[project.id]
 
     def get_annotations(self, instance):
         project = instance.project
-        model = project.get_annotation_class()
         serializer = project.get_annotation_serializer()
-        annotations = model.objects.filter(document=instance.id)
-        
-        request = self.context.get("request")
-        if request and self.is_role_of(request.user.id, project.id, 'annotator'):
-            annotations = annotations.filter(user=request.user)
+        if self.is_prefetched(instance, 'seq_annotations'):
+            annotations = instance.seq_annotations.all()
+        else:
+            annotations = instance.seq_annotations.select_related('user')
+            request = self.context.get("request")
+            if request and self.is_annotator(request, project):
+                annotations = annotations.filter(user=request.user)
 
-        serializer = serializer(annotations, many=True)
-        return serializer.data
+        return self.to_representation_many(serializer, annotations)
     
     def get_connections(self, instance):
         project = instance.project
-        model = project.get_connection_class()
         serializer = project.get_connection_serializer()
-        connections = model.objects.filter(document=instance.id)
-        serializer = serializer(connections, many=True)
-        return serializer.data
+        connections = instance.seq_connections.all()
+        return self.to_representation_many(serializer, connections)
+
+    def to_representation_many(self, serializer_class, instances):
+        # Building a serializer's fields is costly, so one nested serializer is reused for all documents.
+        if not hasattr(self, '_nested_serializers'):
+            self._nested_serializers = {}
+        if serializer_class not in self._nested_serializers:
+            self._nested_serializers[serializer_class] = serializer_class()
+        serializer = self._nested_serializers[serializer_class]
+        return [serializer.to_representation(instance) for instance in instances]
+
+    def get_doc_mappings(self, instance, role_name):
+        if self.is_prefetched(instance, 'docmapping_set'):
+            mappings = instance.docmapping_set.all()
+        else:
+            mappings = instance.docmapping_set.select_related('rolemap__user', 'rolemap__role')
+        return [m.rolemap.user.username for m in mappings if m.rolemap.role.name == role_name]
     
     def get_annotator_assign(self, instance):
-        project = instance.project
-        model = project.get_docmapping_class()
-        serializer = project.get_docmapping_serializer()
-        assign = model.objects.filter(document=instance.id, rolemap__role__name='annotator')
-        serializer = serializer(assign, many=True)
-        users = []
-        for i in serializer.data:
-            users.append(i['username'])
-        return users
+        return self.get_doc_mappings(instance, 'annotator')
 
     def get_approver_assign(self, instance):
-        project = instance.project
-        model = project.get_docmapping_class()
-        serializer = project.get_docmapping_serializer()
-        assign = model.objects.filter(document=instance.id, rolemap__role__name='annotation_approver')
-        serializer = serializer(assign, many=True)
-        users = []
-        for i in serializer.data:
-            users.append(i['username'])
-        return users
+        return self.get_doc_mappings(instance, 'annotation_approver')
 
     @classmethod
     def get_annotation_approver(cls, instance):
@@ -124,6 +149,60 @@ class DocumentSerializer(serializers.ModelSerializer):
         fields = ('id', 'text', 'annotations', 'connections', 'annotation_approver', 'approver_assign', 'annotator_assign', 'entity_concordance', 'relation_concordance')
 
 
+class DocumentSummarySerializer(serializers.ModelSerializer):
+    """A light row of a document list: a preview of the text, its status and counts.
+
+    `?fields=` picks some of the fields, all of them when it is empty. The
+    preview and the counts are computed by the database, so neither the
+    full text nor the annotations are loaded.
+    """
+    PREVIEW_LENGTH = 200
+    text = serializers.CharField(source='text_preview', read_only=True)
+    status = serializers.SerializerMethodField()
+    annotation_count = serializers.IntegerField(read_only=True)
+    connection_count = serializers.IntegerField(read_only=True)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        requested = request.query_params.get('fields') if request else None
+        if requested:
+            names = {name.strip() for name in requested.split(',')}
+            unknown = names - set(self.fields)
+            if unknown:
+                raise ValidationError('fields {} are invalid.'.format(', '.join(sorted(unknown))))
+            for name in set(self.fields) - names:
+                self.fields.pop(name)
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, annotator=None):
+        """Annotate the preview and the counts; annotators only count their own annotations."""
+        annotations = SequenceAnnotation.objects.filter(document=OuterRef('pk'))
+        if annotator is not None:
+            annotations = annotations.filter(user=annotator)
+        connections = Connection.objects.filter(document=OuterRef('pk'))
+        return queryset.defer('text', 'meta').annotate(
+            text_preview=Substr('text', 1, cls.PREVIEW_LENGTH),
+            annotation_count=cls.count(annotations),
+            connection_count=cls.count(connections),
+        )
+
+    @staticmethod
+    def count(queryset):
+        counts = queryset.order_by().values('document').annotate(count=Count('id')).values('count')
+        return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+    @staticmethod
+    def get_status(instance):
+        if instance.annotations_approved_by_id:
+            return 'approved'
+        return 'annotated' if instance.annotation_count else 'new'
+
+    class Meta:
+        model = Document
+        fields = ('id', 'text', 'status', 'annotation_count', 'connection_count')
+
+
 class ApproverSerializer(DocumentSerializer):
 
     class Meta:
@@ -142,37 +221,28 @@ class ProjectSerializer(serializers.ModelSerializer):
             "is_annotator": settings.ROLE_ANNOTATOR,
             "is_annotation_approver": settings.ROLE_ANNOTATION_APPROVER,
         }
-        queryset = RoleMapping.objects.values("role_id__name")
-        if self.context.get("request").user.is_superuser:
+        request = self.context.get("request")
+        if request.user.is_superuser:
             role_abstractor = {
                 "is_project_admin": True,
                 "is_annotator": False,
                 "is_annotation_approver": False,
             }
             return role_abstractor
-        if queryset:
-            users_role = get_object_or_404(
-                queryset, project=instance.id, user=self.context.get("request").user.id
-            )
-            for key, val in role_abstractor.items():
-                role_abstractor[key] = users_role["role_id__name"] == val
+        users_roles = get_roles(request.user.id, instance.id, request)
+        for key, val in role_abstractor.items():
+            role_abstractor[key] = val in users_roles
         return role_abstractor
     
     def get_entity_concordance(self, instance):
-        documents = Document.objects.filter(project=instance.id)
-        if len(documents) != 0:
-            documents_entity_concordance = np.array([k.entity_concordance for k in documents])
-            return round(documents_entity_concordance.mean(), 4)
-        else:
+        if not instance.document_count:
             return 1.0
+        return round(float(instance.entity_concordance_sum) / instance.document_count, 4)
 
     def get_relation_concordance(self, instance):
-        documents = Document.objects.filter(project=instance.id)
-        if len(documents) != 0:
-            documents_relation_concordance = np.array([k.relation_concordance for k in documents])
-            return round(documents_relation_concordance.mean(), 4)
-        else:
+        if not instance.document_count:
             return 1.0
+        return round(float(instance.relation_concordance_sum) / instance.document_count, 4)
 
 
     class Meta:
@@ -262,3 +332,33 @@ class DocMappingSerializer(serializers.ModelSerializer):
     class Meta:
         model = DocMapping
         fields = ('id', 'document', 'project', 'rolemap', 'username', 'rolename')
+
+
+class ImportJobSerializer(serializers.ModelSerializer):
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        progress = get_progress(instance) if instance.state == ImportJob.RUNNING else None
+        if progress:
+            # The sheet being read is only known while an Excel import runs.
+            for key in ('documents', 'annotations', 'rows_per_sec', 'encoding', 'detection_seconds', 'sheet'):
+                data[key] = progress[key]
+        return data
+
+    class Meta:
+        model = ImportJob
+        fields = ('id', 'format', 'encoding', 'state', 'documents', 'annotations', 'rows_per_sec',
+                  'detection_seconds', 'errors', 'created_at', 'started_at', 'finished_at')
+        read_only_fields = fields
+
+
+class ExportJobSerializer(serializers.ModelSerializer):
+    fresh = serializers.SerializerMethodField()
+
+    def get_fresh(self, instance):
+        return instance.is_fresh()
+
+    class Meta:
+        model = ExportJob
+        fields = ('id', 'format', 'state', 'size', 'fresh', 'errors', 'created_at', 'finished_at')
+        read_only_fields = fields
@@ -0,0 +1,220 @@
+"""Per-project statistics counters.
+
+Annotation counts per label and per user, the number of documents each user
+annotated and the number of approved documents are kept in
+`StatisticsCounter` rows, so reading them costs O(labels + users).
+
+Counters move with F() updates in the transaction that saves or deletes
+what they count, and commit or roll back with it. A user's documents move
+when the user's first annotation of a document is saved or the last one
+deleted, which an EXISTS on the (document, user) prefix of the annotations'
+unique index tells. Annotations deleted with their document or label are
+collected in memory from the delete signals and subtracted once per
+document or label; nothing is counted while a whole project is deleted.
+The writers of counted rows move the project's watermark, so counting does
+not. `rebuild_statistics` reconciles the counters with the tables after
+changes made behind the ORM's back.
+"""
+from collections import Counter
+
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+from .changes import collect
+from .models import Document, Label, SequenceAnnotation, StatisticsCounter
+
+
+class _Deletions(object):
+    """What is being deleted in a transaction, filled by the pre_delete signals."""
+
+    def __init__(self):
+        # document or label id -> the annotations deleted with it, as (document id, label id, user id)
+        self.documents = {}
+        self.labels = {}
+        self.projects = set()
+
+
+def _deleted(deletions):
+    """Nothing is left to do on commit, the counters moved when the rows were deleted."""
+
+
+def _deletions():
+    return collect(_deleted, _Deletions)
+
+
+def count_annotation(annotation, sign=1):
+    """Count a saved (sign=1) or deleted (sign=-1) annotation."""
+    span = (annotation.document_id, annotation.label_id, annotation.user_id)
+    if sign < 0:
+        with _deletions() as deletions:
+            deleted_with = deletions.documents.get(annotation.document_id, deletions.labels.get(annotation.label_id))
+            if deleted_with is not None:
+                deleted_with.append(span)
+                return
+    project_id = _project_of(annotation)
+    _add(project_id, StatisticsCounter.LABEL, annotation.label_id, sign)
+    _add(project_id, StatisticsCounter.USER, annotation.user_id, sign)
+    # Saving the first annotation of the user in the document or deleting the last one.
+    others = SequenceAnnotation.objects.filter(document=annotation.document_id, user=annotation.user_id)
+    if not others.exclude(pk=annotation.pk).exists():
+        _add(project_id, StatisticsCounter.USER_DOCUMENTS, annotation.user_id, sign)
+
+
+def _project_of(annotation):
+    if SequenceAnnotation._meta.get_field('document').is_cached(annotation):
+        return annotation.document.project_id
+    return Document.objects.filter(pk=annotation.document_id).values_list('project_id', flat=True).get()
+
+
+def count_annotations(project_id, annotations):
+    """Count annotations saved with bulk_create, which sends no signals."""
+    count_spans(project_id, [(annotation.document_id, annotation.label_id, annotation.user_id)
+                             for annotation in annotations])
+
+
+def count_spans(project_id, spans):
+    """Count saved annotations given as (document id, label id, user id) triples."""
+    labels, users, pairs = Counter(), Counter(), Counter()
+    for (document_id, label_id, user_id), count in Counter(spans).items():
+        labels[label_id] += count
+        users[user_id] += count
+        pairs[(document_id, user_id)] += count
+    # A pair is new to the user's documents when all its annotations are among the saved ones.
+    counts = _count_pairs(pairs)
+    documents = Counter(user_id for (document_id, user_id), count in pairs.items()
+                        if counts[(document_id, user_id)] == count)
+    _add_all(project_id, labels, users, documents)
+
+
+def count_label_changes(project_id, changed):
+    """Count (old, new) annotations updated with bulk_update, which keeps their document and user."""
+    labels = Counter()
+    for old, new in changed:
+        labels[old.label_id] -= 1
+        labels[new.label_id] += 1
+    _add_all(project_id, labels)
+
+
+def count_approval(project_id, sign=1):
+    _add(project_id, StatisticsCounter.APPROVED, 0, sign)
+
+
+def deleting_project(project_id):
+    """Note a project being deleted, its counters are deleted with it."""
+    with _deletions() as deletions:
+        deletions.projects.add(project_id)
+
+
+def deleting_document(document_id):
+    """Collect the annotations deleted with a document instead of counting each."""
+    with _deletions() as deletions:
+        deletions.documents.setdefault(document_id, [])
+
+
+def deleting_label(label_id):
+    """Collect the annotations deleted with a label instead of counting each."""
+    with _deletions() as deletions:
+        deletions.labels.setdefault(label_id, [])
+
+
+def count_deleted_document(document):
+    """Subtract the annotations and the approval of a deleted document."""
+    with _deletions() as deletions:
+        spans = deletions.documents.pop(document.id, [])
+        if document.project_id in deletions.projects:
+            return
+    labels = Counter(label_id for _, label_id, _ in spans)
+    users = Counter(user_id for _, _, user_id in spans)
+    _add_all(document.project_id, labels, users, Counter(users.keys()), sign=-1)
+    if document.annotations_approved_by_id is not None:
+        count_approval(document.project_id, -1)
+
+
+def count_deleted_label(label):
+    """Subtract the annotations of a deleted label."""
+    with _deletions() as deletions:
+        spans = deletions.labels.pop(label.id, [])
+        if label.project_id in deletions.projects:
+            return
+    StatisticsCounter.objects.filter(project=label.project_id, kind=StatisticsCounter.LABEL, key=label.id).delete()
+    users = Counter(user_id for _, _, user_id in spans)
+    # The users' other annotations may still be in the documents.
+    pairs = {(document_id, user_id) for document_id, _, user_id in spans}
+    counts = _count_pairs(pairs)
+    documents = Counter(user_id for document_id, user_id in pairs if not counts[(document_id, user_id)])
+    _add_all(label.project_id, users=users, documents=documents, sign=-1)
+
+
+def _count_pairs(pairs, chunk_size=500):
+    """The number of annotations of each (document id, user id) pair."""
+    document_ids = sorted({document_id for document_id, _ in pairs})
+    user_ids = {user_id for _, user_id in pairs}
+    counts = Counter()
+    for i in range(0, len(document_ids), chunk_size):
+        annotations = SequenceAnnotation.objects.filter(document__in=document_ids[i:i + chunk_size], user__in=user_ids)
+        for document_id, user_id, count in annotations.values_list('document', 'user').annotate(Count('id')).order_by():
+            counts[(document_id, user_id)] = count
+    return counts
+
+
+def _add_all(project_id, labels=(), users=(), documents=(), sign=1):
+    for kind, differences in ((StatisticsCounter.LABEL, labels), (StatisticsCounter.USER, users),
+                              (StatisticsCounter.USER_DOCUMENTS, documents)):
+        for key, difference in dict(differences).items():
+            if difference:
+                _add(project_id, kind, key, sign * difference)
+
+
+def _add(project_id, kind, key, difference):
+    counters = StatisticsCounter.objects.filter(project=project_id, kind=kind, key=key)
+    if counters.update(value=F('value') + difference):
+        return
+    try:
+        with transaction.atomic():
+            StatisticsCounter.objects.create(project_id=project_id, kind=kind, key=key, value=difference)
+    except IntegrityError:
+        # Created concurrently.
+        counters.update(value=F('value') + difference)
+
+
+def rebuild(project_ids):
+    """Recount the statistics of projects from scratch."""
+    for project_id in project_ids:
+        annotations = SequenceAnnotation.objects.filter(document__project=project_id)
+        counters = []
+        for kind, rows in (
+                (StatisticsCounter.LABEL, annotations.values_list('label').annotate(Count('id'))),
+                (StatisticsCounter.USER, annotations.values_list('user').annotate(Count('id'))),
+                (StatisticsCounter.USER_DOCUMENTS,
+                 annotations.values_list('user').annotate(Count('document', distinct=True)))):
+            counters.extend(StatisticsCounter(project_id=project_id, kind=kind, key=key, value=value)
+                            for key, value in rows.order_by())
+        approved = Document.objects.filter(project=project_id, annotations_approved_by__isnull=False).count()
+        counters.append(StatisticsCounter(project_id=project_id, kind=StatisticsCounter.APPROVED, value=approved))
+        with transaction.atomic():
+            StatisticsCounter.objects.filter(project=project_id).delete()
+            StatisticsCounter.objects.bulk_create(counters)
+
+
+def get_statistics(project):
+    """Statistics of a project read from its counters.
+
+    Returns the annotations per label text and per username, the documents
+    annotated per username and the number of approved documents.
+    """
+    counters = {kind: {} for kind, _ in StatisticsCounter.KINDS}
+    for kind, key, value in project.statistics_counters.filter(value__gt=0).values_list('kind', 'key', 'value'):
+        counters[kind][key] = value
+    user_ids = set(counters[StatisticsCounter.USER]) | set(counters[StatisticsCounter.USER_DOCUMENTS])
+    usernames = dict(User.objects.filter(pk__in=user_ids).values_list('id', 'username'))
+    label_texts = dict(Label.objects.filter(pk__in=counters[StatisticsCounter.LABEL]).values_list('id', 'text'))
+    return {
+        'label': Counter({label_texts[key]: value for key, value in counters[StatisticsCounter.LABEL].items()
+                          if key in label_texts}),
+        'user_label': Counter({usernames[key]: value for key, value in counters[StatisticsCounter.USER].items()
+                               if key in usernames}),
+        'user': {usernames[key]: value for key, value in counters[StatisticsCounter.USER_DOCUMENTS].items()
+                 if key in usernames},
+        'approved': counters[StatisticsCounter.APPROVED].get(0, 0),
+    }
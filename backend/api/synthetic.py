@@ -0,0 +1,128 @@
+"""Synthetic projects for benchmarks.
+
+`generate_project` fills a project with random documents and with the
+annotations and connections of several annotators, who have each
+annotated a share `coverage` of their documents. Every document has
+reference spans; each annotator copies the label of a reference span with
+probability `agreement` and picks another label otherwise, so the
+concordance of the project follows `agreement`.
+
+Rows are written with bulk inserts like uploads, which send no signals,
+then the statistics, the concordance and the search index of the project
+are rebuilt once.
+"""
+import numpy as np
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from . import search, statistics
+from .concordance import recompute_project
+from .models import Project, Label, Relation, Document, SequenceAnnotation, Connection, Role, RoleMapping, DocMapping
+from .utils import bulk_batch_size, bulk_create_with_ids
+
+# Documents written per transaction
+CHUNK_SIZE = 1000
+
+SYLLABLES = ('ka', 'lo', 'mi', 'ne', 'ru', 'sa', 'ti', 'vo', 'xe', 'zu', 'ba', 'do', 'fi', 'ge', 'hu', 'ja')
+
+COLORS = ('#209cee', '#ff3860', '#23d160', '#ffdd57', '#7957d5', '#ff851b', '#00d1b2', '#363636')
+
+
+def make_vocabulary(rng, size=2000):
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(SYLLABLES, rng.randint(1, 4))))
+    return sorted(words)
+
+
+def make_users(prefix, count):
+    users = []
+    for i in range(count):
+        user, created = User.objects.get_or_create(username=f'{prefix}{i}')
+        if created:
+            user.set_unusable_password()
+            user.save()
+        users.append(user)
+    return users
+
+
+def disagree(rng, choice, choices, agreement):
+    """Keep `choice` with probability `agreement`, otherwise take another of `choices`."""
+    if choices > 1 and rng.random_sample() >= agreement:
+        return (choice + rng.randint(1, choices)) % choices
+    return choice
+
+
+def generate_project(name, documents=1000, labels=5, relations=3, users=3, annotations=3,
+                     connections=2, agreement=0.8, coverage=1.0, words=40, seed=0):
+    """Create a project `name` of `documents` documents of about `words` words.
+
+    Every document is assigned to each of `users` annotators, who annotate it
+    with probability `coverage`: `annotations` spans and `connections`
+    connections between consecutive spans.
+    `synthetic_admin` administers the project. Returns the project.
+    """
+    rng = np.random.RandomState(seed)
+    vocabulary = np.array(make_vocabulary(rng))
+    annotations = min(annotations, words)
+    connections = min(connections, max(annotations - 1, 0))
+
+    project = Project.objects.create(name=name, description='Synthetic project')
+    label_objs = [Label.objects.create(project=project, text=f'LABEL_{i}', background_color=COLORS[i % len(COLORS)])
+                  for i in range(labels)]
+    relation_objs = [Relation.objects.create(project=project, text=f'RELATION_{i}', color=COLORS[i % len(COLORS)])
+                     for i in range(relations)]
+    admin = make_users('synthetic_admin', 1)[0]
+    annotators = make_users('synthetic_annotator', users)
+    admin_role, _ = Role.objects.get_or_create(name=settings.ROLE_PROJECT_ADMIN)
+    annotator_role, _ = Role.objects.get_or_create(name=settings.ROLE_ANNOTATOR)
+    RoleMapping.objects.create(project=project, user=admin, role=admin_role)
+    rolemaps = [RoleMapping.objects.create(project=project, user=user, role=annotator_role) for user in annotators]
+    project.users.add(admin, *annotators)
+
+    for start in range(0, documents, CHUNK_SIZE):
+        size = min(CHUNK_SIZE, documents - start)
+        with transaction.atomic():
+            docs, spans, links = [], [], []
+            for _ in range(size):
+                tokens = vocabulary[rng.randint(len(vocabulary), size=words)]
+                ends = np.cumsum([len(token) + 1 for token in tokens]) - 1
+                picked = np.sort(rng.choice(words, annotations, replace=False))
+                docs.append(Document(project=project, text=' '.join(tokens)))
+                spans.append([(int(ends[i] - len(tokens[i])), int(ends[i]), rng.randint(labels)) for i in picked])
+                links.append(rng.randint(relations, size=connections) if relations else [])
+            docs = bulk_create_with_ids(Document, docs)
+
+            annotation_objs, annotated = [], []
+            for doc, doc_spans, doc_links in zip(docs, spans, links):
+                for user in annotators:
+                    if rng.random_sample() >= coverage:
+                        continue
+                    annotated.append(doc_links)
+                    for start_offset, end_offset, label in doc_spans:
+                        annotation_objs.append(SequenceAnnotation(
+                            document=doc, user=user, label=label_objs[disagree(rng, label, labels, agreement)],
+                            start_offset=start_offset, end_offset=end_offset))
+            annotation_objs = bulk_create_with_ids(SequenceAnnotation, annotation_objs)
+
+            # The annotations of a document by a user are consecutive, spans in order.
+            connection_objs = []
+            by_user = [annotation_objs[i:i + annotations] for i in range(0, len(annotation_objs), annotations or 1)]
+            for doc_links, user_spans in zip(annotated, by_user):
+                for relation, source, to in zip(doc_links, user_spans, user_spans[1:]):
+                    connection_objs.append(Connection(
+                        document=source.document, source=source, to=to,
+                        relation=relation_objs[disagree(rng, relation, relations, agreement)]))
+            Connection.objects.bulk_create(connection_objs, batch_size=bulk_batch_size(Connection, connection_objs))
+            mappings = [DocMapping(project=project, document=doc, rolemap=rolemap)
+                        for doc in docs for rolemap in rolemaps]
+            DocMapping.objects.bulk_create(mappings, batch_size=bulk_batch_size(DocMapping, mappings))
+
+    statistics.rebuild([project.id])
+    recompute_project(project)
+    search.rebuild([project.id])
+    Project.objects.filter(pk=project.id).update(data_updated_at=timezone.now())
+    project.refresh_from_db()
+    return project
@@ -0,0 +1,75 @@
+from collections import Counter
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase
+
+from api.assignment import assign_documents, plan_assignment, water_fill, _resolve_conflicts
+from api.models import Project, Document, Role, RoleMapping, DocMapping
+
+
+class TestWaterFill(SimpleTestCase):
+
+    def test_loads_end_up_even(self):
+        quotas = water_fill([3, 0, 1], 4, np.random.RandomState(0))
+        self.assertEqual(quotas.sum(), 4)
+        self.assertEqual(quotas[0], 0)
+        self.assertEqual(sorted(np.array([3, 0, 1]) + quotas), [2, 3, 3])
+
+    def test_nothing_to_split(self):
+        self.assertEqual(list(water_fill([1, 2], 0, np.random.RandomState(0))), [0, 0])
+
+
+class TestPlanAssignment(SimpleTestCase):
+
+    def test_conflicts_are_swapped_away(self):
+        rng = np.random.RandomState(0)
+        taken = np.eye(4, dtype=bool)
+        # Every document drew the one user it already has.
+        picks = _resolve_conflicts(taken, np.arange(4), np.arange(4), np.zeros(4, dtype=np.int64), rng)
+        self.assertFalse(taken[np.arange(4), picks].any())
+        self.assertEqual(sorted(picks), [0, 1, 2, 3])
+
+    def test_documents_get_distinct_new_users(self):
+        rng = np.random.RandomState(1)
+        taken = np.zeros((50, 4), dtype=bool)
+        taken[::2, 0] = True
+        needs = 3 - taken.sum(1)
+        docs, users = plan_assignment(taken.copy(), needs, np.zeros(4, dtype=np.int64), rng)
+        pairs = set(zip(docs.tolist(), users.tolist()))
+        self.assertEqual(len(pairs), len(docs))
+        self.assertFalse(any(taken[d, u] for d, u in pairs))
+        self.assertEqual(Counter(docs.tolist()), {d: int(n) for d, n in enumerate(needs)})
+
+
+class TestAssignDocuments(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.project = Project.objects.create(name='project')
+        role = Role.objects.create(name=settings.ROLE_ANNOTATOR)
+        cls.rolemaps = [RoleMapping.objects.create(project=cls.project, role=role,
+                                                   user=User.objects.create_user(f'user{i}'))
+                        for i in range(3)]
+        cls.role = role
+        cls.documents = [Document.objects.create(project=cls.project, text=f'document {i}') for i in range(10)]
+        DocMapping.objects.create(project=cls.project, document=cls.documents[0], rolemap=cls.rolemaps[0])
+
+    def test_every_document_gets_the_missing_users(self):
+        summary = assign_documents(self.project, self.role.id, 2, seed=0)
+        mappings = list(DocMapping.objects.values_list('document_id', 'rolemap_id'))
+        self.assertEqual(len(mappings), len(set(mappings)))
+        self.assertEqual(Counter(document_id for document_id, _ in mappings),
+                         {document.id: 2 for document in self.documents})
+        self.assertIn((self.documents[0].id, self.rolemaps[0].id), mappings)
+        assigned = [row['assigned'] for row in summary]
+        self.assertEqual(sum(assigned), 19)
+        self.assertLessEqual(max(assigned) - min(assigned), 1)
+        # Nothing is missing any more.
+        self.assertEqual(sum(row['assigned'] for row in assign_documents(self.project, self.role.id, 2)), 0)
+
+    def test_balance_counts_existing_documents(self):
+        summary = assign_documents(self.project, self.role.id, 1, balance=True, seed=0)
+        self.assertEqual(sorted(row['total'] for row in summary), [3, 3, 4])
+        self.assertEqual(summary[0]['assigned'] + 1, summary[0]['total'])
@@ -0,0 +1,57 @@
+from django.contrib.auth.models import User
+from rest_framework.test import APITestCase
+
+from api.models import Project, Label, Document, SequenceAnnotation
+
+
+class TestAnnotationBulk(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.project = Project.objects.create(name='project')
+        cls.label = Label.objects.create(project=cls.project, text='LABEL')
+        cls.document = Document.objects.create(project=cls.project, text='abc def')
+        cls.url = f'/v1/projects/{cls.project.id}/docs/{cls.document.id}/annotations/bulk'
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def test_body_must_be_an_object(self):
+        response = self.client.post(self.url, [{'create': []}], format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_items_must_have_the_expected_shape(self):
+        for body in ({'create': [5]}, {'update': [[1]]}, {'update': [{'id': 'x'}]},
+                     {'delete': [{'id': 1}]}, {'create': [{'label': [1], 'start_offset': 0, 'end_offset': 1}]}):
+            with self.subTest(body=body):
+                response = self.client.post(self.url, body, format='json')
+                self.assertEqual(response.status_code, 400)
+        self.assertFalse(SequenceAnnotation.objects.exists())
+
+    def test_spans_must_be_inside_the_document(self):
+        annotation = SequenceAnnotation.objects.create(document=self.document, user=self.user, label=self.label,
+                                                       start_offset=0, end_offset=3)
+        for body in ({'create': [{'label': self.label.id, 'start_offset': 4, 'end_offset': 99}]},
+                     {'create': [{'label': self.label.id, 'start_offset': -1, 'end_offset': 2}]},
+                     {'update': [{'id': annotation.id, 'end_offset': 8}]}):
+            with self.subTest(body=body):
+                response = self.client.post(self.url, body, format='json')
+                self.assertEqual(response.status_code, 400)
+                action = next(iter(body))
+                self.assertIn(0, response.data[action])
+        annotation.refresh_from_db()
+        self.assertEqual(annotation.end_offset, 3)
+        response = self.client.post(self.url, {'update': [{'id': annotation.id, 'end_offset': 7}]}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_create_update_and_delete(self):
+        annotation = SequenceAnnotation.objects.create(document=self.document, user=self.user, label=self.label,
+                                                       start_offset=0, end_offset=3)
+        response = self.client.post(self.url, {
+            'create': [{'label': self.label.id, 'start_offset': 4, 'end_offset': 7}],
+            'delete': [annotation.id],
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['deleted'], [annotation.id])
+        self.assertEqual(list(SequenceAnnotation.objects.values_list('start_offset', flat=True)), [4])
@@ -0,0 +1,43 @@
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from api.concordance import recompute_project
+from api.models import Project, Label, Document, SequenceAnnotation
+
+
+class TestProjectTotals(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        users = [User.objects.create_user(f'user{i}') for i in range(2)]
+        cls.project = Project.objects.create(name='project')
+        labels = [Label.objects.create(project=cls.project, text=f'LABEL{i}') for i in range(2)]
+        cls.documents = [Document.objects.create(project=cls.project, text='abc def ghi') for _ in range(2)]
+        for document in cls.documents:
+            # The annotators agree on the first word only.
+            for user, label in zip(users, labels):
+                SequenceAnnotation.objects.create(document=document, user=user, label=labels[0],
+                                                  start_offset=0, end_offset=3)
+                SequenceAnnotation.objects.create(document=document, user=user, label=label,
+                                                  start_offset=4, end_offset=7)
+
+    def test_deleting_a_stale_instance_subtracts_the_stored_concordance(self):
+        stale = Document.objects.get(pk=self.documents[0].id)
+        recompute_project(self.project)
+        self.project.refresh_from_db()
+        self.assertEqual(self.project.document_count, 2)
+        stored = Document.objects.get(pk=stale.id).entity_concordance
+        self.assertNotEqual(stored, stale.entity_concordance)
+
+        stale.delete()
+        self.project.refresh_from_db()
+        remaining = Document.objects.get(pk=self.documents[1].id)
+        self.assertEqual(self.project.document_count, 1)
+        self.assertEqual(self.project.entity_concordance_sum, remaining.entity_concordance)
+        self.assertEqual(self.project.relation_concordance_sum, remaining.relation_concordance)
+
+        remaining.delete()
+        self.project.refresh_from_db()
+        self.assertEqual((self.project.document_count, self.project.entity_concordance_sum), (0, Decimal(0)))
@@ -0,0 +1,39 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from api.models import Project, Label, Document, SequenceAnnotation
+
+
+class TestDocumentList(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.project = Project.objects.create(name='project')
+        label = Label.objects.create(project=cls.project, text='LABEL')
+        for i in range(50):
+            document = Document.objects.create(project=cls.project, text=f'document {i}')
+            for start in range(3):
+                SequenceAnnotation.objects.create(document=document, user=cls.user, label=label,
+                                                  start_offset=start, end_offset=start + 1)
+        cls.url = f'/v1/projects/{cls.project.id}/docs'
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def count_queries(self, limit):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(f'{self.url}?limit={limit}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), limit)
+        return len(context.captured_queries)
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        self.count_queries(5)  # warm up caches shared across requests
+        queries = self.count_queries(5)
+        with self.assertNumQueries(queries):
+            response = self.client.get(f'{self.url}?limit=50')
+        self.assertEqual(len(response.data['results']), 50)
+        self.assertEqual(len(response.data['results'][0]['annotations']), 3)
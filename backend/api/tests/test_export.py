@@ -0,0 +1,37 @@
+from django.contrib.auth.models import User
+from rest_framework.test import APITestCase
+
+from api.models import Project, Label, Relation, Document, SequenceAnnotation, Connection
+
+
+class TestTextDownload(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.project = Project.objects.create(name='project')
+        label = Label.objects.create(project=cls.project, text='LABEL')
+        relation = Relation.objects.create(project=cls.project, text='RELATION')
+        for i in range(3):
+            document = Document.objects.create(project=cls.project, text=f'document, "quoted" {i}',
+                                               meta='{"source": "test"}')
+            spans = [SequenceAnnotation.objects.create(document=document, user=cls.user, label=label,
+                                                       start_offset=start, end_offset=start + 1)
+                     for start in range(i + 1)]
+            # Documents with a different number of connections, i.e. of columns.
+            for source, to in zip(spans, spans[1:]):
+                Connection.objects.create(document=document, source=source, to=to, relation=relation)
+        Document.objects.create(project=cls.project, text='not annotated')
+        cls.url = f'/v1/projects/{cls.project.id}/docs/download'
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def test_streamed_csv_is_the_rendered_csv(self):
+        rendered = self.client.get(f'{self.url}?q=csv')
+        streamed = self.client.get(f'{self.url}?q=csv&stream=1')
+        self.assertEqual(rendered.status_code, 200)
+        self.assertEqual(streamed.status_code, 200)
+        content = b''.join(streamed.streaming_content)
+        self.assertIn(b'connections.1.relation', content)
+        self.assertEqual(content.decode('utf-8'), rendered.content.decode('utf-8'))
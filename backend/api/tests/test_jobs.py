@@ -0,0 +1,178 @@
+import io
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from api.jobs import enqueue_export, enqueue_import, run_export, run_import, STALE_ERROR
+from api.models import Project, Document, ImportJob, ExportJob
+
+
+class JobTestCase(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.project = Project.objects.create(name='project')
+
+    def setUp(self):
+        spool_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, spool_dir)
+        settings = override_settings(JOB_SPOOL_DIR=spool_dir)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.client.force_authenticate(self.user)
+
+
+class TestImportJob(JobTestCase):
+
+    def enqueue(self, content):
+        # Jobs are submitted on commit, which never comes in a test: they are run by hand.
+        return enqueue_import(self.project, self.user, SimpleUploadedFile('upload.jsonl', content), 'json', '')
+
+    def test_pending_to_success(self):
+        job = self.enqueue(b'{"text": "first"}\n{"text": "second", "labels": [[0, 3, "X"]]}\n')
+        self.assertEqual(job.state, ImportJob.PENDING)
+        self.assertTrue(os.path.exists(job.file))
+        run_import(job.id)
+        job.refresh_from_db()
+        self.assertEqual(job.state, ImportJob.SUCCESS)
+        self.assertEqual((job.documents, job.annotations), (2, 1))
+        self.assertEqual(job.encoding, 'utf-8')
+        self.assertIsNotNone(job.finished_at)
+        self.assertFalse(os.path.exists(job.file))
+        self.assertEqual(self.project.documents.count(), 2)
+
+    def test_pending_to_failure(self):
+        job = self.enqueue(b'{"text": "first"}\nnot json\n')
+        run_import(job.id)
+        job.refresh_from_db()
+        self.assertEqual(job.state, ImportJob.FAILURE)
+        self.assertIn('line 2', job.errors)
+        self.assertEqual(job.documents, 0)
+        self.assertEqual(job.encoding, 'utf-8')
+        self.assertFalse(os.path.exists(job.file))
+        self.assertFalse(self.project.documents.exists())
+
+
+class TestExportJob(JobTestCase):
+
+    def setUp(self):
+        super().setUp()
+        Document.objects.create(project=self.project, text='document')
+        self.url = f'/v1/projects/{self.project.id}/exports'
+
+    def test_pending_to_success(self):
+        job = enqueue_export(self.project, self.user, 'json')
+        run_export(job.id)
+        job.refresh_from_db()
+        self.assertEqual(job.state, ExportJob.SUCCESS)
+        self.assertEqual(job.watermark, self.project.data_updated_at)
+        with open(job.file, encoding='utf-8') as f:
+            self.assertIn('"document"', f.read())
+        self.assertEqual(job.size, os.path.getsize(job.file))
+
+    def test_fresh_export_is_reused_until_the_project_changes(self):
+        response = self.client.post(self.url, {'format': 'json'})
+        self.assertEqual(response.status_code, 202)
+        job_id = response.data['id']
+        # A running export is handed back as well.
+        self.assertEqual(self.client.post(self.url, {'format': 'json'}).data['id'], job_id)
+        run_export(job_id)
+        response = self.client.post(self.url, {'format': 'json'})
+        self.assertEqual((response.status_code, response.data['id']), (200, job_id))
+
+        Project.objects.filter(pk=self.project.id).update(data_updated_at=timezone.now())
+        response = self.client.post(self.url, {'format': 'json'})
+        self.assertEqual(response.status_code, 202)
+        self.assertNotEqual(response.data['id'], job_id)
+
+    def test_newer_export_removes_older_artifacts(self):
+        old = enqueue_export(self.project, self.user, 'json')
+        run_export(old.id)
+        old.refresh_from_db()
+        waiting = enqueue_export(self.project, self.user, 'json')
+        new = enqueue_export(self.project, self.user, 'json')
+        run_export(new.id)
+
+        old.refresh_from_db()
+        self.assertEqual((old.state, old.file), (ExportJob.SUCCESS, ''))
+        self.assertEqual(len(os.listdir(os.path.dirname(ExportJob.objects.get(pk=new.id).file))), 1)
+        waiting.refresh_from_db()
+        self.assertEqual(waiting.state, ExportJob.FAILURE)
+        self.assertEqual(waiting.errors, f'Superseded by export {new.id}.')
+        # A superseded export does not run.
+        run_export(waiting.id)
+        waiting.refresh_from_db()
+        self.assertEqual(waiting.state, ExportJob.FAILURE)
+
+
+class TestFailStaleJobs(JobTestCase):
+
+    def test_unfinished_jobs_are_failed(self):
+        pending = enqueue_import(self.project, self.user, SimpleUploadedFile('upload.jsonl', b'{}'), 'json', '')
+        running = enqueue_export(self.project, self.user, 'json')
+        ExportJob.objects.filter(pk=running.id).update(state=ExportJob.RUNNING)
+        done = enqueue_export(self.project, self.user, 'json')
+        ExportJob.objects.filter(pk=done.id).update(state=ExportJob.SUCCESS)
+
+        call_command('fail_stale_jobs', '--older-than', '60', stdout=io.StringIO())
+        self.assertEqual(ImportJob.objects.get(pk=pending.id).state, ImportJob.PENDING)
+
+        call_command('fail_stale_jobs', stdout=io.StringIO())
+        for job in (ImportJob.objects.get(pk=pending.id), ExportJob.objects.get(pk=running.id)):
+            self.assertEqual((job.state, job.errors), (job.FAILURE, STALE_ERROR))
+        self.assertFalse(os.path.exists(pending.file))
+        self.assertEqual(ExportJob.objects.get(pk=done.id).state, ExportJob.SUCCESS)
+
+
+class TestExportDownload(JobTestCase):
+
+    def setUp(self):
+        super().setUp()
+        Document.objects.create(project=self.project, text='document')
+        self.job = enqueue_export(self.project, self.user, 'json')
+        run_export(self.job.id)
+        self.job.refresh_from_db()
+        with open(self.job.file, 'rb') as f:
+            self.content = f.read()
+        self.url = f'/v1/projects/{self.project.id}/exports/{self.job.id}/download'
+        self.etag = f'"{self.job.id}-{self.job.size}"'
+
+    def get(self, **headers):
+        response = self.client.get(self.url, **headers)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def test_download_and_revalidate(self):
+        response, body = self.get()
+        self.assertEqual((response.status_code, body), (200, self.content))
+        self.assertEqual(response['ETag'], self.etag)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        response, body = self.get(HTTP_IF_NONE_MATCH=self.etag)
+        self.assertEqual((response.status_code, body), (304, b''))
+
+    def test_ranges(self):
+        size = len(self.content)
+        response, body = self.get(HTTP_RANGE='bytes=0-3')
+        self.assertEqual((response.status_code, body), (206, self.content[:4]))
+        self.assertEqual(response['Content-Range'], f'bytes 0-3/{size}')
+        response, body = self.get(HTTP_RANGE='bytes=-3')
+        self.assertEqual((response.status_code, body), (206, self.content[-3:]))
+        response, body = self.get(HTTP_RANGE=f'bytes={size}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{size}')
+        # A range of another version of the file is ignored.
+        response, body = self.get(HTTP_RANGE='bytes=0-3', HTTP_IF_RANGE='"other"')
+        self.assertEqual((response.status_code, body), (200, self.content))
+
+    def test_replaced_export_is_gone(self):
+        run_export(enqueue_export(self.project, self.user, 'json').id)
+        response, _ = self.get()
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,89 @@
+import datetime
+
+from django.contrib.auth.models import User
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from api.models import Project, Document
+
+
+class TestDocumentPagination(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.project = Project.objects.create(name='project')
+        cls.documents = [Document.objects.create(project=cls.project, text=f'document {i}') for i in range(7)]
+        # Documents created at the same time are ordered by id.
+        now = timezone.now()
+        for i, document in enumerate(cls.documents):
+            Document.objects.filter(pk=document.pk).update(created_at=now - datetime.timedelta(minutes=i // 2))
+        cls.url = f'/v1/projects/{cls.project.id}/docs'
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def walk(self, url, direction='next'):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append([document['id'] for document in response.data['results']])
+            url = response.data[direction]
+        return pages
+
+    def walk_to_last(self, url):
+        while True:
+            response = self.client.get(url)
+            if not response.data['next']:
+                return url
+            url = response.data['next']
+
+    def test_limit_offset_without_count(self):
+        response = self.client.get(f'{self.url}?limit=3&offset=3&count=false')
+        self.assertIsNone(response.data['count'])
+        self.assertEqual([document['id'] for document in response.data['results']],
+                         [document.id for document in self.documents[3:6]])
+        self.assertIn('offset=6', response.data['next'])
+        self.assertNotIn('offset', response.data['previous'])
+        response = self.client.get(f'{self.url}?limit=3&offset=6&count=false')
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIsNone(response.data['next'])
+        response = self.client.get(f'{self.url}?limit=3&offset=4&count=false')
+        self.assertIsNone(response.data['next'])
+        self.assertIn('offset=1', response.data['previous'])
+
+    def test_count_by_default(self):
+        response = self.client.get(f'{self.url}?limit=3')
+        self.assertEqual(response.data['count'], 7)
+
+    def test_cursor_pages_forwards_and_backwards(self):
+        ids = [document.id for document in self.documents]
+        pages = self.walk(f'{self.url}?pagination=cursor&limit=3')
+        self.assertEqual(pages, [ids[:3], ids[3:6], ids[6:]])
+        response = self.client.get(f'{self.url}?pagination=cursor&limit=3')
+        self.assertNotIn('count', response.data)
+        self.assertIsNone(response.data['previous'])
+
+        last = self.client.get(self.walk_to_last(f'{self.url}?pagination=cursor&limit=3'))
+        self.assertEqual(self.walk(last.data['previous'], 'previous'), [ids[3:6], ids[:3]])
+
+    def test_cursor_with_ordering_on_ties(self):
+        for ordering, tie in (('created_at', 'id'), ('-created_at', '-id')):
+            with self.subTest(ordering=ordering):
+                expected = [document.id for document in
+                            Document.objects.filter(project=self.project).order_by(ordering, tie)]
+                pages = self.walk(f'{self.url}?pagination=cursor&limit=2&ordering={ordering}')
+                self.assertEqual([pk for page in pages for pk in page], expected)
+                self.assertEqual([len(page) for page in pages], [2, 2, 2, 1])
+
+    def test_page_after_a_deleted_row(self):
+        response = self.client.get(f'{self.url}?pagination=cursor&limit=3')
+        Document.objects.filter(pk=self.documents[2].pk).delete()
+        response = self.client.get(response.data['next'])
+        self.assertEqual([document['id'] for document in response.data['results']],
+                         [document.id for document in self.documents[3:6]])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(f'{self.url}?cursor=garbage')
+        self.assertEqual(response.status_code, 404)
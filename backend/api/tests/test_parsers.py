@@ -0,0 +1,75 @@
+import io
+
+from django.test import SimpleTestCase
+from rest_framework.exceptions import ValidationError
+
+from api.exceptions import FileParseException
+from api.utils import CoNLLParser, PlainTextParser
+
+
+class TestCoNLLParser(SimpleTestCase):
+
+    def parse(self, text):
+        return [document for batch in CoNLLParser(encoding='utf-8').parse(io.BytesIO(text.encode()), '')
+                for document in batch]
+
+    def test_columns_separated_by_spaces(self):
+        documents = self.parse('EU  B-ORG\nrejects   O\nGerman\tB-MISC\n\nPeter  B-PER\nBlackburn  I-PER\n')
+        self.assertEqual(documents, [
+            {'text': 'EU rejects German', 'labels': [[0, 2, 'ORG'], [11, 17, 'MISC']]},
+            {'text': 'Peter Blackburn', 'labels': [[0, 15, 'PER']]},
+        ])
+
+    def test_word_without_tag_is_outside(self):
+        documents = self.parse('EU\tB-ORG\nrejects\nGerman\tB-MISC\nlamb\n')
+        self.assertEqual(documents, [
+            {'text': 'EU rejects German lamb', 'labels': [[0, 2, 'ORG'], [11, 17, 'MISC']]},
+        ])
+
+    def test_word_and_tag_separated_by_a_space(self):
+        documents = self.parse('EU B-ORG\nrejects O\n')
+        self.assertEqual(documents, [
+            {'text': 'EU rejects', 'labels': [[0, 2, 'ORG']]},
+        ])
+
+    def test_column_with_a_space_is_an_error(self):
+        for text in ('New York B-LOC\n', 'EU\tB-ORG\nNew York\tB-LOC\n', 'EU  B ORG\n'):
+            with self.subTest(text=text):
+                with self.assertRaises(FileParseException):
+                    self.parse(text)
+
+
+class TestPlainTextParser(SimpleTestCase):
+
+    def split(self, text, spliter, chunk_size, max_separator=4):
+        parser = PlainTextParser(encoding='utf-8')
+        parser.chunk_size, parser.max_separator = chunk_size, max_separator
+        return list(parser.split(io.StringIO(text), parser.compile_spliter(spliter)))
+
+    def test_documents_are_carried_over_chunks(self):
+        text = 'first document|||second|||a much longer third document|||'
+        for chunk_size in (1, 2, 5, 16, 1024):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(self.split(text, '|||', chunk_size),
+                                 ['first document', 'second', 'a much longer third document'])
+
+    def test_separator_straddling_chunks_is_found_whole(self):
+        text = 'one\n\n\n\ntwo\n \nthree\n'
+        for chunk_size in (1, 3, 4, 7, 1024):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(self.split(text, 're:\\n\\s*\\n', chunk_size), ['one', 'two', 'three\n'])
+
+    def test_regex_spliter(self):
+        self.assertEqual(self.split('a1b22c', 're:[0-9]+', 2), ['a', 'b', 'c'])
+        self.assertEqual(self.split('a.b', '.', 2), ['a', 'b'])
+
+    def test_invalid_spliter(self):
+        for spliter in ('re:(', 're:x*'):
+            with self.subTest(spliter=spliter):
+                with self.assertRaises(ValidationError):
+                    PlainTextParser.compile_spliter(spliter)
+
+    def test_parse_with_spliter(self):
+        data = list(PlainTextParser(encoding='utf-8').parse(io.BytesIO('EU rejects\n\nGerman call\n'.encode()),
+                                                            're:\\n\\n'))
+        self.assertEqual(data, [[{'text': 'EU rejects'}, {'text': 'German call\n'}]])
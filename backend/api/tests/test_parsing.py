@@ -0,0 +1,84 @@
+import json
+import os
+import tempfile
+
+from django.test import SimpleTestCase, override_settings
+
+from api import parsing
+from api.exceptions import FileParseException
+from api.utils import FileParser, JSONParser
+
+
+class ParsingTestCase(SimpleTestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.jsonl')
+        os.close(fd)
+        self.addCleanup(os.remove, self.path)
+
+    def write(self, lines):
+        with open(self.path, 'w', encoding='utf-8', newline='') as f:
+            f.write(''.join(lines))
+
+
+class TestRanges(ParsingTestCase):
+
+    def test_ranges_cover_the_file_and_end_after_a_newline(self):
+        self.write(f'line {i}\n' * (i % 3) + 'x' * i + '\n' for i in range(20))
+        with open(self.path, 'rb') as f:
+            content = f.read()
+        for size in (1, 7, 32, len(content) * 2):
+            with self.subTest(size=size):
+                ranges = parsing.split_ranges(self.path, size)
+                self.assertEqual(ranges[0][0], 0)
+                self.assertEqual(ranges[-1][1], len(content))
+                for (_, end), (start, _) in zip(ranges, ranges[1:]):
+                    self.assertEqual(end, start)
+                    self.assertEqual(content[end - 1:end], b'\n')
+
+    def test_empty_file_has_no_ranges(self):
+        self.write([])
+        self.assertEqual(parsing.split_ranges(self.path, 8), [])
+
+    def test_parse_range(self):
+        self.write(['{"text": "a"}\r\n', '{"text": "b"}\n', '[1]\n', '{"text": "c"}\n'])
+        records, lines, error = parsing.parse_range(self.path, 0, os.path.getsize(self.path), 'utf-8', 'plain')
+        self.assertEqual((len(records), lines, error), (4, 4, None))
+        self.assertEqual(records[0], {'text': '{"text": "a"}\n'})
+        records, lines, error = parsing.parse_range(self.path, 0, os.path.getsize(self.path), 'utf-8', 'json')
+        self.assertEqual([record['text'] for record in records], ['a', 'b'])
+        self.assertEqual(error, (3, '[1]\n'))
+
+
+@override_settings(IMPORT_PARALLEL_WORKERS=2, IMPORT_PARALLEL_MIN_SIZE=0, IMPORT_BATCH_SIZE=4)
+class TestParseParallel(ParsingTestCase):
+
+    def parse(self, size):
+        ranges = parsing.split_ranges(self.path, size)
+        return list(FileParser.parse_parallel(self.path, 'utf-8', ranges, 'json'))
+
+    def test_records_come_back_in_file_order(self):
+        self.write(json.dumps({'text': f'document {i}'}) + '\n' for i in range(25))
+        batches = self.parse(size=40)
+        self.assertTrue(all(len(batch) <= 4 for batch in batches))
+        self.assertEqual([record['text'] for batch in batches for record in batch],
+                         [f'document {i}' for i in range(25)])
+
+    def test_error_line_number_counts_earlier_ranges(self):
+        lines = [json.dumps({'text': f'document {i}'}) + '\n' for i in range(25)]
+        lines[17] = 'not json\n'
+        self.write(lines)
+        for size in (1, 40, 10 ** 6):
+            with self.subTest(size=size):
+                with self.assertRaisesMessage(FileParseException, 'line 18: not json'):
+                    self.parse(size)
+
+    def test_parser_uses_workers_for_files_on_disk(self):
+        self.write(json.dumps({'text': f'document {i}', 'meta': {'i': i}}) + '\n' for i in range(10))
+        with open(self.path, 'rb') as f:
+            self.assertIsNotNone(JSONParser(encoding='utf-8').open_parallel(f))
+            parallel = list(JSONParser(encoding='utf-8').parse(f, ''))
+        with override_settings(IMPORT_PARALLEL_WORKERS=0), open(self.path, 'rb') as f:
+            self.assertIsNone(JSONParser(encoding='utf-8').open_parallel(f))
+            serial = list(JSONParser(encoding='utf-8').parse(f, ''))
+        self.assertEqual(parallel, serial)
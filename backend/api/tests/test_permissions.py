@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+
+from api.models import Project, Role, RoleMapping
+from api.permissions import is_in_role
+
+
+class TestIsInRole(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('user')
+        cls.project = Project.objects.create(name='project')
+        cls.annotator = Role.objects.create(name=settings.ROLE_ANNOTATOR)
+        cls.approver = Role.objects.create(name=settings.ROLE_ANNOTATION_APPROVER)
+
+    def test_every_role_of_a_user_counts(self):
+        RoleMapping.objects.create(user=self.user, project=self.project, role=self.annotator)
+        RoleMapping.objects.create(user=self.user, project=self.project, role=self.approver)
+        self.assertTrue(is_in_role(settings.ROLE_ANNOTATOR, self.user.id, self.project.id))
+        self.assertTrue(is_in_role(settings.ROLE_ANNOTATION_APPROVER, self.user.id, self.project.id))
+        self.assertFalse(is_in_role(settings.ROLE_PROJECT_ADMIN, self.user.id, self.project.id))
+
+    @override_settings(ROLE_CACHE_TIMEOUT=300)
+    def test_process_local_cache_is_not_used_across_requests(self):
+        mapping = RoleMapping.objects.create(user=self.user, project=self.project, role=self.annotator)
+        self.assertTrue(is_in_role(settings.ROLE_ANNOTATOR, self.user.id, self.project.id))
+        # Like a change made by another process, update() evicts nothing from this process' cache.
+        RoleMapping.objects.filter(pk=mapping.pk).update(role=self.approver)
+        self.assertFalse(is_in_role(settings.ROLE_ANNOTATOR, self.user.id, self.project.id))
@@ -0,0 +1,36 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from rest_framework.test import APITestCase
+
+from api.exceptions import FileParseException
+from api.models import Project, Document, SequenceAnnotation
+from api.utils import PreAnnotationStorage
+
+
+class TestPreAnnotationStorage(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.project = Project.objects.create(name='project')
+        cls.document = Document.objects.create(project=cls.project, text='abc def')
+
+    def save(self, *lines):
+        return PreAnnotationStorage([list(lines)], self.project).save(self.user)
+
+    def test_doc_id_must_be_an_id(self):
+        for doc_id in ([self.document.id], {'id': 1}, str(self.document.id), True):
+            with self.subTest(doc_id=doc_id):
+                with self.assertRaises(FileParseException):
+                    self.save({'doc_id': doc_id, 'labels': [[0, 3, 'ORG']]})
+        self.assertFalse(SequenceAnnotation.objects.exists())
+
+    def test_only_documents_with_new_spans_are_marked(self):
+        other = Document.objects.create(project=self.project, text='ghi jkl')
+        self.save({'doc_id': self.document.id, 'labels': [[0, 3, 'ORG']]})
+        with mock.patch('api.utils.mark_dirty') as mark_dirty:
+            self.save({'doc_id': self.document.id, 'labels': [[0, 3, 'ORG']]},
+                      {'doc_id': other.id, 'labels': [[4, 7, 'ORG']]})
+        mark_dirty.assert_called_once_with(other.id, entity=True)
+        self.assertEqual(SequenceAnnotation.objects.count(), 2)
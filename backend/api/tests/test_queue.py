@@ -0,0 +1,67 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from rest_framework.test import APITestCase
+
+from api.models import Project, Label, Document, SequenceAnnotation, Role, RoleMapping, DocMapping
+
+
+class TestDocumentQueue(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.annotator = User.objects.create_user('annotator')
+        cls.project = Project.objects.create(name='project')
+        cls.label = Label.objects.create(project=cls.project, text='LABEL')
+        cls.documents = [Document.objects.create(project=cls.project, text=f'document {i}') for i in range(8)]
+        annotator = RoleMapping.objects.create(project=cls.project, user=cls.annotator,
+                                               role=Role.objects.create(name=settings.ROLE_ANNOTATOR))
+        approver = RoleMapping.objects.create(project=cls.project, user=cls.annotator,
+                                              role=Role.objects.create(name=settings.ROLE_ANNOTATION_APPROVER))
+        for i in (1, 2, 4, 5, 7):
+            DocMapping.objects.create(project=cls.project, document=cls.documents[i], rolemap=annotator)
+        # Assigned through two roles, still listed once.
+        DocMapping.objects.create(project=cls.project, document=cls.documents[4], rolemap=approver)
+        SequenceAnnotation.objects.create(document=cls.documents[2], user=cls.annotator, label=cls.label,
+                                          start_offset=0, end_offset=1)
+        cls.url = f'/v1/projects/{cls.project.id}/docs/next'
+
+    def ids(self, documents):
+        return [document['id'] for document in documents]
+
+    def get(self, user, query=''):
+        self.client.force_authenticate(user)
+        response = self.client.get(f'{self.url}{query}')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_annotator_gets_assigned_documents_not_annotated(self):
+        data = self.get(self.annotator, '?limit=10')
+        self.assertEqual(self.ids(data['results']), [self.documents[i].id for i in (1, 4, 5, 7)])
+        self.assertEqual(data['prefetch'], [])
+        self.assertIsNone(data['next'])
+
+    def test_admin_gets_every_document_not_annotated(self):
+        SequenceAnnotation.objects.create(document=self.documents[0], user=self.admin, label=self.label,
+                                          start_offset=0, end_offset=1)
+        data = self.get(self.admin, '?limit=100')
+        self.assertEqual(self.ids(data['results']), [document.id for document in self.documents[1:]])
+
+    def test_prefetch_and_next(self):
+        data = self.get(self.annotator, '?limit=1&prefetch=2')
+        self.assertEqual(self.ids(data['results']), [self.documents[1].id])
+        self.assertEqual(self.ids(data['prefetch']), [self.documents[4].id, self.documents[5].id])
+        self.assertIn(f'after={self.documents[5].id}', data['next'])
+        self.client.force_authenticate(self.annotator)
+        data = self.client.get(data['next']).data
+        self.assertEqual(self.ids(data['results']), [self.documents[7].id])
+        self.assertIsNone(data['next'])
+
+    def test_after(self):
+        data = self.get(self.annotator, f'?after={self.documents[4].id}')
+        self.assertEqual(self.ids(data['results']), [self.documents[5].id])
+
+    def test_invalid_parameter(self):
+        self.client.force_authenticate(self.annotator)
+        response = self.client.get(f'{self.url}?limit=x')
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,98 @@
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from rest_framework.test import APITestCase
+
+from api import search
+from api.models import Project, Document
+
+
+def indexed_ids():
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT rowid FROM {search.FTS_TABLE} ORDER BY rowid')
+        return [row[0] for row in cursor.fetchall()]
+
+
+class TestDocumentSearchFilter(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.project = Project.objects.create(name='project')
+        texts = ['The first document', 'The SECOND one', 'Peter "Pete" Blackburn', '欧盟拒绝德国的号召', 'a b c']
+        cls.documents = [Document.objects.create(project=cls.project, text=text) for text in texts]
+        # Documents are indexed on commit, which TestCase never does.
+        search.rebuild()
+        cls.url = f'/v1/projects/{cls.project.id}/docs'
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def search(self, q):
+        response = self.client.get(self.url, {'q': q})
+        self.assertEqual(response.status_code, 200)
+        return [document['id'] for document in response.data['results']]
+
+    def assertFinds(self, q, *indexes):
+        self.assertEqual(self.search(q), [self.documents[i].id for i in indexes])
+
+    def test_substrings_in_any_case(self):
+        self.assertFinds('ond', 1)
+        self.assertFinds('DOCUMENT', 0)
+        self.assertFinds('the', 0, 1)
+        self.assertFinds('德国', 3)
+        self.assertFinds('拒绝德国', 3)
+
+    def test_every_word_must_match(self):
+        self.assertFinds('the first', 0)
+        self.assertFinds('the one', 1)
+        self.assertFinds('the nothing')
+
+    def test_short_words(self):
+        self.assertFinds('b', 2, 4)
+        self.assertFinds('a c', 2, 4)
+        self.assertFinds('Th ond', 1)
+
+    def test_quotes_are_text(self):
+        self.assertFinds('"Pete"', 2)
+        self.assertFinds('Pete" OR')
+
+    def test_blank_search(self):
+        self.assertFinds('  ', 0, 1, 2, 3, 4)
+
+
+class TestRebuildSearchIndex(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.projects = [Project.objects.create(name=f'project{i}') for i in range(2)]
+        cls.documents = [Document.objects.create(project=project, text=f'document {i}')
+                         for i, project in enumerate(cls.projects)]
+
+    def test_rebuild(self):
+        self.assertEqual(indexed_ids(), [])
+        call_command('rebuild_search_index', '--project', str(self.projects[1].id), stdout=open('/dev/null', 'w'))
+        self.assertEqual(indexed_ids(), [self.documents[1].id])
+        call_command('rebuild_search_index', stdout=open('/dev/null', 'w'))
+        self.assertEqual(indexed_ids(), [document.id for document in self.documents])
+
+    def test_unknown_project(self):
+        with self.assertRaises(CommandError):
+            call_command('rebuild_search_index', '--project', '999')
+
+
+class TestSearchIndexSync(TransactionTestCase):
+
+    def test_index_follows_documents(self):
+        project = Project.objects.create(name='project')
+        document = Document.objects.create(project=project, text='EU rejects German call')
+        documents = Document.objects.filter(project=project)
+        self.assertEqual(list(search.search(documents, 'german')), [document])
+        document.text = 'Peter Blackburn'
+        document.save()
+        self.assertEqual(list(search.search(documents, 'german')), [])
+        self.assertEqual(list(search.search(documents, 'blackburn')), [document])
+        document.delete()
+        self.assertEqual(indexed_ids(), [])
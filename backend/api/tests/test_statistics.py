@@ -0,0 +1,73 @@
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+
+from api import statistics
+from api.models import Project, Label, Document, SequenceAnnotation, StatisticsCounter
+
+
+class TestStatisticsCounters(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(f'user{i}') for i in range(2)]
+        cls.project = Project.objects.create(name='project')
+        cls.labels = [Label.objects.create(project=cls.project, text=f'LABEL{i}', background_color='#209cee')
+                      for i in range(2)]
+        cls.documents = [Document.objects.create(project=cls.project, text='abc def ghi') for _ in range(3)]
+
+    def annotate(self, document, user, label, start_offset):
+        return SequenceAnnotation.objects.create(document=document, user=user, label=label,
+                                                 start_offset=start_offset, end_offset=start_offset + 1)
+
+    def assertCountersRebuilt(self):
+        counters = StatisticsCounter.objects.filter(project=self.project, value__gt=0)
+        counted = set(counters.values_list('kind', 'key', 'value'))
+        statistics.rebuild([self.project.id])
+        self.assertEqual(counted, set(counters.values_list('kind', 'key', 'value')))
+
+    def test_annotations_move_user_documents_once_per_document(self):
+        first = self.annotate(self.documents[0], self.users[0], self.labels[0], 0)
+        second = self.annotate(self.documents[0], self.users[0], self.labels[1], 4)
+        documents = StatisticsCounter.objects.get(
+            project=self.project, kind=StatisticsCounter.USER_DOCUMENTS, key=self.users[0].id)
+        self.assertEqual(documents.value, 1)
+        first.delete()
+        documents.refresh_from_db()
+        self.assertEqual(documents.value, 1)
+        second.delete()
+        documents.refresh_from_db()
+        self.assertEqual(documents.value, 0)
+
+    def test_deleted_document_and_label_are_subtracted(self):
+        for document in self.documents:
+            for i, user in enumerate(self.users):
+                self.annotate(document, user, self.labels[0], 0)
+                self.annotate(document, user, self.labels[1], 4 + i)
+        document = Document.objects.get(pk=self.documents[0].id)
+        document.annotations_approved_by = self.users[0]
+        document.save()
+        self.assertCountersRebuilt()
+        document.delete()
+        self.assertCountersRebuilt()
+        self.labels[1].delete()
+        self.assertCountersRebuilt()
+
+
+class TestProjectDeletion(TransactionTestCase):
+
+    def test_deleting_a_project_with_pending_changes_commits(self):
+        user = User.objects.create_user('user')
+        project = Project.objects.create(name='project')
+        label = Label.objects.create(project=project, text='LABEL', background_color='#209cee')
+        document = Document.objects.create(project=project, text='abc def')
+        with transaction.atomic():
+            # Counted, and the document marked for a concordance and search update on commit.
+            SequenceAnnotation.objects.create(document=document, user=user, label=label,
+                                              start_offset=0, end_offset=3)
+            with CaptureQueriesContext(connection) as context:
+                project.delete()
+        self.assertFalse(any('api_statisticscounter" SET' in query['sql'] for query in context.captured_queries))
+        self.assertFalse(Project.objects.exists())
+        self.assertFalse(StatisticsCounter.objects.exists())
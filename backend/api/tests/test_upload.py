@@ -0,0 +1,37 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from rest_framework.test import APITestCase
+
+from api.models import Project, Document
+
+
+class TestUpload(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.project = Project.objects.create(name='project')
+        cls.url = f'/v1/projects/{cls.project.id}/docs/upload'
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def upload(self, lines, file_format='json'):
+        content = ''.join(json.dumps(line, ensure_ascii=False) + '\n' for line in lines).encode('utf-8')
+        return self.client.post(self.url, {'file': SimpleUploadedFile('upload.jsonl', content),
+                                           'format': file_format, 'spliter': '', 'async': 'false'})
+
+    def test_numbers_become_text(self):
+        response = self.upload([{'text': 42}, {'text': 1.5}])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(sorted(self.project.documents.values_list('text', flat=True)), ['1.5', '42'])
+
+    def test_blank_text_is_rejected_with_its_line(self):
+        for text in ('', '  \t'):
+            with self.subTest(text=text):
+                response = self.upload([{'text': 'first'}, {'text': text}])
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('line 2', str(response.data['detail']))
+        self.assertFalse(Document.objects.exists())
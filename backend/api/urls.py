@@ -5,10 +5,12 @@ from .views import Me, Users, Health
 from .views import ProjectList, ProjectDetail
 from .views import LabelList, LabelDetail, ApproveLabelsAPI, LabelUploadAPI
 from .views import RelationList, RelationDetail, RelationUploadAPI
-from .views import DocumentList, DocumentDetail
-from .views import AnnotationList, AnnotationDetail
-from .views import ConnectionList, ConnectionDetail
-from .views import TextUploadAPI, TextDownloadAPI
+from .views import DocumentList, DocumentQueueAPI, DocumentDetail
+from .views import AnnotationList, AnnotationDetail, AnnotationBulkAPI
+from .views import ConnectionList, ConnectionDetail, ConnectionBulkAPI
+from .views import TextUploadAPI, TextDownloadAPI, PreAnnotationUploadAPI
+from .views import ImportJobList, ImportJobDetail
+from .views import ExportJobList, ExportJobDetail, ExportDownloadAPI
 from .views import StatisticsAPI
 from .views import RoleMappingList, RoleMappingDetail, Roles
 from .views import DocMappingList, DocMappingDetail, RandomDocMappingAPI
@@ -41,6 +43,8 @@ urlpatterns = [
 
      path('projects/<int:project_id>/docs',
          DocumentList.as_view(), name='doc_list'),
+    path('projects/<int:project_id>/docs/next',
+         DocumentQueueAPI.as_view(), name='doc_queue'),
      path('projects/<int:project_id>/docs/<int:doc_id>',
          DocumentDetail.as_view(), name='doc_detail'),
 
@@ -48,18 +52,34 @@ urlpatterns = [
          ApproveLabelsAPI.as_view(), name='approve_labels'),
      path('projects/<int:project_id>/docs/<int:doc_id>/annotations',
          AnnotationList.as_view(), name='annotation_list'),
+     path('projects/<int:project_id>/docs/<int:doc_id>/annotations/bulk',
+         AnnotationBulkAPI.as_view(), name='annotation_bulk'),
      path('projects/<int:project_id>/docs/<int:doc_id>/annotations/<int:annotation_id>',
          AnnotationDetail.as_view(), name='annotation_detail'),
 
      path('projects/<int:project_id>/docs/<int:doc_id>/connections',
          ConnectionList.as_view(), name='connection_list'),
+     path('projects/<int:project_id>/docs/<int:doc_id>/connections/bulk',
+         ConnectionBulkAPI.as_view(), name='connection_bulk'),
      path('projects/<int:project_id>/docs/<int:doc_id>/connections/<int:connection_id>',
          ConnectionDetail.as_view(), name='connection_detail'),
          
      path('projects/<int:project_id>/docs/upload',
          TextUploadAPI.as_view(), name='doc_uploader'),
+     path('projects/<int:project_id>/docs/preannotations',
+         PreAnnotationUploadAPI.as_view(), name='preannotation_uploader'),
      path('projects/<int:project_id>/docs/download',
          TextDownloadAPI.as_view(), name='doc_downloader'),
+     path('projects/<int:project_id>/imports',
+         ImportJobList.as_view(), name='import_list'),
+     path('projects/<int:project_id>/imports/<int:job_id>',
+         ImportJobDetail.as_view(), name='import_detail'),
+     path('projects/<int:project_id>/exports',
+         ExportJobList.as_view(), name='export_list'),
+     path('projects/<int:project_id>/exports/<int:job_id>',
+         ExportJobDetail.as_view(), name='export_detail'),
+     path('projects/<int:project_id>/exports/<int:job_id>/download',
+         ExportDownloadAPI.as_view(), name='export_download'),
      path('projects/<int:project_id>/roles',
          RoleMappingList.as_view(), name='rolemapping_list'),
      path('projects/<int:project_id>/roles/<int:rolemapping_id>',
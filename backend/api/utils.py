@@ -1,31 +1,169 @@
 import base64
+import codecs
+import collections
 import csv
 import io
 import itertools
 import json
+import logging
 import mimetypes
+import multiprocessing
+import os
 import re
+import time
+from concurrent.futures import ProcessPoolExecutor
 
-import conllu
 from chardet import UniversalDetector
-from django.db import transaction
+from django.db import connection, transaction
+from django.db.models import Max
+from django.db.models.functions import Length
 from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.http import http_date
+from django.utils.functional import cached_property
 from colour import Color
-import pyexcel
+import openpyxl
+from rest_framework.exceptions import ValidationError
 from rest_framework.renderers import JSONRenderer
+from rest_framework_csv.renderers import CSVRenderer
 
+from . import parsing
+from .changes import mark_project_changed
+from .concordance import add_to_project_totals, mark_dirty
 from .exceptions import FileParseException
-from .models import Label, User, Relation
+from .models import Document, Label, Relation, User
+from .search import index_later
 from .serializers import DocumentSerializer, LabelSerializer
+from .statistics import count_annotations, count_spans
 
+logger = logging.getLogger(__name__)
 
-def extract_label(tag):
-    ptn = re.compile(r'(B|I|E|S)-(.+)')
-    m = ptn.match(tag)
+
+TAG_PATTERN = re.compile(r'(B|I|E|S)-(.+)')
+CONLL_COLUMNS = re.compile(r'\t| {2,}')
+
+
+def split_tag(tag):
+    """Split a BIOES tag into its prefix and its label, ('', tag) without prefix."""
+    m = TAG_PATTERN.match(tag)
     if m:
-        return m.groups()[1]
+        return m.groups()
     else:
-        return tag
+        return '', tag
+
+
+def extract_label(tag):
+    return split_tag(tag)[1]
+
+
+def bulk_batch_size(model, objs):
+    """IMPORT_BULK_CREATE_SIZE capped to what the database accepts in one INSERT."""
+    fields = model._meta.concrete_fields
+    return max(min(settings.IMPORT_BULK_CREATE_SIZE, connection.ops.bulk_batch_size(fields, objs)), 1)
+
+
+def bulk_create_with_ids(model, objs):
+    """Insert `objs` with `bulk_create` and make sure every object gets its primary key.
+
+    PostgreSQL returns the new ids from the insert itself. SQLite does not, but
+    the inserting transaction holds the database write lock, so the rows it
+    just created are the last `len(objs)` ids of the table. Other databases
+    insert row by row. Like `bulk_create`, no signals are sent.
+    """
+    objs = list(objs)
+    if not objs:
+        return objs
+    batch_size = bulk_batch_size(model, objs)
+    if connection.features.can_return_ids_from_bulk_insert:
+        return model.objects.bulk_create(objs, batch_size=batch_size)
+    if connection.vendor != 'sqlite':
+        fields = [f for f in model._meta.concrete_fields if not f.auto_created]
+        with transaction.atomic():
+            for obj in objs:
+                obj.pk = model._base_manager._insert([obj], fields=fields, return_id=True)
+                obj._state.adding = False
+                obj._state.db = connection.alias
+        return objs
+    with transaction.atomic():
+        model.objects.bulk_create(objs, batch_size=batch_size)
+        last_id = model.objects.aggregate(last_id=Max('pk'))['last_id']
+    for pk, obj in enumerate(objs, start=last_id - len(objs) + 1):
+        obj.pk = pk
+    return objs
+
+
+def bulk_insert(model, fields, rows):
+    """INSERT `rows`, tuples of database-ready values for `fields`, with `executemany`.
+
+    Skips building model instances and compiling the INSERT per batch, which
+    is most of the cost of `bulk_create` for narrow rows. Sends no signals
+    and returns no ids.
+    """
+    if not rows:
+        return
+    qn = connection.ops.quote_name
+    columns = [model._meta.get_field(field).column for field in fields]
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        qn(model._meta.db_table), ', '.join(qn(column) for column in columns), ', '.join(['%s'] * len(columns)))
+    with connection.cursor() as cursor:
+        for i in range(0, len(rows), settings.IMPORT_BULK_CREATE_SIZE):
+            cursor.executemany(sql, rows[i:i + settings.IMPORT_BULK_CREATE_SIZE])
+
+
+class ImportMetrics(object):
+    """Row counters and throughput of one import.
+
+    `on_progress`, when given, is called with the metrics after every batch.
+    """
+
+    def __init__(self, on_progress=None):
+        self.documents = 0
+        self.annotations = 0
+        self.connections = 0
+        self.encoding = None
+        self.detection_seconds = 0.0
+        self.sheet = None
+        self.started_at = time.perf_counter()
+        self.finished_at = None
+        self.on_progress = on_progress
+
+    def add(self, documents=0, annotations=0, connections=0):
+        self.documents += documents
+        self.annotations += annotations
+        self.connections += connections
+        if self.on_progress:
+            self.on_progress(self)
+
+    def finish(self):
+        self.finished_at = time.perf_counter()
+        return self
+
+    @property
+    def seconds(self):
+        return (self.finished_at or time.perf_counter()) - self.started_at
+
+    @property
+    def rows_per_sec(self):
+        seconds = self.seconds
+        return self.documents / seconds if seconds > 0 else 0.0
+
+    def as_dict(self):
+        return {
+            'documents': self.documents,
+            'annotations': self.annotations,
+            'connections': self.connections,
+            'encoding': self.encoding,
+            'detection_seconds': round(self.detection_seconds, 3),
+            'sheet': self.sheet,
+            'seconds': round(self.seconds, 3),
+            'rows_per_sec': round(self.rows_per_sec, 1),
+        }
+
+    def __str__(self):
+        return '{documents} documents, {annotations} annotations in {seconds}s ({rows_per_sec} rows/sec)'.format(
+            **self.as_dict())
+
 
 # 存储基类
 class BaseStorage(object):
@@ -35,7 +173,7 @@ class BaseStorage(object):
         self.project = project
 
     @transaction.atomic
-    def save(self, user):
+    def save(self, user, metrics=None):
         raise NotImplementedError()
 
     def save_doc(self, data):
@@ -114,7 +252,7 @@ class BaseStorage(object):
 class PlainStorage(BaseStorage):
 
     @transaction.atomic
-    def save(self, user):
+    def save(self, user, metrics=None):
         for text in self.data:
             self.save_doc(text)
 
@@ -126,9 +264,22 @@ class SequenceLabelingStorage(BaseStorage):
     The format is as follows:
     {"text": "Python is awesome!", "labels": [[0, 6, "Product"],]}
     ...
+
+    Documents and annotations are written with `bulk_create` after the spans
+    have been checked in memory. Set IMPORT_BULK_CREATE=False to go through
+    the serializers instead, e.g. to compare the throughput of both paths.
     """
+    def save(self, user, metrics=None):
+        metrics = metrics or ImportMetrics()
+        if settings.IMPORT_BULK_CREATE:
+            self.bulk_save(user, metrics)
+        else:
+            self.serializer_save(user, metrics)
+        logger.info('Imported into project %s: %s', self.project.id, metrics)
+        return metrics
+
     @transaction.atomic
-    def save(self, user):
+    def serializer_save(self, user, metrics):
         saved_labels = {label.text: label for label in self.project.labels.all()}
         for data in self.data:
             docs = self.save_doc(data)
@@ -140,6 +291,81 @@ class SequenceLabelingStorage(BaseStorage):
             saved_labels = self.update_saved_labels(saved_labels, new_labels)
             annotations = self.make_annotations(docs, labels, saved_labels)
             self.save_annotation(annotations, user)
+            metrics.add(documents=len(docs), annotations=len(annotations))
+        return metrics.finish()
+
+    @transaction.atomic
+    def bulk_save(self, user, metrics):
+        saved_labels = {label.text: label for label in self.project.labels.all()}
+        line_num = 1
+        for data in self.data:
+            self.validate(data, line_num)
+            labels = self.extract_label(data)
+            unique_labels = self.extract_unique_labels(labels)
+            unique_labels = self.exclude_created_labels(unique_labels, saved_labels)
+            unique_labels = self.to_serializer_format(unique_labels, saved_labels)
+            new_labels = self.save_label(unique_labels)
+            saved_labels = self.update_saved_labels(saved_labels, new_labels)
+            docs = self.bulk_save_doc(data)
+            annotations = self.bulk_save_annotation(docs, labels, saved_labels, user)
+            metrics.add(documents=len(docs), annotations=len(annotations))
+            line_num += len(data)
+        # bulk_create sends no signals.
+        mark_project_changed(self.project.id)
+        return metrics.finish()
+
+    def bulk_save_doc(self, data):
+        docs = [Document(project=self.project,
+                         text=d['text'],
+                         meta=d.get('meta', '{}'))
+                for d in data]
+        # On SQLite the ids are read back from Max(pk): correct because bulk_create_with_ids
+        # inserts and reads in one transaction, which holds the database write lock throughout.
+        docs = bulk_create_with_ids(Document, docs)
+        add_to_project_totals(self.project.id, len(docs), len(docs), len(docs))
+        index_later([doc.id for doc in docs])
+        return docs
+
+    def bulk_save_annotation(self, docs, labels, saved_labels, user):
+        annotation_class = self.project.get_annotation_class()
+        annotations = []
+        for doc, spans in zip(docs, labels):
+            # The same span may appear twice in a file but only once per user in the table.
+            for start_offset, end_offset, name in sorted(set(map(tuple, spans))):
+                annotations.append(annotation_class(document=doc,
+                                                    label=saved_labels[name],
+                                                    start_offset=start_offset,
+                                                    end_offset=end_offset,
+                                                    user=user))
+        batch_size = bulk_batch_size(annotation_class, annotations)
+        annotations = annotation_class.objects.bulk_create(annotations, batch_size=batch_size)
+        count_annotations(self.project.id, annotations)
+        return annotations
+
+    @classmethod
+    def validate(cls, data, line_num):
+        """Check documents and spans in memory so a bad line fails before anything is written."""
+        for i, d in enumerate(data, start=line_num):
+            text = d.get('text')
+            # Numbers, e.g. Excel cells, become strings like DocumentSerializer makes them.
+            if isinstance(text, (int, float)) and not isinstance(text, bool):
+                text = d['text'] = str(text)
+            if not isinstance(text, str):
+                raise FileParseException(line_num=i, line='text is required')
+            # DocumentSerializer rejects blank text too.
+            if not text.strip():
+                raise FileParseException(line_num=i, line='text is blank')
+            meta = d.get('meta')
+            if isinstance(meta, (int, float)) and not isinstance(meta, bool):
+                d['meta'] = str(meta)
+            for span in d.get('labels', []):
+                if not isinstance(span, (list, tuple)) or len(span) != 3:
+                    raise FileParseException(line_num=i, line=span)
+                start_offset, end_offset, name = span
+                if not isinstance(start_offset, int) or not isinstance(end_offset, int) \
+                        or not 0 <= start_offset < end_offset <= len(text) \
+                        or not isinstance(name, str) or not name:
+                    raise FileParseException(line_num=i, line=span)
 
     @classmethod
     def extract_unique_labels(cls, labels):
@@ -159,21 +385,275 @@ class SequenceLabelingStorage(BaseStorage):
         return annotations
 
 
+class PreAnnotationStorage(SequenceLabelingStorage):
+    """Upload jsonl of model predictions for documents already in the project.
+
+    The format is as follows:
+    {"doc_id": 1, "labels": [[0, 6, "Product"], [11, 18, "Quality"]], "relations": [[0, 1, "has"]]}
+    ...
+
+    Relations connect two spans of the same line, given by their index in
+    `labels`. Unknown labels and relations are created. Spans and
+    connections the document already has are skipped, so a file can be
+    loaded again.
+    """
+    format = 'preannotation'
+
+    def save(self, user, metrics=None):
+        metrics = metrics or ImportMetrics()
+        self.bulk_save(user, metrics)
+        logger.info('Pre-annotated project %s: %s', self.project.id, metrics)
+        return metrics
+
+    @transaction.atomic
+    def bulk_save(self, user, metrics):
+        saved_labels = {label.text: label for label in self.project.labels.all()}
+        saved_relations = {relation.text: relation for relation in self.project.relations.all()}
+        line_num = 1
+        for data in self.data:
+            document_ids = [d.get('doc_id') for d in data]
+            lengths = dict(self.project.documents.filter(pk__in=[pk for pk in document_ids if self.is_id(pk)])
+                           .values_list('id', Length('text')))
+            self.validate(data, line_num, lengths)
+            labels = self.extract_label(data)
+            unique_labels = self.extract_unique_labels(labels)
+            unique_labels = self.exclude_created_labels(unique_labels, saved_labels)
+            unique_labels = self.to_serializer_format(unique_labels, saved_labels)
+            new_labels = self.save_label(unique_labels)
+            saved_labels = self.update_saved_labels(saved_labels, new_labels)
+            saved_relations = self.save_relations(data, saved_relations)
+            annotations, spans = self.bulk_save_annotation(data, labels, saved_labels, user)
+            connections = self.bulk_save_connection(data, spans, saved_relations)
+            metrics.add(documents=len(data), annotations=annotations, connections=connections)
+            line_num += len(data)
+        return metrics.finish()
+
+    def save_relations(self, data, saved):
+        names = {name for d in data for _, _, name in d.get('relations', [])} - set(saved)
+        for name in sorted(names):
+            saved[name] = Relation.objects.create(project=self.project, text=name)
+        return saved
+
+    def bulk_save_annotation(self, data, labels, saved_labels, user):
+        """Create the spans the documents do not have yet.
+
+        Returns the number of new annotations, and the annotation id of every
+        span of every line for the relations to refer to.
+        """
+        annotation_class = self.project.get_annotation_class()
+        document_ids = [d['doc_id'] for d in data]
+        existing = annotation_class.objects.filter(document__in=document_ids, user=user)
+        keys = set(existing.values_list('document_id', 'label_id', 'start_offset', 'end_offset').iterator())
+
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+        rows = []
+        for document_id, line in zip(document_ids, labels):
+            for start_offset, end_offset, name in line:
+                key = (document_id, saved_labels[name].id, start_offset, end_offset)
+                if key not in keys:
+                    keys.add(key)
+                    rows.append(key + (user.id, now, now))
+        bulk_insert(annotation_class,
+                    ('document', 'label', 'start_offset', 'end_offset', 'user', 'created_at', 'updated_at'), rows)
+        count_spans(self.project.id, [(row[0], row[1], user.id) for row in rows])
+        for document_id in {row[0] for row in rows}:
+            mark_dirty(document_id, entity=True)
+
+        ids = {key[:-1]: key[-1] for key in existing.values_list(
+            'document_id', 'label_id', 'start_offset', 'end_offset', 'id').iterator()}
+        spans = [[ids[(document_id, saved_labels[name].id, start_offset, end_offset)]
+                  for start_offset, end_offset, name in line]
+                 for document_id, line in zip(document_ids, labels)]
+        return len(rows), spans
+
+    def bulk_save_connection(self, data, spans, saved_relations):
+        """Create the connections the documents do not have yet and return how many."""
+        connection_class = self.project.get_connection_class()
+        document_ids = [d['doc_id'] for d in data if d.get('relations')]
+        existing = set(connection_class.objects.filter(document__in=document_ids).values_list(
+            'document_id', 'source_id', 'to_id', 'relation_id').iterator())
+
+        rows = []
+        for d, line in zip(data, spans):
+            for source, to, name in d.get('relations', []):
+                key = (d['doc_id'], line[source], line[to], saved_relations[name].id)
+                if key not in existing:
+                    existing.add(key)
+                    rows.append(key)
+        bulk_insert(connection_class, ('document', 'source', 'to', 'relation'), rows)
+        for document_id in {row[0] for row in rows}:
+            mark_dirty(document_id, relation=True)
+        return len(rows)
+
+    @staticmethod
+    def is_id(value):
+        return isinstance(value, int) and not isinstance(value, bool)
+
+    @classmethod
+    def validate(cls, data, line_num, lengths):
+        """Check documents, spans and relations in memory before anything is written.
+
+        `lengths` maps the ids of the project's documents to the length of their text.
+        """
+        for i, d in enumerate(data, start=line_num):
+            doc_id = d.get('doc_id')
+            if not cls.is_id(doc_id):
+                raise FileParseException(line_num=i, line=f'doc_id {doc_id} is not an id')
+            if doc_id not in lengths:
+                raise FileParseException(line_num=i, line=f'no document {doc_id} in this project')
+            spans = d.get('labels', [])
+            for span in spans:
+                if not isinstance(span, (list, tuple)) or len(span) != 3:
+                    raise FileParseException(line_num=i, line=span)
+                start_offset, end_offset, name = span
+                if not isinstance(start_offset, int) or not isinstance(end_offset, int) \
+                        or not 0 <= start_offset < end_offset <= lengths[doc_id] \
+                        or not isinstance(name, str) or not name:
+                    raise FileParseException(line_num=i, line=span)
+            for relation in d.get('relations', []):
+                if not isinstance(relation, (list, tuple)) or len(relation) != 3:
+                    raise FileParseException(line_num=i, line=relation)
+                source, to, name = relation
+                if not all(isinstance(index, int) and 0 <= index < len(spans) for index in (source, to)) \
+                        or not isinstance(name, str) or not name:
+                    raise FileParseException(line_num=i, line=relation)
+
+
 class FileParser(object):
+    """Base of the upload parsers.
+
+    `encoding` skips the detection of the encoding of text files. The
+    encoding used and the time spent detecting it are recorded in `metrics`.
+    """
+
+    def __init__(self, encoding=None, metrics=None):
+        self.encoding = encoding
+        self.metrics = metrics
 
     def parse(self, file, spliter):
         raise NotImplementedError()
 
+    def open_text(self, file):
+        file = EncodedIO(file, encoding=self.encoding)
+        if self.metrics:
+            self.metrics.encoding = file.encoding
+            self.metrics.detection_seconds += file.detection_seconds
+        return io.TextIOWrapper(file, encoding=file.encoding)
+
+    def open_parallel(self, file):
+        """Decide whether `file` is parsed by worker processes, see `api/parsing.py`.
+
+        Returns the path, the encoding and the byte ranges of the file, or
+        None to parse it in this process: when IMPORT_PARALLEL_WORKERS is
+        below 2, the file is not on disk or smaller than
+        IMPORT_PARALLEL_MIN_SIZE, or its encoding cannot be cut on newlines.
+        """
+        if settings.IMPORT_PARALLEL_WORKERS < 2:
+            return None
+        if hasattr(file, 'temporary_file_path'):
+            path = file.temporary_file_path()
+        elif isinstance(file, io.BufferedReader) and isinstance(file.name, str):
+            path = file.name
+        else:
+            return None
+        if os.path.getsize(path) < settings.IMPORT_PARALLEL_MIN_SIZE:
+            return None
+        with open(path, 'rb') as f:
+            encoded = EncodedIO(f, encoding=self.encoding)
+        if not parsing.splits_on_newline(encoded.encoding):
+            return None
+        if self.metrics:
+            self.metrics.encoding = encoded.encoding
+            self.metrics.detection_seconds += encoded.detection_seconds
+        return path, encoded.encoding, parsing.split_ranges(path)
+
+    @staticmethod
+    def parse_parallel(path, encoding, ranges, file_format):
+        """Yield the records of `ranges` parsed by a process pool, in file order.
+
+        No more than two ranges per worker are in flight, so a slow writer
+        keeps memory bounded.
+        """
+        workers = settings.IMPORT_PARALLEL_WORKERS
+        context = multiprocessing.get_context('spawn')
+        pending = collections.deque()
+        ranges = iter(ranges)
+        line_num = 1
+        data = []
+        with ProcessPoolExecutor(workers, mp_context=context) as executor:
+            try:
+                for start, end in itertools.islice(ranges, workers * 2):
+                    pending.append(executor.submit(parsing.parse_range, path, start, end, encoding, file_format))
+                while pending:
+                    records, lines, error = pending.popleft().result()
+                    if error:
+                        raise FileParseException(line_num=line_num + error[0] - 1, line=error[1])
+                    for start, end in itertools.islice(ranges, 1):
+                        pending.append(executor.submit(parsing.parse_range, path, start, end, encoding, file_format))
+                    for record in records:
+                        if len(data) >= settings.IMPORT_BATCH_SIZE:
+                            yield data
+                            data = []
+                        data.append(record)
+                    line_num += lines
+            finally:
+                for future in pending:
+                    future.cancel()
+        if data:
+            yield data
+
     @staticmethod
     def encode_metadata(data):
-        return json.dumps(data, ensure_ascii=False)
+        return parsing.encode_metadata(data)
+
+
+class CoNLLSentence(object):
+    """Words of a sentence and their tags merged into spans.
+
+    Offsets are kept running, so adding a word costs O(1). B-, I-, E- and
+    S- tags are merged into one span per entity; I- or E- continue the open
+    span of the same label and start a new one otherwise. Tags without a
+    prefix continue a span of the same label, "O" and "_" are outside.
+    """
+
+    def __init__(self):
+        self.words = []
+        self.labels = []
+        self.offset = 0
+        self.span = None
+
+    def __bool__(self):
+        return bool(self.words)
+
+    def add(self, word, tag):
+        start = self.offset
+        end = start + len(word)
+        self.offset = end + 1
+        self.words.append(word)
+        if tag in ('O', '_', ''):
+            self.span = None
+            return
+        prefix, label = split_tag(tag)
+        span = self.span
+        if span is not None and prefix in ('I', 'E', '') and span[2] == label:
+            span[1] = end
+        else:
+            span = [start, end, label]
+            self.labels.append(span)
+        self.span = None if prefix in ('E', 'S') else span
+
+    def to_json(self):
+        return {'text': ' '.join(self.words), 'labels': self.labels}
 
 
 class CoNLLParser(FileParser):
     """Uploads CoNLL format file.
 
-    The file format is tab-separated values.
-    A blank line is required at the end of a sentence.
+    The file format is columns separated by a tab or by two or more spaces,
+    or by a single space when a line has just a word and a tag, the word
+    first and its tag second; a word without a tag is outside ("O").
+    A blank line is required at the end of a sentence. Lines starting with "#"
+    are comments.
     For example:
     ```
     EU	B-ORG
@@ -190,50 +670,36 @@ class CoNLLParser(FileParser):
     Blackburn	I-PER
     ...
     ```
+    Each sentence becomes a document whose words are joined by spaces, with
+    one span per entity, e.g. [0, 2, "ORG"] and [0, 15, "PER"] above.
     """
     def parse(self, file, spliter):
         data = []
-        file = EncodedIO(file)
-        file = io.TextIOWrapper(file, encoding=file.encoding)
-
-        # Add check exception
-
-        field_parsers = {
-            "ne": lambda line, i: conllu.parser.parse_nullable_value(line[i]),
-        }
-
-        gen_parser = conllu.parse_incr(
-            file,
-            fields=("form", "ne"),
-            field_parsers=field_parsers
-        )
+        file = self.open_text(file)
 
-        try:
-            for sentence in gen_parser:
-                if not sentence:
-                    continue
-                if len(data) >= settings.IMPORT_BATCH_SIZE:
-                    yield data
-                    data = []
-                words, labels = [], []
-                for item in sentence:
-                    word = item.get("form")
-                    tag = item.get("ne")
-
-                    if tag is not None:
-                        char_left = sum(map(len, words)) + len(words)
-                        char_right = char_left + len(word)
-                        span = [char_left, char_right, tag]
-                        labels.append(span)
-
-                    words.append(word)
-
-                # Create and add JSONL
-                data.append({'text': ' '.join(words), 'labels': labels})
-
-        except conllu.parser.ParseException as e:
-            raise FileParseException(line_num=-1, line=str(e))
+        sentence = CoNLLSentence()
+        for i, line in enumerate(file, start=1):
+            line = line.rstrip('\r\n')
+            if not line.strip():
+                if sentence:
+                    data.append(sentence.to_json())
+                    sentence = CoNLLSentence()
+                    if len(data) >= settings.IMPORT_BATCH_SIZE:
+                        yield data
+                        data = []
+                continue
+            if line.startswith('#'):
+                continue
+            columns = CONLL_COLUMNS.split(line, 2)
+            if len(columns) == 1 and len(line.split()) == 2:
+                columns = line.split()
+            columns = [column.strip() for column in columns[:2]]
+            if not columns[0] or any(' ' in column for column in columns):
+                raise FileParseException(line_num=i, line=line)
+            sentence.add(columns[0], columns[1] if len(columns) > 1 else 'O')
 
+        if sentence:
+            data.append(sentence.to_json())
         if data:
             yield data
 
@@ -247,29 +713,71 @@ class PlainTextParser(FileParser):
     President Obama is speaking at the White House.
     ...
     ```
+    Each line is a document, unless a `spliter` separates the documents.
+    They may span lines then, and a spliter starting with "re:" is a
+    regular expression, e.g. "re:\\n\\s*\\n" for blank lines. Empty
+    documents between spliters are skipped.
     """
+    REGEX_PREFIX = 're:'
+    # Number of characters read at a time while splitting
+    chunk_size = 64 * 1024
+    # Longest separator that can straddle two chunks
+    max_separator = 1024
+
     def parse(self, file, spliter):
-        file = EncodedIO(file)
-        file = io.TextIOWrapper(file, encoding=file.encoding)
+        parallel = None if spliter else self.open_parallel(file)
+        if parallel:
+            yield from self.parse_parallel(*parallel, 'plain')
+            return
+        file = self.open_text(file)
+        records = self.split(file, self.compile_spliter(spliter)) if spliter else file
         while True:
-            batch = list(itertools.islice(file, settings.IMPORT_BATCH_SIZE))
-
-            if spliter and spliter != '' and batch:
-                batch_str = ''.join(batch)
-                if spliter in batch_str:
-                    batch = batch_str.split(spliter)
-                    while '' in batch:
-                        batch.remove('')
-                    while '\n' in batch:
-                        batch.remove('\n')
-                else:
-                    batch = []
-                    batch.append(batch_str)
-                    
+            batch = list(itertools.islice(records, settings.IMPORT_BATCH_SIZE))
             if not batch:
                 break
 
-            yield [{'text': line.strip('')} for line in batch]
+            yield [{'text': record} for record in batch]
+
+    @classmethod
+    def compile_spliter(cls, spliter):
+        if spliter.startswith(cls.REGEX_PREFIX):
+            try:
+                pattern = re.compile(spliter[len(cls.REGEX_PREFIX):])
+            except re.error as e:
+                raise ValidationError('spliter {} is invalid: {}'.format(spliter, e))
+        else:
+            pattern = re.compile(re.escape(spliter))
+        if pattern.match(''):
+            raise ValidationError('spliter {} matches empty text.'.format(spliter))
+        return pattern
+
+    def split(self, file, pattern):
+        """Yield the text of `file` between the matches of `pattern`.
+
+        What follows the last separator of a chunk is carried over to the
+        next one. A match is only trusted when `max_separator` characters
+        follow it or the file has ended, so separators straddling chunks
+        are found whole. Reads double while no separator turns up, which
+        keeps long documents linear.
+        """
+        buffer, size = '', self.chunk_size
+        while True:
+            chunk = file.read(size)
+            buffer += chunk
+            limit = len(buffer) - self.max_separator if chunk else len(buffer)
+            start = 0
+            for m in pattern.finditer(buffer):
+                if m.end() > limit:
+                    break
+                if buffer[start:m.start()] not in ('', '\n'):
+                    yield buffer[start:m.start()]
+                start = m.end()
+            buffer = buffer[start:]
+            if not chunk:
+                if buffer not in ('', '\n'):
+                    yield buffer
+                return
+            size = self.chunk_size if start else size * 2
 
 
 class CSVParser(FileParser):
@@ -287,23 +795,40 @@ class CSVParser(FileParser):
     ```
     """
     def parse(self, file, spliter):
-        file = EncodedIO(file)
-        file = io.TextIOWrapper(file, encoding=file.encoding)
+        file = self.open_text(file)
         reader = csv.reader(file)
         yield from ExcelParser.parse_excel_csv_reader(reader)
 
 
 class ExcelParser(FileParser):
+    """Uploads xlsx file, with the same columns as a csv file in every sheet.
+
+    Rows are streamed from the workbook in read-only mode, so only the
+    shared strings and the current batch are kept in memory.
+    """
     def parse(self, file, spliter):
-        excel_book = pyexcel.iget_book(file_type="xlsx", file_content=file.read())
-        # Handle multiple sheets
-        for sheet_name in excel_book.sheet_names():
-            reader = excel_book[sheet_name].to_array()
-            yield from self.parse_excel_csv_reader(reader)
+        book = openpyxl.load_workbook(file, read_only=True, data_only=True)
+        try:
+            # Handle multiple sheets
+            for sheet in book.worksheets:
+                if self.metrics:
+                    self.metrics.sheet = sheet.title
+                yield from self.parse_excel_csv_reader(self.iter_rows(sheet))
+                logger.info('Parsed sheet %s', sheet.title)
+        finally:
+            book.close()
+
+    @staticmethod
+    def iter_rows(sheet):
+        for row in sheet.iter_rows(values_only=True):
+            if any(value is not None for value in row):
+                yield ['' if value is None else value for value in row]
 
     @staticmethod
     def parse_excel_csv_reader(reader):
-        columns = next(reader)
+        columns = next(reader, None)
+        if columns is None:
+            return
         data = []
         if len(columns) == 1 and columns[0] != 'text':
             data.append({'text': columns[0]})
@@ -333,18 +858,19 @@ class ExcelParser(FileParser):
 class JSONParser(FileParser):
 
     def parse(self, file, spliter):
-        file = EncodedIO(file)
-        file = io.TextIOWrapper(file, encoding=file.encoding)
+        parallel = self.open_parallel(file)
+        if parallel:
+            yield from self.parse_parallel(*parallel, 'json')
+            return
+        file = self.open_text(file)
         data = []
         for i, line in enumerate(file, start=1):
             if len(data) >= settings.IMPORT_BATCH_SIZE:
                 yield data
                 data = []
             try:
-                j = json.loads(line)
-                j['meta'] = FileParser.encode_metadata(j.get('meta', {}))
-                data.append(j)
-            except json.decoder.JSONDecodeError:
+                data.append(parsing.parse_json_line(line))
+            except ValueError:
                 raise FileParseException(line_num=i, line=line)
         if data:
             yield data
@@ -382,14 +908,68 @@ class JSONLRenderer(JSONRenderer):
                              allow_nan=not self.strict) + '\n'
 
 
+def iterate_chunks(queryset, chunk_size):
+    """Split `queryset` into querysets of at most `chunk_size` rows, in id order.
+
+    Unlike `QuerySet.iterator()`, each chunk is a regular queryset, so
+    `prefetch_related` still applies to it.
+    """
+    last_id = 0
+    while True:
+        ids = list(queryset.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            return
+        yield queryset.model.objects.filter(id__in=ids).order_by('id')
+        last_id = ids[-1]
+
+
+class Echo(object):
+    """File-like object handing back what is written, for streaming a `csv.writer`."""
+
+    def write(self, value):
+        return value
+
+
 class JSONPainter(object):
+    """Paints the documents of `project` for export.
+
+    Label and relation names are looked up in maps built once per painter
+    instead of being queried for every annotation.
+    """
+
+    def __init__(self, project):
+        self.project = project
+
+    @cached_property
+    def label_texts(self):
+        return dict(self.project.labels.values_list('id', 'text'))
+
+    @cached_property
+    def relation_texts(self):
+        return dict(self.project.relations.values_list('id', 'text'))
+
+    def stream(self, documents, labels=None):
+        """Paint `documents` chunk by chunk, yielding one JSON line per document.
+
+        With `labels`, documents are painted as by `paint_labels`.
+        """
+        renderer = JSONLRenderer()
+        if labels is not None:
+            labels = list(labels)
+        for chunk in iterate_chunks(documents, settings.EXPORT_CHUNK_SIZE):
+            chunk = DocumentSerializer.setup_eager_loading(chunk)
+            if labels is not None:
+                data = self.paint_labels(chunk, labels)
+            else:
+                data = self.paint(chunk)
+            yield from renderer.render(data)
 
     def paint(self, documents):
         serializer = DocumentSerializer(documents, many=True)
         data = []
         for d in serializer.data:
             for a in d['annotations']:
-                a['label'] = Label.objects.get(id=a['label']).text   
+                a['label'] = self.label_texts[a['label']]
                 a.pop('user')
                 a.pop('document')
                 a.pop('created_at')
@@ -398,7 +978,7 @@ class JSONPainter(object):
                 a.pop('id')
                 a.pop('document')
                 if a['relation']:
-                    a['relation'] = Relation.objects.get(id=a['relation']).text
+                    a['relation'] = self.relation_texts[a['relation']]
             d.pop('approver_assign')
             d.pop('annotator_assign')
             data.append(d)
@@ -406,27 +986,52 @@ class JSONPainter(object):
 
     @staticmethod
     def paint_labels(documents, labels):
-        serializer_labels = LabelSerializer(labels, many=True)
+        label_texts = {label.id: label.text for label in labels}
         serializer = DocumentSerializer(documents, many=True)
         data = []
         for d in serializer.data:
             labels = []
             for a in d['annotations']:
-                label_obj = [x for x in serializer_labels.data if x['id'] == a['label']][0]
-                label_text = label_obj['text']
+                label_text = label_texts[a['label']]
                 label_start = a['start_offset']
                 label_end = a['end_offset']
                 labels.append([label_start, label_end, label_text])
             d.pop('annotations')
             d['labels'] = labels
             # d['meta'] = json.loads(d['meta'])
-            d.pop('meta')
+            d.pop('meta', None)
             data.append(d)
         return data
 
 
 class CSVPainter(JSONPainter):
 
+    def stream(self, documents, labels=None):
+        """Paint `documents` chunk by chunk, yielding one CSV line per annotation.
+
+        Lines are the ones CSVRenderer makes of `paint`: nested values are
+        flattened into dotted columns, and the header is the sorted union of
+        the columns of every row. The documents are painted twice, once for
+        the header and once for the lines, so memory stays flat.
+        """
+        renderer = CSVRenderer()
+        header = set()
+        for rows in self.paint_chunks(documents):
+            for row in renderer.flatten_data(rows):
+                header.update(row)
+        if not header:
+            return
+        header = sorted(header)
+        writer = csv.writer(Echo())
+        yield writer.writerow(header)
+        for rows in self.paint_chunks(documents):
+            for row in renderer.flatten_data(rows):
+                yield writer.writerow([row.get(name) for name in header])
+
+    def paint_chunks(self, documents):
+        for chunk in iterate_chunks(documents, settings.EXPORT_CHUNK_SIZE):
+            yield self.paint(DocumentSerializer.setup_eager_loading(chunk))
+
     def paint(self, documents):
         data = super().paint(documents)
         res = []
@@ -437,6 +1042,69 @@ class CSVPainter(JSONPainter):
         return res
 
 
+def read_range(path, start, length, block_size=64 * 1024):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            block = f.read(min(block_size, length))
+            if not block:
+                break
+            length -= len(block)
+            yield block
+
+
+def parse_range(header, size):
+    """Parse a single `bytes=` range against a file of `size` bytes.
+
+    Returns `(start, end)` with an inclusive `end`, `None` when the header
+    should be ignored, or `False` when the range cannot be satisfied.
+    """
+    m = re.fullmatch(r'bytes=(\d*)-(\d*)', header.strip())
+    if not m or m.group(1) == m.group(2) == '':
+        return None
+    first, last = m.groups()
+    if first == '':
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start > end or start >= size:
+        return False
+    return start, end
+
+
+def file_response(request, path, content_type, etag, filename=None):
+    """Serve `path` with ETag/Last-Modified validation and single byte ranges."""
+    stat = os.stat(path)
+    size = stat.st_size
+    etag = f'"{etag}"'
+    if request.META.get('HTTP_IF_NONE_MATCH') in (etag, '*'):
+        response = HttpResponse(status=304)
+    else:
+        byte_range = None
+        if_range = request.META.get('HTTP_IF_RANGE')
+        if 'HTTP_RANGE' in request.META and (not if_range or if_range == etag):
+            byte_range = parse_range(request.META['HTTP_RANGE'], size)
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+        elif byte_range:
+            start, end = byte_range
+            response = StreamingHttpResponse(read_range(path, start, end - start + 1),
+                                             status=206, content_type=content_type)
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = end - start + 1
+        else:
+            response = StreamingHttpResponse(read_range(path, 0, size), content_type=content_type)
+            response['Content-Length'] = size
+        if filename:
+            response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
 def iterable_to_io(iterable, buffer_size=io.DEFAULT_BUFFER_SIZE):
     """See https://stackoverflow.com/a/20260030/3817588."""
     class IterStream(io.RawIOBase):
@@ -460,31 +1128,67 @@ def iterable_to_io(iterable, buffer_size=io.DEFAULT_BUFFER_SIZE):
 
 
 class EncodedIO(io.RawIOBase):
-    def __init__(self, fobj, buffer_size=io.DEFAULT_BUFFER_SIZE, default_encoding='utf-8'):
-        buffer = b''
-        detector = UniversalDetector()
+    """Raw bytes of `fobj` together with the encoding to decode them with.
 
-        while True:
-            read = fobj.read(buffer_size)
-            detector.feed(read)
-            buffer += read
-            if detector.done or len(read) < buffer_size:
-                break
-
-        if detector.done:
-            self.encoding = detector.result['encoding']
+    An explicit `encoding` is used as is. Otherwise a byte order mark
+    decides, and failing that chardet looks at no more than `sample_size`
+    bytes; `default_encoding` is used when it finds nothing but ASCII.
+    `detection_seconds` is the time the detection took.
+    """
+    BOMS = (
+        (codecs.BOM_UTF32_LE, 'utf-32'),
+        (codecs.BOM_UTF32_BE, 'utf-32'),
+        (codecs.BOM_UTF8, 'utf-8-sig'),
+        (codecs.BOM_UTF16_LE, 'utf-16'),
+        (codecs.BOM_UTF16_BE, 'utf-16'),
+    )
+
+    def __init__(self, fobj, encoding=None, sample_size=None, buffer_size=io.DEFAULT_BUFFER_SIZE,
+                 default_encoding='utf-8'):
+        started = time.perf_counter()
+        sample_size = settings.ENCODING_SAMPLE_SIZE if sample_size is None else sample_size
+        chunks = [fobj.read(buffer_size)]
+        if encoding:
+            self.encoding = encoding
         else:
-            self.encoding = default_encoding
+            self.encoding = self.detect_bom(chunks[0])
+        if not self.encoding:
+            detector = UniversalDetector()
+            detector.feed(chunks[0])
+            read, size = chunks[0], len(chunks[0])
+            while not detector.done and len(read) == buffer_size and size < sample_size:
+                read = fobj.read(min(buffer_size, sample_size - size))
+                detector.feed(read)
+                chunks.append(read)
+                size += len(read)
+            detector.close()
+            # ASCII only holds for the sample, the default is a superset of it.
+            if detector.result['encoding'] and detector.result['encoding'] != 'ascii':
+                self.encoding = detector.result['encoding']
+            else:
+                self.encoding = default_encoding
+        self.detection_seconds = time.perf_counter() - started
 
         self._fobj = fobj
-        self._buffer = buffer
+        self._buffer = b''.join(chunks)
+        self._position = 0
+
+    @classmethod
+    def detect_bom(cls, head):
+        for bom, encoding in cls.BOMS:
+            if head.startswith(bom):
+                return encoding
+        return None
 
     def readable(self):
         return self._fobj.readable()
 
     def readinto(self, b):
         l = len(b)
-        chunk = self._buffer or self._fobj.read(l)
-        output, self._buffer = chunk[:l], chunk[l:]
+        if self._position < len(self._buffer):
+            output = self._buffer[self._position:self._position + l]
+            self._position += len(output)
+        else:
+            output = self._fobj.read(l)
         b[:len(output)] = output
         return len(output)
@@ -1,29 +1,45 @@
-import collections
+import codecs
+import copy
 import json
+import os
 import random
+import time
 
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.db import transaction
+from django.db.models import Exists, OuterRef
 from django.db.utils import IntegrityError
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Count, Q, Subquery
 from rest_framework import generics, filters, status
-from rest_framework.exceptions import ParseError, ValidationError
+from rest_framework.exceptions import NotFound, ParseError, ValidationError
 from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.parsers import MultiPartParser
+from rest_framework.utils.urls import replace_query_param
 from rest_framework_csv.renderers import CSVRenderer
 
-from .filters import DocumentFilter
-from .models import Project, Label, Document, RoleMapping, Role, DocMapping, Relation
-from .permissions import IsProjectAdmin, IsAnnotatorAndReadOnly, IsAnnotator, IsAnnotationApproverAndReadOnly, IsAnnotationApprover
+from .assignment import assign_documents
+from .concordance import mark_dirty
+from .filters import DocumentFilter, DocumentSearchFilter, annotated_by
+from .jobs import enqueue_export, enqueue_import
+from .models import Project, Label, Document, RoleMapping, Role, DocMapping, Relation, ImportJob, ExportJob
+from .pagination import DocumentPagination
+from .permissions import is_in_role, IsProjectAdmin, IsAnnotatorAndReadOnly, IsAnnotator, IsAnnotationApproverAndReadOnly, IsAnnotationApprover
 from .serializers import ProjectSerializer, LabelSerializer, DocumentSerializer, UserSerializer, ApproverSerializer, RelationSerializer
-from .serializers import RoleMappingSerializer, RoleSerializer, DocMappingSerializer
+from .serializers import RoleMappingSerializer, RoleSerializer, DocMappingSerializer, ImportJobSerializer, ExportJobSerializer
+from .serializers import DocumentSummarySerializer
+from .statistics import count_annotations, count_label_changes, get_statistics
 from .utils import CSVParser, ExcelParser, JSONParser, PlainTextParser, CoNLLParser, AudioParser
+from .utils import PreAnnotationStorage
 from .utils import JSONLRenderer
-from .utils import JSONPainter, CSVPainter
+from .utils import JSONPainter, CSVPainter, ImportMetrics, file_response
+from .utils import bulk_batch_size, bulk_create_with_ids
 
 IsInProjectReadOnlyOrAdmin = (IsAnnotatorAndReadOnly | IsAnnotationApproverAndReadOnly | IsProjectAdmin)
 IsInProjectOrAdmin = (IsAnnotator | IsAnnotationApprover | IsProjectAdmin)
@@ -51,9 +67,10 @@ class ProjectList(generics.ListCreateAPIView):
 
     def get_queryset(self):
         if self.request.user.is_superuser:
-            return Project.objects.all()
+            queryset = Project.objects.all()
         else:
-            return self.request.user.projects
+            queryset = self.request.user.projects.all()
+        return queryset.prefetch_related('users')
 
     def perform_create(self, serializer):
         serializer.save(users=[self.request.user])
@@ -67,6 +84,12 @@ class ProjectDetail(generics.RetrieveUpdateDestroyAPIView):
 
 
 class StatisticsAPI(APIView):
+    """Label and progress statistics of a project, read from its statistics counters.
+
+    Each section is cached until the project's data changes, or for
+    STATISTICS_CACHE_TIMEOUT seconds. `?fresh=1` recomputes them. The time
+    spent on each section is reported in the Server-Timing header.
+    """
     pagination_class = None
     permission_classes = [IsAuthenticated & IsInProjectReadOnlyOrAdmin]
 
@@ -74,44 +97,60 @@ class StatisticsAPI(APIView):
         p = get_object_or_404(Project, pk=self.kwargs['project_id'])
 
         include = set(request.GET.getlist('include'))
+        fresh = bool(request.GET.get('fresh'))
         response = {}
+        timings = []
 
         if not include or 'label' in include:
-            label_count, user_count = self.label_per_data(p)
+            label_count, user_count = self.section(p, 'label', self.label_per_data, fresh, timings)
             response['label'] = label_count
             # TODO: Make user_label count chart
             response['user_label'] = user_count
 
         if not include or 'total' in include or 'remaining' in include or 'user' in include:
-            progress = self.progress(project=p)
+            progress = self.section(p, 'progress', self.progress, fresh, timings)
             response.update(progress)
 
         if include:
             response = {key: value for (key, value) in response.items() if key in include}
 
-        return Response(response)
+        response = Response(response)
+        response['Server-Timing'] = ', '.join(timings)
+        return response
 
     @staticmethod
-    def _get_user_completion_data(annotation_class, annotation_filter):
-        all_annotation_objects  = annotation_class.objects.filter(annotation_filter)
-        set_user_data = collections.defaultdict(set)
-        for ind_obj in all_annotation_objects.values('user__username', 'document__id'):
-            set_user_data[ind_obj['user__username']].add(ind_obj['document__id'])
-        return {i: len(set_user_data[i]) for i in set_user_data}
+    def cache_key(project, name):
+        # Moving data_updated_at retires the cached sections.
+        watermark = project.data_updated_at.timestamp() if project.data_updated_at else 0
+        return f'statistics:{project.id}:{watermark}:{name}'
+
+    def section(self, project, name, compute, fresh, timings):
+        key = self.cache_key(project, name)
+        start = time.perf_counter()
+        value = None if fresh else cache.get(key)
+        cached = value is not None
+        if not cached:
+            value = compute(project)
+            cache.set(key, value, settings.STATISTICS_CACHE_TIMEOUT)
+        duration = (time.perf_counter() - start) * 1000
+        timings.append(f'{name};dur={duration:.1f}' + (';desc="cached"' if cached else ''))
+        return value
+
+    def statistics(self, project):
+        # Both sections read the same counters.
+        if not hasattr(self, '_statistics'):
+            self._statistics = get_statistics(project)
+        return self._statistics
 
     def progress(self, project):
-        docs = project.documents
-        annotation_class = project.get_annotation_class()
-        total = docs.count()
-        annotation_filter = Q(document_id__in=docs.all())
-        user_data = self._get_user_completion_data(annotation_class, annotation_filter)
-        done = docs.filter(annotations_approved_by__isnull=False).aggregate(Count('id'))['id__count']
-        remaining = total - done
-        return {'total': total, 'remaining': remaining, 'user': user_data}
+        statistics = self.statistics(project)
+        total = project.document_count
+        remaining = total - statistics['approved']
+        return {'total': total, 'remaining': remaining, 'user': statistics['user']}
 
     def label_per_data(self, project):
-        annotation_class = project.get_annotation_class()
-        return annotation_class.objects.get_label_per_data(project=project)
+        statistics = self.statistics(project)
+        return statistics['label'], statistics['user_label']
 
 
 class ApproveLabelsAPI(APIView):
@@ -167,8 +206,14 @@ class RelationDetail(generics.RetrieveUpdateDestroyAPIView):
 
 
 class DocumentList(generics.ListCreateAPIView):
+    """Documents of a project.
+
+    `?fields=` lists them with DocumentSummarySerializer. See DocumentPagination
+    for `?count=false` and `?pagination=cursor`.
+    """
     serializer_class = DocumentSerializer
-    filter_backends = (DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter)
+    pagination_class = DocumentPagination
+    filter_backends = (DjangoFilterBackend, DocumentSearchFilter, filters.OrderingFilter)
     search_fields = ('text', )
     ordering_fields = ('created_at', 'updated_at', 'doc_annotations__updated_at',
                        'seq_annotations__updated_at')
@@ -176,11 +221,12 @@ class DocumentList(generics.ListCreateAPIView):
     permission_classes = [IsAuthenticated & IsInProjectReadOnlyOrAdmin]
 
     def is_role_of(self, user_id, project_id, role_name):
-        return RoleMapping.objects.filter(
-                    user_id=user_id,
-                    project_id=project_id,
-                    role_id=Subquery(Role.objects.filter(name=role_name).values('id')),
-                ).exists()
+        return is_in_role(role_name, user_id, project_id, self.request)
+
+    def get_serializer_class(self):
+        if self.request.method == 'GET' and 'fields' in self.request.query_params:
+            return DocumentSummarySerializer
+        return self.serializer_class
 
     def get_queryset(self):
         project = get_object_or_404(Project, pk=self.kwargs['project_id'])
@@ -190,16 +236,64 @@ class DocumentList(generics.ListCreateAPIView):
         user = self.request.user
         if not user.is_superuser:
             # project_admin / annotation_approver / annotator
-            isAdmin  = self.is_role_of(user.id, project.id, 'project_admin')           
+            isAdmin  = self.is_role_of(user.id, project.id, settings.ROLE_PROJECT_ADMIN)
             if not isAdmin:
                 queryset = queryset.filter(docmapping__rolemap__user=user)
-        return queryset
+        annotator = user if self.is_role_of(user.id, project.id, settings.ROLE_ANNOTATOR) else None
+        return self.get_serializer_class().setup_eager_loading(queryset, annotator=annotator)
 
     def perform_create(self, serializer):
         project = get_object_or_404(Project, pk=self.kwargs['project_id'])
         serializer.save(project=project)
 
 
+class DocumentQueueAPI(APIView):
+    """The next documents for the user to annotate.
+
+    Returns the first `?limit=` (default 1) documents after the id `?after=`
+    that are assigned to the user (any document for project admins) and
+    that they have not annotated yet, in id order, and the `?prefetch=`
+    documents that follow them so the next page is at hand. `next` is the
+    url of the page after the prefetched documents.
+    """
+    permission_classes = [IsAuthenticated & IsInProjectReadOnlyOrAdmin]
+    max_limit = 100
+
+    def get(self, request, *args, **kwargs):
+        project = get_object_or_404(Project, pk=self.kwargs['project_id'])
+        user = request.user
+        limit = min(self.get_param('limit', 1, minimum=1), self.max_limit)
+        prefetch = min(self.get_param('prefetch', 0), self.max_limit)
+        after = self.get_param('after', 0)
+
+        queryset = project.documents.filter(pk__gt=after).order_by('id')
+        if not user.is_superuser and not is_in_role(settings.ROLE_PROJECT_ADMIN, user.id, project.id, request):
+            # An EXISTS probe rather than a join, which repeats documents assigned through several roles.
+            assigned = DocMapping.objects.filter(document=OuterRef('pk'), rolemap__user=user)
+            queryset = queryset.annotate(assigned=Exists(assigned)).filter(assigned=True)
+        queryset = annotated_by(queryset, user, False)
+        annotator = user if is_in_role(settings.ROLE_ANNOTATOR, user.id, project.id, request) else None
+        queryset = DocumentSerializer.setup_eager_loading(queryset, annotator=annotator)
+
+        documents = list(queryset[:limit + prefetch])
+        data = DocumentSerializer(documents, many=True, context={'request': request}).data
+        next_url = None
+        if len(documents) == limit + prefetch:
+            next_url = replace_query_param(request.build_absolute_uri(), 'after', documents[-1].id)
+        return Response({
+            'results': data[:limit],
+            'prefetch': data[limit:],
+            'next': next_url,
+        })
+
+    def get_param(self, name, default, minimum=0):
+        try:
+            value = int(self.request.query_params.get(name, default))
+        except ValueError:
+            raise ValidationError({name: 'A number is required.'})
+        return max(value, minimum)
+
+
 class DocumentDetail(generics.RetrieveUpdateDestroyAPIView):
     queryset = Document.objects.all()
     serializer_class = DocumentSerializer
@@ -297,6 +391,154 @@ class ConnectionDetail(generics.RetrieveUpdateDestroyAPIView):
         return self.queryset
 
 
+class BulkWriteAPI(APIView):
+    """Create, update and delete many objects of a document in one transaction.
+
+    The body holds up to three lists: `create` (objects as for the list
+    endpoint), `update` (objects with their `id` and the fields to change)
+    and `delete` (ids). Creates are written with `bulk_create` and updates
+    with `bulk_update`, the concordance of the document is recomputed once.
+    Returns the ids created, updated and deleted.
+    """
+    permission_classes = [IsAuthenticated & IsInProjectOrAdmin]
+    swagger_schema = None
+    fields = ()
+
+    def post(self, request, *args, **kwargs):
+        project = get_object_or_404(Project, pk=self.kwargs['project_id'])
+        document = get_object_or_404(Document, pk=self.kwargs['doc_id'], project=project)
+        if not isinstance(request.data, dict):
+            raise ValidationError('Expected an object with create, update and delete lists.')
+        creates = self.get_list(request.data, 'create', dict)
+        updates = self.get_list(request.data, 'update', dict)
+        deletes = self.get_list(request.data, 'delete', int)
+        for i, item in enumerate(updates):
+            if not self.is_id(item.get('id')):
+                raise ValidationError({'update': {i: f'Invalid id: {item.get("id")}.'}})
+        model = self.get_model(project)
+        queryset = model.objects.filter(document=document)
+
+        try:
+            with transaction.atomic():
+                deleted = list(queryset.filter(pk__in=deletes).values_list('id', flat=True))
+                queryset.filter(pk__in=deleted).delete()
+
+                instances = queryset.in_bulk([item.get('id') for item in updates])
+                changed = []
+                for i, item in enumerate(updates):
+                    instance = instances.get(item.get('id'))
+                    if instance is None:
+                        raise ValidationError({'update': {i: 'No such object in this document.'}})
+                    changed.append((copy.copy(instance), self.build(project, document, item, instance, i, 'update')))
+                if changed:
+                    objs = [new for _, new in changed]
+                    model.objects.bulk_update(objs, self.fields, batch_size=bulk_batch_size(model, objs))
+
+                created = [self.build(project, document, item, model(document=document), i, 'create')
+                           for i, item in enumerate(creates)]
+                created = bulk_create_with_ids(model, created)
+                self.written(project, document, created, changed)
+        except IntegrityError:
+            raise ValidationError('Some objects already exist in this document.')
+
+        return Response({
+            'created': [instance.id for instance in created],
+            'updated': [instance.id for _, instance in changed],
+            'deleted': deleted,
+        }, status=status.HTTP_200_OK)
+
+    @classmethod
+    def get_list(cls, data, key, kind):
+        items = data.get(key) or []
+        if not isinstance(items, list):
+            raise ValidationError({key: 'Expected a list.'})
+        for i, item in enumerate(items):
+            if kind is int and not cls.is_id(item) or not isinstance(item, kind):
+                raise ValidationError({key: {i: 'Expected an object.' if kind is dict else 'Expected an id.'}})
+        return items
+
+    @staticmethod
+    def is_id(value):
+        return isinstance(value, int) and not isinstance(value, bool)
+
+    @classmethod
+    def get_id(cls, item, field, choices, i, action):
+        value = item.get(field)
+        # Checked first, an unhashable value cannot be looked up in the choices.
+        if not (value is None or cls.is_id(value)) or value not in choices:
+            raise ValidationError({action: {i: f'Invalid {field}: {value}.'}})
+        return value
+
+    def get_model(self, project):
+        raise NotImplementedError()
+
+    def build(self, project, document, item, instance, i, action):
+        raise NotImplementedError()
+
+    def written(self, project, document, created, changed):
+        """Do what the signals bulk_create and bulk_update skip would do."""
+        raise NotImplementedError()
+
+
+class AnnotationBulkAPI(BulkWriteAPI):
+    fields = ('label', 'start_offset', 'end_offset', 'updated_at')
+
+    def get_model(self, project):
+        return project.get_annotation_class()
+
+    def build(self, project, document, item, instance, i, action):
+        if not hasattr(self, '_labels'):
+            self._labels = set(project.labels.values_list('id', flat=True))
+        if action == 'create':
+            user_id = item.get('userId') or self.request.data.get('userId')
+            try:
+                instance.user = get_object_or_404(User, pk=int(user_id)) if user_id else self.request.user
+            except (TypeError, ValueError):
+                raise ValidationError({action: {i: f'Invalid userId: {user_id}.'}})
+        if action == 'create' or 'label' in item:
+            instance.label_id = self.get_id(item, 'label', self._labels, i, action)
+        for field in ('start_offset', 'end_offset'):
+            if action == 'create' or field in item:
+                try:
+                    setattr(instance, field, int(item[field]))
+                except (KeyError, TypeError, ValueError):
+                    raise ValidationError({action: {i: f'Invalid {field}.'}})
+        if instance.start_offset >= instance.end_offset:
+            raise ValidationError({action: {i: 'start_offset is after end_offset'}})
+        # As SequenceLabelingStorage.validate checks uploaded spans.
+        if instance.start_offset < 0 or instance.end_offset > len(document.text):
+            raise ValidationError({action: {i: 'The span is outside of the document.'}})
+        instance.updated_at = timezone.now()
+        return instance
+
+    def written(self, project, document, created, changed):
+        count_label_changes(project.id, changed)
+        count_annotations(project.id, created)
+        mark_dirty(document.id, entity=True)
+
+
+class ConnectionBulkAPI(BulkWriteAPI):
+    fields = ('source', 'to', 'relation')
+
+    def get_model(self, project):
+        return project.get_connection_class()
+
+    def build(self, project, document, item, instance, i, action):
+        if not hasattr(self, '_annotations'):
+            self._annotations = set(document.seq_annotations.values_list('id', flat=True))
+            self._relations = set(project.relations.values_list('id', flat=True))
+        for field in ('source', 'to'):
+            if action == 'create' or field in item:
+                setattr(instance, f'{field}_id', self.get_id(item, field, self._annotations, i, action))
+        if action == 'create' or 'relation' in item:
+            # A connection may have no relation.
+            instance.relation_id = self.get_id(item, 'relation', self._relations | {None}, i, action)
+        return instance
+
+    def written(self, project, document, created, changed):
+        mark_dirty(document.id, relation=True)
+
+
 class TextUploadAPI(APIView):
     parser_classes = (MultiPartParser,)
     permission_classes = [IsAuthenticated & IsProjectAdmin]
@@ -305,24 +547,64 @@ class TextUploadAPI(APIView):
         if 'file' not in request.data:
             raise ParseError('Empty content')
 
+        if self.is_async(request):
+            project = get_object_or_404(Project, pk=kwargs['project_id'])
+            self.select_parser(self.get_format(request))
+            job = enqueue_import(
+                project=project,
+                user=self.get_user(request),
+                file=request.data['file'],
+                file_format=self.get_format(request),
+                spliter=self.get_spliter(request),
+                encoding=self.get_encoding(request),
+            )
+            return Response(ImportJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
         self.save_file(
-            user=request.user,
+            user=self.get_user(request),
             file=request.data['file'],
-            file_format=request.data['format'],
-            spliter=request.data['spliter'],
+            file_format=self.get_format(request),
+            spliter=self.get_spliter(request),
             project_id=kwargs['project_id'],
+            encoding=self.get_encoding(request),
         )
 
         return Response(status=status.HTTP_201_CREATED)
 
+    def get_format(self, request):
+        return request.data['format']
+
+    def get_spliter(self, request):
+        return request.data['spliter']
+
+    def get_user(self, request):
+        return request.user
+
+    @staticmethod
+    def get_encoding(request):
+        encoding = request.data.get('encoding')
+        if not encoding:
+            return None
+        try:
+            codecs.lookup(encoding)
+        except LookupError:
+            raise ValidationError('encoding {} is invalid.'.format(encoding))
+        return encoding
+
+    @staticmethod
+    def is_async(request):
+        value = request.data.get('async', settings.IMPORT_ASYNC)
+        return str(value).lower() in ('1', 'true', 'yes')
+
     @classmethod
-    def save_file(cls, user, file, file_format, spliter, project_id):
+    def save_file(cls, user, file, file_format, spliter, project_id, encoding=None):
         """
         user: 用户  admin
         file: 上传文件
         file: 文件格式
         spliter: 分隔符
         project_id: 项目id
+        encoding: 文件编码，为空时自动检测
         """
         print(f"user: {user} {type(user)}")
         print(f"file: {file} {type(file)}")
@@ -331,10 +613,11 @@ class TextUploadAPI(APIView):
         print(f"project_id: {project_id} {type(project_id)}")
         project = get_object_or_404(Project, pk=project_id)
         # 根据文件格式 选择文件解析器
-        parser = cls.select_parser(file_format)
+        metrics = ImportMetrics()
+        parser = cls.select_parser(file_format, encoding=encoding, metrics=metrics)
         # 将文件按分割符切分 返回一个生成器
         data = parser.parse(file, spliter)
-        storage = project.get_storage(data)
+        storage = cls.select_storage(file_format, project, data)
         # print("******************************")
         # print(f"data: {data}")
         # for i in data:
@@ -342,25 +625,68 @@ class TextUploadAPI(APIView):
         # print("******************************")
         print(f"project: {project}  {type(project)}")
         print(f"storage: {storage}")
-        storage.save(user)
+        return storage.save(user, metrics)
 
     @classmethod
-    def select_parser(cls, file_format):
+    def select_parser(cls, file_format, encoding=None, metrics=None):
         if file_format == 'plain':
-            return PlainTextParser()
+            return PlainTextParser(encoding, metrics)
         elif file_format == 'csv':
-            return CSVParser()
+            return CSVParser(encoding, metrics)
         elif file_format == 'json':
-            return JSONParser()
+            return JSONParser(encoding, metrics)
         elif file_format == 'conll':
-            return CoNLLParser()
+            return CoNLLParser(encoding, metrics)
         elif file_format == 'excel':
-            return ExcelParser()
+            return ExcelParser(encoding, metrics)
         elif file_format == 'audio':
-            return AudioParser()
+            return AudioParser(encoding, metrics)
+        elif file_format == PreAnnotationStorage.format:
+            return JSONParser(encoding, metrics)
         else:
             raise ValidationError('format {} is invalid.'.format(file_format))
 
+    @classmethod
+    def select_storage(cls, file_format, project, data):
+        if file_format == PreAnnotationStorage.format:
+            return PreAnnotationStorage(data, project)
+        return project.get_storage(data)
+
+
+class PreAnnotationUploadAPI(TextUploadAPI):
+    """Upload model predictions for the project's documents, see PreAnnotationStorage.
+
+    The annotations belong to the user given by `userId`, by default the uploader.
+    """
+
+    def get_format(self, request):
+        return PreAnnotationStorage.format
+
+    def get_spliter(self, request):
+        return ''
+
+    def get_user(self, request):
+        user_id = request.data.get('userId')
+        return get_object_or_404(User, pk=user_id) if user_id else request.user
+
+
+class ImportJobList(generics.ListAPIView):
+    serializer_class = ImportJobSerializer
+    permission_classes = [IsAuthenticated & IsProjectAdmin]
+
+    def get_queryset(self):
+        project = get_object_or_404(Project, pk=self.kwargs['project_id'])
+        return project.import_jobs.order_by('-id')
+
+
+class ImportJobDetail(generics.RetrieveAPIView):
+    serializer_class = ImportJobSerializer
+    lookup_url_kwarg = 'job_id'
+    permission_classes = [IsAuthenticated & IsProjectAdmin]
+
+    def get_queryset(self):
+        return ImportJob.objects.filter(project=self.kwargs['project_id'])
+
 
 class TextDownloadAPI(APIView):
     permission_classes = TextUploadAPI.permission_classes
@@ -370,7 +696,10 @@ class TextDownloadAPI(APIView):
         format = request.query_params.get('q')
         project = get_object_or_404(Project, pk=self.kwargs['project_id'])
         documents = project.documents.all()
-        painter = self.select_painter(format)
+        painter = self.select_painter(format, project)
+        if request.query_params.get('stream'):
+            return self.stream(painter, format, project, documents)
+        documents = DocumentSerializer.setup_eager_loading(documents)
         if format == "json1":
             labels = project.labels.all()
             data = JSONPainter.paint_labels(documents, labels)
@@ -378,15 +707,73 @@ class TextDownloadAPI(APIView):
             data = painter.paint(documents)
         return Response(data)
 
-    def select_painter(self, format):
+    def stream(self, painter, format, project, documents):
+        """Export documents as they are painted, keeping memory flat for large projects."""
+        labels = project.labels.all() if format == 'json1' else None
+        content_type, extension = self.select_content_type(format)
+        response = StreamingHttpResponse(painter.stream(documents, labels=labels), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="project_{project.id}.{extension}"'
+        return response
+
+    @staticmethod
+    def select_content_type(format):
         if format == 'csv':
-            return CSVPainter()
+            return CSVRenderer.media_type, 'csv'
+        return JSONLRenderer.media_type, 'jsonl'
+
+    @staticmethod
+    def select_painter(format, project):
+        if format == 'csv':
+            return CSVPainter(project)
         elif format == 'json' or format == "json1":
-            return JSONPainter()
+            return JSONPainter(project)
         else:
             raise ValidationError('format {} is invalid.'.format(format))
 
 
+class ExportJobList(generics.ListCreateAPIView):
+    serializer_class = ExportJobSerializer
+    permission_classes = TextUploadAPI.permission_classes
+
+    def get_queryset(self):
+        project = get_object_or_404(Project, pk=self.kwargs['project_id'])
+        return project.export_jobs.select_related('project').order_by('-id')
+
+    def create(self, request, *args, **kwargs):
+        """Start an export, or hand back one that is running or still fresh."""
+        format = request.data.get('format') or request.query_params.get('q')
+        project = get_object_or_404(Project, pk=self.kwargs['project_id'])
+        TextDownloadAPI.select_painter(format, project)
+        job = project.export_jobs.filter(format=format).order_by('-id').first()
+        if job and (job.state in (ExportJob.PENDING, ExportJob.RUNNING) or job.is_fresh()):
+            return Response(self.get_serializer(job).data)
+        job = enqueue_export(project, request.user, format)
+        return Response(self.get_serializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+
+class ExportJobDetail(generics.RetrieveAPIView):
+    serializer_class = ExportJobSerializer
+    lookup_url_kwarg = 'job_id'
+    permission_classes = TextUploadAPI.permission_classes
+
+    def get_queryset(self):
+        return ExportJob.objects.filter(project=self.kwargs['project_id']).select_related('project')
+
+
+class ExportDownloadAPI(APIView):
+    permission_classes = TextUploadAPI.permission_classes
+
+    def get(self, request, *args, **kwargs):
+        job = get_object_or_404(ExportJob, pk=self.kwargs['job_id'], project=self.kwargs['project_id'],
+                                state=ExportJob.SUCCESS)
+        if not job.file or not os.path.exists(job.file):
+            raise NotFound('The export file has been replaced by a newer export.')
+        content_type, extension = TextDownloadAPI.select_content_type(job.format)
+        return file_response(request, job.file, content_type,
+                             etag=f'{job.id}-{job.size}',
+                             filename=f'project_{job.project_id}.{extension}')
+
+
 class Users(APIView):
     permission_classes = [IsAuthenticated & IsProjectAdmin]
 
@@ -449,36 +836,14 @@ class RandomDocMappingAPI(APIView):
 
     def post(self, request, *args, **kwargs):
         project = get_object_or_404(Project, pk=self.kwargs['project_id'])
-        role_id=Subquery(Role.objects.filter(name=request.data['role']).values('id'))
-        rolemappings = RoleMapping.objects.filter(
-                    project_id=project.id,
-                    role_id=role_id
-                )
-        documents = Document.objects.filter(project_id=project.id)
-        if rolemappings and documents:
-            self.randomMap(
-                project=project,
-                users = rolemappings,
-                role_id = role_id,
-                number=request.data['number'],
-                documents = documents
-            )
-        return Response(status=status.HTTP_201_CREATED)
-
-    @classmethod
-    def randomMap(self, project, users, role_id, number, documents):
-        for doc in documents:
-            choseUser = random.choice(users).user
-            assignNumber = len(DocMapping.objects.filter(project=project.id, document=doc.id, rolemap__role_id=role_id))
-            while (assignNumber < number):
-                exist = DocMapping.objects.filter(project=project.id, document=doc.id, rolemap__user_id=choseUser.id).exists()
-                if exist:
-                    choseUser = random.choice(users).user
-                    continue
-                rolemap = RoleMapping.objects.get(project=project.id, user=choseUser.id, role=role_id)
-                docmap = DocMapping.objects.create(project=project, document=doc, rolemap=rolemap)
-                docmap.save()
-                assignNumber = assignNumber + 1
+        role = get_object_or_404(Role, name=request.data['role'])
+        try:
+            number = int(request.data.get('number'))
+        except (TypeError, ValueError):
+            raise ValidationError('number must be an integer.')
+        balance = str(request.data.get('balance', '')).lower() in ('1', 'true', 'yes')
+        summary = assign_documents(project, role.id, number, balance=balance)
+        return Response(summary, status=status.HTTP_201_CREATED)
 
 
 class LabelUploadAPI(APIView):
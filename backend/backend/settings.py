@@ -212,6 +212,11 @@ DATABASES['default'].update(dj_database_url.config(
 if DATABASES['default'].get('ENGINE') == 'django.db.backends.sqlite3':
     DATABASES['default'].get('OPTIONS', {}).pop('sslmode', None)
 
+# Seconds a SQLite connection waits for the database's single write lock,
+# which request threads and background job threads take turns holding
+if DATABASES['default'].get('ENGINE') == 'django.db.backends.sqlite3':
+    DATABASES['default'].setdefault('OPTIONS', {}).setdefault('timeout', env.int('SQLITE_TIMEOUT', 30))
+
 # work-around for dj-database-url: patch ssl for mysql
 if DATABASES['default'].get('ENGINE') == 'django.db.backends.mysql':
     DATABASES['default'].get('OPTIONS', {}).pop('sslmode', None)
@@ -226,4 +231,63 @@ if DATABASES['default'].get('ENGINE') == 'sql_server.pyodbc':
 
 # Size of the batch for creating documents
 # on the import phase
-IMPORT_BATCH_SIZE = env.int('IMPORT_BATCH_SIZE', 500)
\ No newline at end of file
+IMPORT_BATCH_SIZE = env.int('IMPORT_BATCH_SIZE', 500)
+
+# Maximum number of bytes of an upload fed to chardet
+# to detect its encoding when it has no BOM and none is given
+ENCODING_SAMPLE_SIZE = env.int('ENCODING_SAMPLE_SIZE', 64 * 1024)
+
+# Write imported documents and annotations with bulk_create
+# instead of saving them one by one through the serializers
+IMPORT_BULK_CREATE = env.bool('IMPORT_BULK_CREATE', True)
+IMPORT_BULK_CREATE_SIZE = env.int('IMPORT_BULK_CREATE_SIZE', 1000)
+
+# Number of documents painted at a time
+# by streaming exports
+EXPORT_CHUNK_SIZE = env.int('EXPORT_CHUNK_SIZE', 500)
+
+# Worker processes parsing jsonl and plain text uploads of at least
+# IMPORT_PARALLEL_MIN_SIZE bytes; below 2 they are parsed by the importer
+IMPORT_PARALLEL_WORKERS = env.int('IMPORT_PARALLEL_WORKERS', 0)
+IMPORT_PARALLEL_MIN_SIZE = env.int('IMPORT_PARALLEL_MIN_SIZE', 16 * 1024 * 1024)
+
+# Uploads sent with async=true (or all uploads when IMPORT_ASYNC is set)
+# are spooled to JOB_SPOOL_DIR and imported by JOB_WORKERS background threads,
+# a single one on SQLite
+IMPORT_ASYNC = env.bool('IMPORT_ASYNC', False)
+JOB_WORKERS = env.int('JOB_WORKERS', 2)
+JOB_SPOOL_DIR = env('JOB_SPOOL_DIR', path.join(BASE_DIR, 'spool'))
+JOB_PROGRESS_TIMEOUT = env.int('JOB_PROGRESS_TIMEOUT', 3600)
+
+# Seconds the roles of a user in a project stay cached across requests, 0 to look
+# them up once per request; only used with a cache shared by every worker process
+ROLE_CACHE_TIMEOUT = env.int('ROLE_CACHE_TIMEOUT', 0)
+
+# Seconds project statistics stay cached, changes
+# to the project's data retire them right away
+STATISTICS_CACHE_TIMEOUT = env.int('STATISTICS_CACHE_TIMEOUT', 600)
+
+# Live job progress is shared through the cache: use a cache
+# reachable by every worker process (e.g. memcached) in production
+CACHES = {
+    'default': {
+        'BACKEND': env('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': env('CACHE_LOCATION', ''),
+    }
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'api': {
+            'handlers': ['console'],
+            'level': env('API_LOG_LEVEL', 'INFO'),
+        },
+    },
+}